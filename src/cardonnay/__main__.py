@@ -0,0 +1,3 @@
+from cardonnay.main import main
+
+main()
@@ -0,0 +1,159 @@
+"""Allocation of testnet instances with regard to the free resources of the machine.
+
+Before an instance is reserved, the load average and the available memory are checked, so
+that starting another testnet doesn't over-subscribe the machine. Instances that are still
+starting are accounted for too, as they don't show in the load average yet. When there is
+no capacity or no free instance, the allocation either fails right away, or waits until an
+instance is stopped or the load goes down.
+"""
+
+import dataclasses
+import logging
+import os
+import pathlib as pl
+import time
+
+from cardonnay import ca_utils
+from cardonnay import fs_watch
+
+LOGGER = logging.getLogger(__name__)
+
+MEMINFO_FILE = pl.Path("/proc/meminfo")
+# The load check is disabled unless a limit is given
+DEFAULT_MAX_LOAD = 0.0
+DEFAULT_NODE_MEM_MIB = 400
+# The load average changes without any file change in the workdir, re-check periodically
+RECHECK_INTERVAL_SEC = 5.0
+
+
+@dataclasses.dataclass(frozen=True)
+class Capacity:
+    """Limits for starting another testnet instance.
+
+    Attributes:
+        max_load: Maximum 1 minute load average per CPU, 0 disables the check.
+        node_mem_mib: Memory in MiB needed by a single node, 0 disables the check.
+    """
+
+    max_load: float = DEFAULT_MAX_LOAD
+    node_mem_mib: int = DEFAULT_NODE_MEM_MIB
+
+
+def get_load_per_cpu() -> float | None:
+    """Get the 1 minute load average per CPU, or None when not available."""
+    try:
+        load_1min = os.getloadavg()[0]
+    except OSError:
+        return None
+    return load_1min / (os.cpu_count() or 1)
+
+
+def get_mem_available_mib() -> int | None:
+    """Get memory available for new processes in MiB, or None when not available."""
+    try:
+        with open(MEMINFO_FILE, encoding="utf-8") as fp_in:
+            for line in fp_in:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def check_capacity(limits: Capacity, num_nodes: int, starting: int = 0) -> str:
+    """Check whether another testnet instance can be started.
+
+    Args:
+        limits: Limits for starting the instance.
+        num_nodes: Number of nodes of the instance.
+        starting: Number of instances that are being started and don't use their
+            resources yet.
+
+    Returns:
+        The reason why the instance cannot be started, or empty string.
+    """
+    if limits.max_load > 0 and (load := get_load_per_cpu()) is not None:
+        # Every starting instance is expected to keep about one CPU busy
+        expected_load = load + starting / (os.cpu_count() or 1)
+        if expected_load >= limits.max_load:
+            return (
+                f"The load average per CPU is {expected_load:.2f} with {starting} instance(s) "
+                f"starting, the limit is {limits.max_load:.2f}."
+            )
+
+    if limits.node_mem_mib > 0 and (mem_available := get_mem_available_mib()) is not None:
+        needed = limits.node_mem_mib * num_nodes * (starting + 1)
+        if mem_available < needed:
+            return (
+                f"There is {mem_available} MiB of memory available, but {needed} MiB is needed "
+                f"with {starting} instance(s) starting."
+            )
+
+    return ""
+
+
+def allocate_instance(
+    workdir: pl.Path,
+    instance_num: int = -1,
+    testnet_variant: str = "",
+    num_nodes: int = 0,
+    limits: Capacity | None = None,
+    wait: bool = False,
+    timeout: float = 3600,
+    dry_run: bool = False,
+) -> int:
+    """Reserve a testnet instance when the machine has capacity for it.
+
+    With `testnet_variant`, instances whose `cluster{N}_{testnet_variant}` dir already exists
+    are preferred.
+
+    Args:
+        workdir: Absolute path to the existing workdir.
+        instance_num: Instance number to reserve, a free one is selected when negative.
+        testnet_variant: Testnet variant whose existing instance dirs are preferred.
+        num_nodes: Number of nodes of the instance, capacity is not checked when 0.
+        limits: Limits for starting the instance, defaults are used when None.
+        wait: Wait until an instance is free and there is capacity for it.
+        timeout: Maximum time to wait in seconds.
+        dry_run: Only wait until an instance can be reserved, don't reserve it.
+
+    Returns:
+        The reserved instance number.
+
+    Raises:
+        ca_utils.InstanceBusyError: No instance can be reserved and `wait` is not set.
+        TimeoutError: No instance could be reserved in time.
+        RuntimeError: The reservation failed.
+    """
+    limits = limits or Capacity()
+
+    def _capacity_check(starting: int) -> str:
+        return check_capacity(limits=limits, num_nodes=num_nodes, starting=starting)
+
+    deadline = time.monotonic() + timeout
+    logged_reason = ""
+    with fs_watch.DirWatcher() as watcher:
+        while True:
+            # Watch before checking, so a change right after the check is not missed
+            watcher.watch(workdir)
+            try:
+                return ca_utils.reserve_instance(
+                    workdir=workdir,
+                    instance_num=instance_num,
+                    testnet_variant=testnet_variant,
+                    capacity_check=_capacity_check if num_nodes else None,
+                    dry_run=dry_run,
+                )
+            except ca_utils.InstanceBusyError as excp:
+                if not wait:
+                    raise
+                reason = str(excp)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                msg = f"No testnet instance could be reserved in {timeout} seconds: {reason}"
+                raise TimeoutError(msg)
+            if reason != logged_reason:
+                LOGGER.info(f"Waiting for a free testnet instance: {reason}")
+                logged_reason = reason
+            watcher.wait(timeout=min(remaining, RECHECK_INTERVAL_SEC))
@@ -0,0 +1,484 @@
+"""Async API for creating, monitoring and stopping testnet instances.
+
+Unlike the `cli_*` command handlers, the API doesn't print anything and it returns
+`structs` models. Failures are reported by raising `ClusterError`. Start and stop scripts
+run as `asyncio` subprocesses, so many instances can be orchestrated concurrently from
+one event loop, e.g.:
+
+    clusters = [api.Cluster(testnet_variant="local_fast", workdir=workdir) for __ in range(3)]
+    await asyncio.gather(*(c.start() for c in clusters))
+    await asyncio.gather(*(c.wait_started() for c in clusters))
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import pathlib as pl
+import signal
+import typing as tp
+
+from cardonnay import ca_utils
+from cardonnay import cli_control
+from cardonnay import cli_create
+from cardonnay import genesis_params
+from cardonnay import inspect_instance
+from cardonnay import instance_registry
+from cardonnay import prometheus
+from cardonnay import resource_limits
+from cardonnay import structs
+from cardonnay import ttypes
+from cardonnay import variants
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_START_TIMEOUT_SEC = 600
+DEFAULT_POLL_INTERVAL_SEC = 0.5
+METRICS_TIMEOUT_SEC = 10
+# Number of lines of the start log included in the error when the start fails
+LOG_TAIL_LINES = 20
+
+
+class ClusterError(Exception):
+    """Operation on the testnet instance failed."""
+
+
+def _read_log_tail(logfile: pl.Path, num_lines: int = LOG_TAIL_LINES) -> str:
+    try:
+        lines = logfile.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return ""
+    return "\n".join(lines[-num_lines:])
+
+
+class Cluster:
+    """A testnet instance in a work dir.
+
+    Create the object with the testnet variant and call `start` to create a new instance,
+    or use `Cluster.attach` for an instance that is already running.
+    """
+
+    def __init__(
+        self,
+        testnet_variant: str = "",
+        workdir: ttypes.FileType = "",
+        instance_num: int = -1,
+        comment: str = "",
+        stake_pools_num: int = 3,
+        ports_base: int = 23000,
+        trace_profile: str = "default",
+        keep: bool = False,
+        env: dict[str, str] | None = None,
+        cpus: str = "",
+        mem_max_mib: int = 0,
+        topology_seed: int | None = None,
+        genesis_overrides: dict[str, int | float] | None = None,
+    ) -> None:
+        self.testnet_variant = testnet_variant
+        # The default workdir is recognized by the empty value, see `start`
+        self._workdir_arg = str(workdir)
+        self.workdir = ca_utils.get_workdir(workdir=workdir).absolute()
+        self.instance_num = instance_num
+        self.comment = comment
+        self.stake_pools_num = stake_pools_num
+        self.ports_base = ports_base
+        self.trace_profile = trace_profile
+        self.keep = keep
+        self.env = env or {}
+        self.cpus = cpus
+        self.mem_max_mib = mem_max_mib
+        self.topology_seed = topology_seed
+        self.genesis_overrides = genesis_overrides or {}
+        self._process: asyncio.subprocess.Process | None = None
+
+    @classmethod
+    def attach(cls, instance_num: int, workdir: ttypes.FileType = "") -> "Cluster":
+        """Return a handle of an existing testnet instance."""
+        cluster = cls(workdir=workdir, instance_num=instance_num)
+        cluster.testnet_variant = cli_control.load_testnet_info(statedir=cluster.statedir).get(
+            "name", ""
+        )
+        return cluster
+
+    @property
+    def statedir(self) -> pl.Path:
+        if self.instance_num < 0:
+            msg = "The instance number is not known, the testnet was not started yet."
+            raise ClusterError(msg)
+        return self.workdir / f"{ca_utils.STATE_CLUSTER_PREFIX}{self.instance_num}"
+
+    @property
+    def start_logfile(self) -> pl.Path:
+        return self.workdir / f"start_cluster{self.instance_num}.log"
+
+    @property
+    def start_pidfile(self) -> pl.Path:
+        return self.workdir / f"start_cluster{self.instance_num}.pid"
+
+    def _check_start_params(self) -> pl.Path:
+        """Check the start parameters and return the resolved dir of the testnet variant."""
+        scripts_base = variants.get_scripts_base()
+        if not variants.variant_exists(
+            name=self.testnet_variant, workdir=self.workdir, scripts_base=scripts_base
+        ):
+            msg = (
+                f"Testnet variant '{self.testnet_variant}' does not exist in '{scripts_base}' "
+                f"nor in '{self.workdir / variants.USER_VARIANTS_DIR}'."
+            )
+            raise ClusterError(msg)
+
+        avail_profiles = cli_create.get_trace_profiles(scripts_base=scripts_base)
+        if self.trace_profile not in avail_profiles:
+            msg = (
+                f"Trace profile '{self.trace_profile}' does not exist, "
+                f"available profiles: {', '.join(avail_profiles)}."
+            )
+            raise ClusterError(msg)
+
+        if not ca_utils.check_env_sanity():
+            msg = "Required binaries are missing, see the log for details."
+            raise ClusterError(msg)
+
+        if self.cpus:
+            try:
+                resource_limits.parse_cpu_list(cpus=self.cpus)
+            except ValueError as excp:
+                msg = f"Invalid CPU list '{self.cpus}': {excp}"
+                raise ClusterError(msg) from excp
+
+        try:
+            scriptsdir = variants.resolve_variant(
+                name=self.testnet_variant, workdir=self.workdir, scripts_base=scripts_base
+            )
+        except RuntimeError as excp:
+            raise ClusterError(str(excp)) from excp
+
+        try:
+            genesis_params.validate(scriptsdir=scriptsdir, overrides=self.genesis_overrides)
+        except ValueError as excp:
+            msg = f"Invalid genesis parameters: {excp}"
+            raise ClusterError(msg) from excp
+
+        if self._workdir_arg and (
+            run_inst_default := instance_registry.get_running_instances(
+                workdir=ca_utils.get_workdir(workdir="")
+            )
+        ):
+            run_insts_str = ",".join(sorted(str(i) for i in run_inst_default))
+            msg = (
+                f"Instances running in the default workdir: {run_insts_str}. "
+                "Stop them first before using custom work dir."
+            )
+            raise ClusterError(msg)
+
+        return scriptsdir
+
+    def _prepare(self) -> dict[str, str]:
+        """Reserve the instance and generate its files; return env vars for the start script."""
+        scriptsdir = self._check_start_params()
+
+        try:
+            ca_utils.create_workdir(workdir=self.workdir)
+            self.instance_num = ca_utils.reserve_instance(
+                workdir=self.workdir,
+                instance_num=self.instance_num,
+                # Only a dir that is kept is worth reusing
+                testnet_variant=self.testnet_variant if self.keep else "",
+            )
+        except RuntimeError as excp:
+            raise ClusterError(str(excp)) from excp
+
+        destdir = self.workdir / f"cluster{self.instance_num}_{self.testnet_variant}"
+        try:
+            env = cli_create.generate_testnet_files(
+                destdir=destdir,
+                scriptsdir=scriptsdir,
+                workdir=self.workdir,
+                instance_num=self.instance_num,
+                stake_pools_num=self.stake_pools_num,
+                ports_base=self.ports_base,
+                trace_profile=self.trace_profile,
+                comment=self.comment,
+                keep=self.keep,
+                testnet_variant=self.testnet_variant,
+                cpus=self.cpus,
+                mem_max_mib=self.mem_max_mib,
+                topology_seed=self.topology_seed,
+                genesis_overrides=self.genesis_overrides,
+                dbsync_schema_dir=self.env.get("DBSYNC_SCHEMA_DIR")
+                or os.environ.get("DBSYNC_SCHEMA_DIR", ""),
+            )
+        except Exception as excp:
+            ca_utils.undelay_instance(instance_num=self.instance_num, workdir=self.workdir)
+            msg = f"Failed to generate testnet files to '{destdir}': {excp}"
+            raise ClusterError(msg) from excp
+
+        self.start_logfile.unlink(missing_ok=True)
+        self.start_pidfile.unlink(missing_ok=True)
+        return env
+
+    async def start(self) -> structs.StartInfo:
+        """Create the testnet instance and start it in background.
+
+        Returns once the start script is running, use `wait_started` to wait until the
+        testnet is ready.
+        """
+        if self._process is not None:
+            msg = f"Instance {self.instance_num} was already started."
+            raise ClusterError(msg)
+
+        env = await asyncio.to_thread(self._prepare)
+        start_script = self.workdir / f"cluster{self.instance_num}_{self.testnet_variant}"
+        start_script /= "start-cluster"
+
+        try:
+            with open(self.start_logfile, "a") as logout:
+                self._process = await asyncio.create_subprocess_exec(
+                    str(start_script),
+                    cwd=self.workdir,
+                    env={**os.environ, **self.env, **env},
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=logout,
+                    stderr=asyncio.subprocess.STDOUT,
+                    start_new_session=True,
+                )
+        except OSError as excp:
+            ca_utils.undelay_instance(instance_num=self.instance_num, workdir=self.workdir)
+            msg = f"Failed to start the testnet cluster with '{start_script}': {excp}"
+            raise ClusterError(msg) from excp
+
+        self.start_pidfile.write_text(str(self._process.pid))
+        await asyncio.to_thread(
+            instance_registry.record_instance,
+            workdir=self.workdir,
+            instance_num=self.instance_num,
+            start_pid=self._process.pid,
+        )
+
+        return await asyncio.to_thread(
+            cli_create.get_start_info, statedir=self.statedir, testnet_variant=self.testnet_variant
+        )
+
+    def _start_failed(self) -> str:
+        """Return a description of the start failure, or empty string if still starting."""
+        if self._process is not None:
+            if self._process.returncode is None:
+                return ""
+            return f"The start script exited with return code {self._process.returncode}."
+
+        # Instance started by another process, check the recorded start PID
+        if not self.start_pidfile.exists():
+            return ""
+        pid = cli_control.read_valid_pid(pidfile=self.start_pidfile)
+        if pid and not cli_control.pid_exists(pid):
+            return f"The start process {pid} is gone."
+        return ""
+
+    async def wait_started(
+        self,
+        timeout: float = DEFAULT_START_TIMEOUT_SEC,
+        poll_interval: float = DEFAULT_POLL_INTERVAL_SEC,
+    ) -> structs.InstanceInfo:
+        """Wait until the testnet is started and return its status.
+
+        Raises:
+            ClusterError: The start failed.
+            TimeoutError: The testnet didn't start in time.
+        """
+        started_file = self.statedir / ca_utils.STATUS_STARTED
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            if started_file.exists():
+                return await self.status()
+            if failure := self._start_failed():
+                # The status file may have been created just before the process exited
+                if started_file.exists():
+                    return await self.status()
+                log_tail = _read_log_tail(logfile=self.start_logfile)
+                msg = f"Failed to start instance {self.instance_num}. {failure}\n{log_tail}"
+                raise ClusterError(msg)
+            if loop.time() >= deadline:
+                msg = f"Instance {self.instance_num} didn't start in {timeout} sec."
+                raise TimeoutError(msg)
+            await asyncio.sleep(poll_interval)
+
+    async def _kill_start_process(self) -> None:
+        if self._process is None or self._process.returncode is not None:
+            return
+        with contextlib.suppress(ProcessLookupError):
+            self._process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=cli_control.KILL_WAIT_SEC)
+        except asyncio.TimeoutError:
+            with contextlib.suppress(ProcessLookupError):
+                self._process.kill()
+            await self._process.wait()
+
+    async def stop(self) -> None:
+        """Stop the testnet instance, including a start that is still in progress."""
+        statedir = self.statedir
+        stop_script = statedir / "stop-cluster"
+        if not stop_script.exists():
+            msg = f"Stop script '{stop_script}' does not exist."
+            raise ClusterError(msg)
+
+        if not await asyncio.to_thread(
+            ca_utils.delay_instance, instance_num=self.instance_num, workdir=self.workdir
+        ):
+            msg = f"Failed to delay instance {self.instance_num}, see the log for details."
+            raise ClusterError(msg)
+
+        try:
+            await self._kill_start_process()
+            await asyncio.to_thread(
+                cli_control.kill_starting_testnet, pidfile=self.start_pidfile, statedir=statedir
+            )
+
+            env = ca_utils.create_env_vars(workdir=self.workdir, instance_num=self.instance_num)
+            process = await asyncio.create_subprocess_exec(
+                str(stop_script),
+                cwd=statedir,
+                env={**os.environ, **env},
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            stdout, __ = await process.communicate()
+            if process.returncode != 0:
+                output = stdout.decode("utf-8", errors="replace").strip()
+                msg = f"Failed to stop instance {self.instance_num}:\n{output}"
+                raise ClusterError(msg)
+        finally:
+            await asyncio.to_thread(
+                instance_registry.record_instance,
+                workdir=self.workdir,
+                instance_num=self.instance_num,
+                start_pid=None,
+            )
+            await asyncio.to_thread(cli_control.remove_instance_cgroup, statedir=statedir)
+            await asyncio.to_thread(
+                ca_utils.undelay_instance, instance_num=self.instance_num, workdir=self.workdir
+            )
+
+    async def _supervisorctl(self, *args: str) -> tuple[int, str]:
+        """Run `supervisorctl` of the instance, return its exit code and output."""
+        script = self.statedir / "supervisorctl_local"
+        if not script.exists():
+            msg = f"Supervisor control script '{script}' does not exist."
+            raise ClusterError(msg)
+
+        process = await asyncio.create_subprocess_exec(
+            str(script),
+            *args,
+            cwd=self.statedir,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        stdout, __ = await process.communicate()
+        return process.returncode or 0, stdout.decode("utf-8", errors="replace").strip()
+
+    async def restart_nodes(self, nodes: tp.Sequence[str] = ()) -> None:
+        """Restart the given nodes of the started testnet, all nodes when none are given."""
+        targets = [f"nodes:{n}" for n in nodes] or ["nodes:"]
+        returncode, output = await self._supervisorctl("restart", *targets)
+        if returncode != 0:
+            msg = f"Failed to restart nodes of instance {self.instance_num}:\n{output}"
+            raise ClusterError(msg)
+
+    async def start_programs(self, programs: tp.Sequence[str]) -> None:
+        """Start the supervisor programs (e.g. `nodes:pool1`), skip the running ones."""
+        returncode, output = await self._supervisorctl("start", *programs)
+        failed = [ln for ln in output.splitlines() if "ERROR" in ln and "already started" not in ln]
+        if returncode != 0 and failed:
+            msg = f"Failed to start {', '.join(programs)}:\n" + "\n".join(failed)
+            raise ClusterError(msg)
+
+    async def stop_programs(self, programs: tp.Sequence[str]) -> None:
+        """Stop the supervisor programs (e.g. `nodes:pool1`), skip the stopped ones."""
+        returncode, output = await self._supervisorctl("stop", *programs)
+        failed = [ln for ln in output.splitlines() if "ERROR" in ln and "not running" not in ln]
+        if returncode != 0 and failed:
+            msg = f"Failed to stop {', '.join(programs)}:\n" + "\n".join(failed)
+            raise ClusterError(msg)
+
+    async def program_states(self) -> dict[str, str]:
+        """Get states (e.g. "RUNNING") of all the supervisor programs of the instance."""
+        # The exit code is not zero when some of the programs are not running
+        __, output = await self._supervisorctl("status")
+        return {
+            parts[0]: parts[1]
+            for ln in output.splitlines()
+            if len(parts := ln.split()) >= 2  # noqa: PLR2004
+        }
+
+    async def signal_node(self, node: str, sig: int) -> None:
+        """Send the signal to all processes of the node, e.g. SIGSTOP to pause it.
+
+        Supervisor starts every program in its own process group, so the signal reaches
+        also the node started through a wrapper (e.g. `run-in-cgroup`).
+        """
+        returncode, output = await self._supervisorctl("pid", f"nodes:{node}")
+        pid = int(output) if returncode == 0 and output.isdigit() else 0
+        if pid <= 0:
+            msg = f"Node '{node}' of instance {self.instance_num} is not running."
+            raise ClusterError(msg)
+        try:
+            os.killpg(pid, sig)
+        except OSError as excp:
+            msg = f"Failed to send signal {sig} to node '{node}': {excp}"
+            raise ClusterError(msg) from excp
+
+    async def status(self) -> structs.InstanceInfo:
+        return await asyncio.to_thread(inspect_instance.get_testnet_info, statedir=self.statedir)
+
+    async def config(self) -> structs.CombinedConfig:
+        return await asyncio.to_thread(inspect_instance.get_config, statedir=self.statedir)
+
+    async def faucet(self) -> structs.AddressData:
+        return await asyncio.to_thread(inspect_instance.load_faucet_data, statedir=self.statedir)
+
+    async def pools(self) -> list[structs.PoolData]:
+        return await asyncio.to_thread(inspect_instance.load_pools_data, statedir=self.statedir)
+
+    async def metrics(self, node: str = "pool1") -> structs.NodeMetrics:
+        """Read current metrics of the node from its Prometheus endpoint."""
+        address = await asyncio.to_thread(
+            prometheus.get_prometheus_address, statedir=self.statedir, node=node
+        )
+        if address is None:
+            msg = f"Node '{node}' doesn't expose Prometheus metrics."
+            raise ClusterError(msg)
+        host, port = address
+
+        try:
+            body = await asyncio.wait_for(
+                self._http_get(host=host, port=port, path=prometheus.METRICS_PATH),
+                timeout=METRICS_TIMEOUT_SEC,
+            )
+        except (OSError, asyncio.TimeoutError) as excp:
+            msg = f"Failed to read metrics of node '{node}' from {host}:{port}: {excp}"
+            raise ClusterError(msg) from excp
+
+        return structs.NodeMetrics(node=node, port=port, metrics=prometheus.parse_metrics(body))
+
+    @staticmethod
+    async def _http_get(host: str, port: int, path: str) -> str:
+        reader, writer = await asyncio.open_connection(host=host, port=port)
+        try:
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: {host}:{port}\r\n\r\n".encode())
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+            with contextlib.suppress(OSError):
+                await writer.wait_closed()
+
+        head, __, body = response.partition(b"\r\n\r\n")
+        status_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+        if " 200 " not in f"{status_line} ":
+            msg = f"Unexpected HTTP response '{status_line}'"
+            raise OSError(msg)
+        return body.decode("utf-8", errors="replace")
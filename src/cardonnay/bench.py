@@ -0,0 +1,519 @@
+"""Benchmarks comparing testnet instances started with different settings.
+
+`compare_backends` starts the same testnet variant once per UTxO backend, one after
+another in the same instance, with the same tx load profile and the same topology seed.
+For every run, it collects per-node resource usage, disk usage, block adoption times and
+the time of the ledger replay after a restart of the nodes.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import datetime as dt
+import logging
+import os
+import pathlib as pl
+import re
+import time
+import typing as tp
+
+from cardonnay import api
+from cardonnay import consts
+from cardonnay import helpers
+from cardonnay import node_logs
+from cardonnay import prometheus
+from cardonnay import resource_usage
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+# Env vars that enable the tx load generators
+LOAD_GENERATORS = {
+    "firehose": "ENABLE_TX_FIREHOSE",
+    "generator": "ENABLE_TX_GENERATOR",
+    "centrifuge": "ENABLE_TX_CENTRIFUGE",
+}
+SAMPLE_INTERVAL_SEC = 2
+REPLAY_TIMEOUT_SEC = 600
+RESTART_POLL_SEC = 0.5
+# Results of the restart benchmarks of an instance, one JSON object per line
+RESTART_HISTORY_FILE = "restart_bench.jsonl"
+
+FORGED_NS = "Forge.Loop.ForgedBlock"
+ADOPTED_NS = "Forge.Loop.AdoptedBlock"
+REPLAY_NS = "ChainDB.ReplayBlock.LedgerReplay"
+# Traces that come only after the ledger replay is finished
+READY_NS_PREFIXES = ("ChainDB.InitChainSelection", "ChainDB.AddBlockEvent", "Forge.Loop")
+SLOT_RE = re.compile(r"\bslot\W{0,3}(\d+)", re.IGNORECASE)
+
+
+@dataclasses.dataclass(frozen=True)
+class BenchParams:
+    testnet_variant: str
+    workdir: str = ""
+    instance_num: int = -1
+    stake_pools_num: int = 3
+    duration_sec: int = 300
+    load: str = "firehose"
+    tx_tps: int = 100
+    topology_seed: int = 1
+    start_timeout_sec: int = api.DEFAULT_START_TIMEOUT_SEC
+
+
+def get_disk_usage(path: pl.Path) -> int:
+    """Get disk space used by files in the directory tree, in bytes."""
+    total = 0
+    for dirpath, __, filenames in os.walk(path):
+        for fname in filenames:
+            with contextlib.suppress(OSError):
+                total += os.lstat(os.path.join(dirpath, fname)).st_blocks * 512  # noqa: PTH118
+    return total
+
+
+def get_node_disk_usage_mib(statedir: pl.Path, node: str) -> float:
+    """Get disk space used by the chain and ledger databases of the node, in MiB."""
+    used = sum(get_disk_usage(path=statedir / d) for d in (f"db-{node}", f"lmdb-{node}"))
+    return round(used / 1024 / 1024, 1)
+
+
+def get_adoption_times_ms(statedir: pl.Path, node: str, since: float = 0.0) -> list[float]:
+    """Get times between forging a block and adopting it, in milliseconds."""
+    forged: dict[str, float] = {}
+    adoption_times = []
+    for line in node_logs.iter_log_lines(logfile=statedir / f"{node}.stdout"):
+        if FORGED_NS not in line and ADOPTED_NS not in line:
+            continue
+        trace = node_logs.parse_trace_line(line)
+        if trace.timestamp is None or trace.timestamp < since:
+            continue
+        if not (slot_match := SLOT_RE.search(trace.text)):
+            continue
+        slot = slot_match.group(1)
+        if trace.namespace.startswith(FORGED_NS):
+            forged[slot] = trace.timestamp
+        elif trace.namespace.startswith(ADOPTED_NS) and slot in forged:
+            adoption_times.append((trace.timestamp - forged.pop(slot)) * 1000)
+    return adoption_times
+
+
+class LogFollower:
+    """Read the lines appended to a node log since the follower was created."""
+
+    def __init__(self, logfile: pl.Path) -> None:
+        self.logfile = logfile
+        self._inode, self._pos = self._stat()
+        self._partial = ""
+
+    def _stat(self) -> tuple[int, int]:
+        try:
+            stat = self.logfile.stat()
+        except FileNotFoundError:
+            return -1, 0
+        return stat.st_ino, stat.st_size
+
+    def read_new_lines(self) -> list[str]:
+        inode, size = self._stat()
+        if inode != self._inode or size < self._pos:
+            # The log was rotated, continue from the beginning of the new file
+            self._inode, self._pos, self._partial = inode, 0, ""
+        if inode < 0 or size == self._pos:
+            return []
+
+        with open(self.logfile, "rb") as fp_in:
+            fp_in.seek(self._pos)
+            data = fp_in.read()
+        self._pos += len(data)
+        *lines, self._partial = (self._partial + data.decode("utf-8", errors="replace")).split("\n")
+        return lines
+
+
+@dataclasses.dataclass
+class ReplayTracker:
+    """Find the end of the ledger replay of a node restarted at `since` in its log lines.
+
+    The node is ready when it starts the chain selection or forging. The replay time is
+    known only when the node logged the replay, without it the replay time stays None.
+    """
+
+    since: float
+    last_replay: float | None = None
+    ready_sec: float | None = None
+    replay_sec: float | None = None
+
+    def feed(self, lines: tp.Iterable[str]) -> None:
+        for line in lines:
+            if self.ready_sec is not None:
+                return
+            if "ChainDB" not in line and "Forge.Loop" not in line:
+                continue
+            trace = node_logs.parse_trace_line(line)
+            if trace.timestamp is None or trace.timestamp < self.since:
+                continue
+            if trace.namespace.startswith(REPLAY_NS):
+                self.last_replay = trace.timestamp
+            elif trace.namespace.startswith(READY_NS_PREFIXES):
+                self.ready_sec = round(trace.timestamp - self.since, 2)
+                if self.last_replay is not None:
+                    self.replay_sec = round(self.last_replay - self.since, 2)
+
+
+async def _get_block_num(cluster: api.Cluster, node: str) -> int | None:
+    try:
+        metrics = await cluster.metrics(node=node)
+    except api.ClusterError:
+        return None
+    return prometheus.get_block_num(metrics=metrics.metrics)
+
+
+async def get_tip_block_num(cluster: api.Cluster, nodes: tp.Iterable[str]) -> int | None:
+    """Get the highest block number of the nodes, None when no node reports it."""
+    block_nums = await asyncio.gather(*(_get_block_num(cluster=cluster, node=n) for n in nodes))
+    return max((b for b in block_nums if b is not None), default=None)
+
+
+async def _is_socket_up(socket_path: pl.Path) -> bool:
+    try:
+        __, writer = await asyncio.open_unix_connection(path=socket_path)
+    except OSError:
+        return False
+    writer.close()
+    with contextlib.suppress(OSError):
+        await writer.wait_closed()
+    return True
+
+
+async def restart_and_measure(
+    cluster: api.Cluster,
+    nodes: list[str],
+    all_nodes: list[str],
+    timeout: float = REPLAY_TIMEOUT_SEC,
+) -> list[structs.NodeRestartResult]:
+    """Restart the nodes and measure how long it takes until they are usable again.
+
+    For every node, the time until its socket accepts connections, until the ledger
+    replay is finished and until its tip catches up with the chain is measured from the
+    restart. The chain tip is the tip before the restart, or the current tip of the nodes
+    that were not restarted, whichever is higher. Times that were not reached within
+    the timeout are None.
+    """
+    statedir = cluster.statedir
+    others = [n for n in all_nodes if n not in nodes]
+    chain_blocks = await get_tip_block_num(cluster=cluster, nodes=all_nodes)
+    # Nodes without a Prometheus endpoint don't report their tip
+    with_metrics = {
+        n for n in nodes if prometheus.get_prometheus_address(statedir=statedir, node=n)
+    }
+
+    followers = {n: LogFollower(logfile=statedir / f"{n}.stdout") for n in nodes}
+    restarted_at = time.time()
+    trackers = {n: ReplayTracker(since=restarted_at) for n in nodes}
+    await cluster.restart_nodes(nodes=nodes)
+
+    socket_up: dict[str, float | None] = dict.fromkeys(nodes)
+    caught_up: dict[str, float | None] = dict.fromkeys(nodes)
+    deadline = time.monotonic() + timeout
+    while True:
+        elapsed = round(time.time() - restarted_at, 2)
+        target = max(chain_blocks or 0, (await get_tip_block_num(cluster, others) or 0))
+        for node in nodes:
+            if socket_up[node] is None and await _is_socket_up(statedir / f"{node}.socket"):
+                socket_up[node] = elapsed
+            trackers[node].feed(await asyncio.to_thread(followers[node].read_new_lines))
+            if caught_up[node] is None and node in with_metrics and socket_up[node] is not None:
+                block_num = await _get_block_num(cluster=cluster, node=node)
+                if block_num is not None and block_num >= target:
+                    caught_up[node] = elapsed
+
+        finished = all(
+            socket_up[n] is not None
+            and trackers[n].ready_sec is not None
+            and (caught_up[n] is not None or n not in with_metrics)
+            for n in nodes
+        )
+        if finished or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(RESTART_POLL_SEC)
+
+    return [
+        structs.NodeRestartResult(
+            node=n,
+            restarted_at=dt.datetime.fromtimestamp(restarted_at, tz=dt.timezone.utc),
+            chain_blocks=chain_blocks,
+            socket_up_sec=socket_up[n],
+            replay_sec=trackers[n].replay_sec,
+            caught_up_sec=caught_up[n],
+            ready_sec=trackers[n].ready_sec,
+        )
+        for n in nodes
+    ]
+
+
+def _collect_node_results(
+    statedir: pl.Path, started_at: float, config: structs.CombinedConfig
+) -> dict[str, structs.NodeBenchResult]:
+    usage: dict[str, structs.ProgramUsage] = {}
+    try:
+        usage = {
+            p.program: p
+            for p in resource_usage.get_resource_report(statedir=statedir).programs
+            if p.program in config.ledgerdb_backends
+        }
+    except FileNotFoundError:
+        LOGGER.warning(f"No resource usage samples in '{statedir}'.")
+
+    results = {}
+    for node, backend in config.ledgerdb_backends.items():
+        adoption_ms = sorted(get_adoption_times_ms(statedir=statedir, node=node, since=started_at))
+        node_usage = usage.get(node)
+        results[node] = structs.NodeBenchResult(
+            ledgerdb_backend=backend,
+            rss_mib_p50=node_usage.rss_mib.p50 if node_usage else None,
+            rss_mib_max=node_usage.rss_mib.max if node_usage else None,
+            cpu_percent_p50=node_usage.cpu_percent.p50 if node_usage else None,
+            disk_mib=get_node_disk_usage_mib(statedir=statedir, node=node),
+            blocks_adopted=len(adoption_ms),
+            adoption_ms_p50=round(helpers.percentile(adoption_ms, 50), 1) if adoption_ms else None,
+            adoption_ms_p95=round(helpers.percentile(adoption_ms, 95), 1) if adoption_ms else None,
+            replay_sec=None,
+        )
+    return results
+
+
+async def run_backend(params: BenchParams, backend: str) -> structs.BackendBenchResult:
+    """Start the testnet with the UTxO backend, put it under load and collect the results."""
+    env = {
+        "UTXO_BACKEND": backend,
+        "TX_TPS": str(params.tx_tps),
+        "RESOURCE_SAMPLE_INTERVAL": str(SAMPLE_INTERVAL_SEC),
+    }
+    if params.load in LOAD_GENERATORS:
+        env[LOAD_GENERATORS[params.load]] = "1"
+
+    cluster = api.Cluster(
+        testnet_variant=params.testnet_variant,
+        workdir=params.workdir,
+        instance_num=params.instance_num,
+        comment=f"bench backends: {backend}",
+        stake_pools_num=params.stake_pools_num,
+        topology_seed=params.topology_seed,
+        env=env,
+    )
+    result = structs.BackendBenchResult(backend=backend, instance=-1, nodes={}, error=None)
+
+    try:
+        await cluster.start()
+        result.instance = cluster.instance_num
+        await cluster.wait_started(timeout=params.start_timeout_sec)
+        started_at = time.time()
+        LOGGER.info(f"Backend '{backend}': running for {params.duration_sec} sec.")
+        await asyncio.sleep(params.duration_sec)
+
+        config = await cluster.config()
+        result.nodes = await asyncio.to_thread(
+            _collect_node_results, statedir=cluster.statedir, started_at=started_at, config=config
+        )
+
+        LOGGER.info(f"Backend '{backend}': restarting nodes to measure the ledger replay.")
+        nodes = list(result.nodes)
+        for restart in await restart_and_measure(cluster=cluster, nodes=nodes, all_nodes=nodes):
+            result.nodes[restart.node].replay_sec = restart.replay_sec
+    except (api.ClusterError, TimeoutError, OSError) as excp:
+        LOGGER.error(f"Backend '{backend}' failed: {excp}")  # noqa: TRY400
+        result.error = str(excp)
+    finally:
+        if cluster.instance_num >= 0:
+            try:
+                await cluster.stop()
+            except api.ClusterError as excp:
+                LOGGER.warning(f"Failed to stop instance {cluster.instance_num}: {excp}")
+
+    return result
+
+
+async def compare_backends(
+    params: BenchParams, backends: tuple[str, ...] = consts.UTXO_BACKENDS
+) -> structs.BackendsBenchReport:
+    """Run the benchmark for every backend, one after another."""
+    results = [await run_backend(params=params, backend=b) for b in backends]
+    return structs.BackendsBenchReport(
+        testnet_variant=params.testnet_variant,
+        stake_pools_num=params.stake_pools_num,
+        duration_sec=params.duration_sec,
+        load=params.load,
+        tx_tps=params.tx_tps,
+        topology_seed=params.topology_seed,
+        results=results,
+    )
+
+
+def append_restart_history(
+    history_file: pl.Path, results: tp.Iterable[structs.NodeRestartResult]
+) -> None:
+    with open(history_file, "a", encoding="utf-8") as fp_out:
+        fp_out.writelines(f"{r.model_dump_json()}\n" for r in results)
+
+
+def load_restart_history(history_file: pl.Path) -> list[structs.NodeRestartResult]:
+    """Load results of all the restart benchmarks recorded for the instance."""
+    history = []
+    with contextlib.suppress(FileNotFoundError), open(history_file, encoding="utf-8") as fp_in:
+        for line in fp_in:
+            with contextlib.suppress(ValueError):
+                history.append(structs.NodeRestartResult.model_validate_json(line))
+    return history
+
+
+async def bench_restart(
+    cluster: api.Cluster,
+    nodes: tp.Sequence[str] = (),
+    one_at_a_time: bool = False,
+    timeout: float = REPLAY_TIMEOUT_SEC,
+) -> structs.RestartBenchReport:
+    """Restart nodes of a started testnet and measure how long they take to be usable again.
+
+    All the nodes are restarted when none are given. With `one_at_a_time`, every node is
+    restarted only after the previous one is usable again, or the timeout has passed.
+    The results are appended to the history file in the state dir.
+    """
+    statedir = cluster.statedir
+    all_nodes = await asyncio.to_thread(node_logs.get_node_names, statedir=statedir)
+    selected = list(nodes) or all_nodes
+    batches = [[n] for n in selected] if one_at_a_time else [selected]
+
+    results = []
+    for batch in batches:
+        LOGGER.info(f"Restarting {', '.join(batch)}.")
+        results.extend(
+            await restart_and_measure(
+                cluster=cluster, nodes=batch, all_nodes=all_nodes, timeout=timeout
+            )
+        )
+
+    history_file = statedir / RESTART_HISTORY_FILE
+    await asyncio.to_thread(append_restart_history, history_file=history_file, results=results)
+    return structs.RestartBenchReport(
+        instance=cluster.instance_num,
+        one_at_a_time=one_at_a_time,
+        results=results,
+        history_file=history_file,
+    )
+
+
+def _fmt(value: float | None, unit: str = "") -> str:
+    return "-" if value is None else f"{value:g}{unit}"
+
+
+def _aggregate(
+    result: structs.BackendBenchResult,
+    field: str,
+    func: tp.Callable[[list[float]], float],
+) -> float | None:
+    values = [v for n in result.nodes.values() if (v := getattr(n, field)) is not None]
+    return round(func(values), 1) if values else None
+
+
+def format_backends_markdown(report: structs.BackendsBenchReport) -> str:
+    """Format the report as Markdown tables, with the backends side by side."""
+    results = report.results
+    summary = (
+        ("Max replay time", "replay_sec", max, " s"),
+        ("Max RSS of a node", "rss_mib_max", max, " MiB"),
+        ("Disk usage, all nodes", "disk_mib", sum, " MiB"),
+        ("Max p95 block adoption", "adoption_ms_p95", max, " ms"),
+    )
+    header = ["", *(r.backend for r in results)]
+    rows = [
+        [title, *(_fmt(_aggregate(result=r, field=field, func=func), unit) for r in results)]
+        for title, field, func, unit in summary
+    ]
+    rows.append(["Error", *(r.error or "-" for r in results)])
+
+    description = (
+        f"{report.stake_pools_num} pools, {report.duration_sec} s of `{report.load}` load at "
+        f"{report.tx_tps} TPS, topology seed {report.topology_seed}."
+    )
+    node_columns = (
+        "Node",
+        "Backend",
+        "LedgerDB",
+        "Replay",
+        "RSS p50",
+        "RSS max",
+        "CPU p50",
+        "Disk",
+        "Adoption p50",
+        "Adoption p95",
+    )
+    lines = [
+        f"# UTxO backends: {report.testnet_variant}",
+        "",
+        description,
+        "",
+        "| " + " | ".join(header) + " |",
+        "|" + "---|" * len(header),
+        *("| " + " | ".join(r) + " |" for r in rows),
+        "",
+        "| " + " | ".join(node_columns) + " |",
+        "|" + "---|" * len(node_columns),
+    ]
+    for result in results:
+        lines.extend(
+            f"| {node} | {result.backend} | {n.ledgerdb_backend} | {_fmt(n.replay_sec, ' s')} | "
+            f"{_fmt(n.rss_mib_p50, ' MiB')} | {_fmt(n.rss_mib_max, ' MiB')} | "
+            f"{_fmt(n.cpu_percent_p50, ' %')} | {_fmt(n.disk_mib, ' MiB')} | "
+            f"{_fmt(n.adoption_ms_p50, ' ms')} | {_fmt(n.adoption_ms_p95, ' ms')} |"
+            for node, n in result.nodes.items()
+        )
+    return "\n".join(lines)
+
+
+def _per_kblock(value: float | None, chain_blocks: int | None) -> float | None:
+    if value is None or not chain_blocks:
+        return None
+    return round(value / chain_blocks * 1000, 3)
+
+
+def format_restart_markdown(
+    report: structs.RestartBenchReport, history: list[structs.NodeRestartResult]
+) -> str:
+    """Format the report and the recorded history as Markdown tables."""
+    columns = (
+        "Node",
+        "Chain blocks",
+        "Socket up",
+        "Replay",
+        "Ready",
+        "Caught up",
+        "Replay per 1k blocks",
+    )
+    lines = [
+        f"# Node restarts: instance {report.instance}",
+        "",
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns),
+        *(
+            f"| {r.node} | {_fmt(r.chain_blocks)} | {_fmt(r.socket_up_sec, ' s')} | "
+            f"{_fmt(r.replay_sec, ' s')} | {_fmt(r.ready_sec, ' s')} | "
+            f"{_fmt(r.caught_up_sec, ' s')} | "
+            f"{_fmt(_per_kblock(r.replay_sec, r.chain_blocks), ' s')} |"
+            for r in report.results
+        ),
+    ]
+
+    if len(history) > len(report.results):
+        history_columns = ("Time", "Node", "Chain blocks", "Replay", "Caught up")
+        lines.extend(
+            (
+                "",
+                "## Replay time by chain length",
+                "",
+                "| " + " | ".join(history_columns) + " |",
+                "|" + "---|" * len(history_columns),
+            )
+        )
+        lines.extend(
+            f"| {r.restarted_at:%Y-%m-%d %H:%M:%S} | {r.node} | {_fmt(r.chain_blocks)} | "
+            f"{_fmt(r.replay_sec, ' s')} | {_fmt(r.caught_up_sec, ' s')} |"
+            for r in sorted(history, key=lambda r: (r.chain_blocks or 0, r.node))
+        )
+    return "\n".join(lines)
@@ -7,8 +7,7 @@ import stat
 import time
 import typing as tp
 
-import filelock
-
+from cardonnay import consts
 from cardonnay import ttypes
 
 LOGGER = logging.getLogger(__name__)
@@ -76,6 +75,15 @@ def get_running_instances(workdir: pl.Path) -> set[int]:
     return instances
 
 
+def get_instance_state(statedir: pl.Path) -> str:
+    """Get state of the testnet instance, one of `consts.States`."""
+    if not (statedir / "supervisord.sock").exists():
+        return consts.States.STOPPED
+    if (statedir / STATUS_STARTED).exists():
+        return consts.States.STARTED
+    return consts.States.STARTING
+
+
 def get_available_instances(workdir: pl.Path) -> tp.Generator[int, None, None]:
     running_instances = get_running_instances(workdir)
     avail_instances = (i for i in range(MAX_INSTANCES) if i not in running_instances)
@@ -155,6 +163,8 @@ def delay_instance(instance_num: int, workdir: pl.Path) -> bool:
 
     Returns False if the instance is already delayed or the delay cannot be created.
     """
+    import filelock  # noqa: PLC0415
+
     create_workdir(workdir=workdir)
     lockfile = str(workdir / DELAY_LOCK)
     try:
@@ -183,6 +193,8 @@ def undelay_instance(instance_num: int, workdir: pl.Path) -> bool:
     Best-effort cleanup: returns False if the delay file cannot be removed; the stale
     delay then expires on its own within `DELAY_VALID_SEC` seconds.
     """
+    import filelock  # noqa: PLC0415
+
     lockfile = str(workdir / DELAY_LOCK)
     try:
         with filelock.FileLock(lock_file=lockfile, timeout=2):
@@ -196,3 +208,93 @@ def undelay_instance(instance_num: int, workdir: pl.Path) -> bool:
         return False
 
     return True
+
+
+class InstanceBusyError(RuntimeError):
+    """No instance can be reserved right now, the reservation can be retried later."""
+
+
+def reserve_instance(
+    workdir: pl.Path,
+    instance_num: int = -1,
+    testnet_variant: str = "",
+    capacity_check: tp.Callable[[int], str] | None = None,
+    dry_run: bool = False,
+) -> int:
+    """Reserve a free testnet instance by creating its delay file.
+
+    When selecting a free instance and `testnet_variant` is given, instances whose
+    `cluster{N}_{testnet_variant}` dir already exists are preferred, so the dir can be reused.
+
+    Args:
+        workdir: Absolute path to the existing workdir.
+        instance_num: Instance number to reserve, a free one is selected when negative.
+        testnet_variant: Testnet variant whose existing instance dirs are preferred.
+        capacity_check: Called with the number of instances that are being started;
+            returns the reason why no other instance can be started, or empty string.
+        dry_run: Only check that the instance can be reserved, don't create the delay file.
+
+    Returns:
+        The reserved instance number.
+
+    Raises:
+        InstanceBusyError: The instance is in use, or there is no capacity for it.
+        RuntimeError: The reservation failed.
+    """
+    import filelock  # noqa: PLC0415
+
+    from cardonnay import instance_registry  # noqa: PLC0415
+
+    lockfile = str(workdir / DELAY_LOCK)
+    try:
+        with filelock.FileLock(lock_file=lockfile, timeout=2):
+            instances = instance_registry.get_instances(workdir=workdir)
+            running_instances = {
+                i for i, e in instances.items() if e["state"] != consts.States.STOPPED
+            }
+            delay_instances = get_delay_instances(workdir=workdir)
+            if instance_num < 0:
+                free_instances = sorted(
+                    (
+                        i
+                        for i in range(MAX_INSTANCES)
+                        if i not in running_instances and i not in delay_instances
+                    ),
+                    key=lambda i: (
+                        not (
+                            testnet_variant and (workdir / f"cluster{i}_{testnet_variant}").is_dir()
+                        ),
+                        i,
+                    ),
+                )
+                if not free_instances:
+                    msg = "All instances are already in use."
+                    raise InstanceBusyError(msg)
+                instance_num = free_instances[0]
+            elif instance_num in running_instances:
+                msg = f"Instance number {instance_num} is already in use."
+                raise InstanceBusyError(msg)
+            elif instance_num in delay_instances:
+                msg = (
+                    f"There was a recent attempt to start/stop the instance number "
+                    f"{instance_num}. Re-try later."
+                )
+                raise InstanceBusyError(msg)
+
+            if capacity_check:
+                starting = delay_instances | {
+                    i for i, e in instances.items() if e["state"] == consts.States.STARTING
+                }
+                if reason := capacity_check(len(starting)):
+                    raise InstanceBusyError(reason)
+
+            if not dry_run:
+                create_delay_file(instance_num=instance_num, workdir=workdir)
+    except filelock.Timeout:
+        msg = f"Failed to acquire lock '{lockfile}'. Re-try later."
+        raise InstanceBusyError(msg) from None
+    except OSError as excp:
+        msg = f"Failed to reserve testnet instance: {excp}"
+        raise RuntimeError(msg) from excp
+
+    return instance_num
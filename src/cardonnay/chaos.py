@@ -0,0 +1,499 @@
+"""Chaos runs: scheduled pauses, kills and restarts of the nodes of a started testnet.
+
+The schedule is a JSON or YAML file with events at given seconds from the start of the
+run, and blocks of random events that are generated from the seed, e.g.:
+
+    seed: 42
+    settle_sec: 120
+    groups: {edge: [pool2, pool3]}
+    events:
+      - {at: 60, action: pause, targets: [pool1], duration: 30}
+      - {at: 180, action: kill, targets: [edge], pick: 1, duration: 20}
+    random:
+      - {count: 5, start: 300, end: 600, actions: [pause, kill, restart], targets: [pools]}
+
+A "pause" sends SIGSTOP to the node and a "resume" SIGCONT, a "kill" sends SIGKILL.
+"stop", "start" and "restart" are done by supervisor. With `duration`, a pause, kill or
+stop is reverted after the given number of seconds.
+
+Tips of all the nodes are sampled from their Prometheus endpoints during the run. The
+report compares block production, divergence of the node tips and tx inclusion latency
+before the first event, during the events and after the last event, and lists how long
+every disrupted node took to catch up with the others.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import datetime as dt
+import itertools
+import json
+import logging
+import math
+import pathlib as pl
+import random
+import signal
+import time
+import typing as tp
+
+import pydantic
+
+from cardonnay import api
+from cardonnay import consts
+from cardonnay import node_logs
+from cardonnay import prometheus
+from cardonnay import structs
+from cardonnay import tx_latency
+
+LOGGER = logging.getLogger(__name__)
+
+# Events of every run are appended to this file in the state dir, one JSON object per line
+EVENTS_FILE = "chaos_events.jsonl"
+# Actions that disrupt a node, with the action that reverts them
+REVERT_ACTIONS: dict[str, structs.ChaosAction] = {
+    "pause": "resume",
+    "kill": "start",
+    "stop": "start",
+}
+DISRUPT_ACTIONS = (*REVERT_ACTIONS, "restart")
+# Supervisor programs of the tx load generators
+LOAD_PROGRAMS = {
+    "firehose": "tx_firehose",
+    "generator": "tx_generator",
+    "centrifuge": "tx_centrifuge",
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class PlannedEvent:
+    offset_sec: float
+    action: structs.ChaosAction
+    node: str
+    revert: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class TipSample:
+    offset_sec: float
+    # Block number of the node tip, None when the node didn't respond
+    tips: dict[str, int | None]
+
+    @property
+    def reported(self) -> list[int]:
+        return [t for t in self.tips.values() if t is not None]
+
+
+def load_schedule(schedule_file: pl.Path) -> structs.ChaosSchedule:
+    """Load the schedule from a JSON file, or from a YAML file when PyYAML is installed.
+
+    Raises:
+        ValueError: The schedule cannot be parsed or is not valid.
+    """
+    text = schedule_file.read_text(encoding="utf-8")
+    if schedule_file.suffix in (".yaml", ".yml"):
+        try:
+            import yaml  # noqa: PLC0415
+        except ImportError as excp:
+            msg = "PyYAML is needed for YAML schedules, install it or use a JSON schedule."
+            raise ValueError(msg) from excp
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as excp:
+            msg = f"Invalid YAML in '{schedule_file}': {excp}"
+            raise ValueError(msg) from excp
+    else:
+        data = json.loads(text)
+
+    try:
+        return structs.ChaosSchedule.model_validate(data)
+    except pydantic.ValidationError as excp:
+        msg = f"Invalid chaos schedule '{schedule_file}': {excp}"
+        raise ValueError(msg) from excp
+
+
+def get_groups(schedule: structs.ChaosSchedule, nodes: tp.Sequence[str]) -> dict[str, list[str]]:
+    """Get the built-in and the user defined groups of nodes."""
+    groups = {
+        "nodes": list(nodes),
+        "bfts": [n for n in nodes if n.startswith("bft")],
+        "pools": [n for n in nodes if n.startswith("pool")],
+    }
+    groups.update(schedule.groups)
+    return groups
+
+
+def _resolve_targets(
+    targets: tp.Iterable[str], groups: dict[str, list[str]], nodes: tp.Sequence[str]
+) -> list[str]:
+    resolved: list[str] = []
+    for target in targets:
+        members = [target] if target in nodes else groups.get(target)
+        if members is None:
+            msg = f"Unknown node or group '{target}', available nodes: {', '.join(nodes)}."
+            raise ValueError(msg)
+        if unknown := sorted(set(members).difference(nodes)):
+            msg = f"Group '{target}' has unknown nodes: {', '.join(unknown)}."
+            raise ValueError(msg)
+        resolved.extend(m for m in members if m not in resolved)
+    return resolved
+
+
+def _expand(
+    offset_sec: float,
+    action: structs.ChaosAction,
+    nodes: tp.Iterable[str],
+    duration: float,
+) -> list[PlannedEvent]:
+    planned = []
+    for node in nodes:
+        planned.append(PlannedEvent(offset_sec=offset_sec, action=action, node=node))
+        if duration > 0 and action in REVERT_ACTIONS:
+            planned.append(
+                PlannedEvent(
+                    offset_sec=round(offset_sec + duration, 3),
+                    action=REVERT_ACTIONS[action],
+                    node=node,
+                    revert=True,
+                )
+            )
+    return planned
+
+
+def plan_events(
+    schedule: structs.ChaosSchedule, nodes: tp.Sequence[str], seed: int
+) -> list[PlannedEvent]:
+    """Expand the events and the random events of the schedule, ordered by time.
+
+    The same schedule and seed give always the same events.
+
+    Raises:
+        ValueError: An event targets an unknown node or group.
+    """
+    rng = random.Random(seed)
+    groups = get_groups(schedule=schedule, nodes=nodes)
+
+    planned: list[PlannedEvent] = []
+    for event in schedule.events:
+        targets = _resolve_targets(targets=event.targets, groups=groups, nodes=nodes)
+        if event.pick:
+            targets = rng.sample(targets, k=min(event.pick, len(targets)))
+        planned.extend(
+            _expand(
+                offset_sec=event.at, action=event.action, nodes=targets, duration=event.duration
+            )
+        )
+
+    for block in schedule.random:
+        if block.end <= block.start or block.max_duration < block.min_duration:
+            msg = "Random events need `start` < `end` and `min_duration` <= `max_duration`."
+            raise ValueError(msg)
+        targets = _resolve_targets(targets=block.targets, groups=groups, nodes=nodes)
+        for __ in range(block.count):
+            planned.extend(
+                _expand(
+                    offset_sec=round(rng.uniform(block.start, block.end), 3),
+                    action=rng.choice(block.actions),
+                    nodes=rng.sample(targets, k=min(block.pick, len(targets))),
+                    duration=round(rng.uniform(block.min_duration, block.max_duration), 3),
+                )
+            )
+
+    return sorted(planned, key=lambda e: e.offset_sec)
+
+
+def _to_datetime(timestamp: float) -> dt.datetime:
+    return dt.datetime.fromtimestamp(timestamp, tz=dt.timezone.utc)
+
+
+async def _do_action(cluster: api.Cluster, action: structs.ChaosAction, node: str) -> None:
+    if action == "pause":
+        await cluster.signal_node(node=node, sig=signal.SIGSTOP)
+    elif action == "resume":
+        await cluster.signal_node(node=node, sig=signal.SIGCONT)
+    elif action == "kill":
+        await cluster.signal_node(node=node, sig=signal.SIGKILL)
+    elif action == "stop":
+        await cluster.stop_programs(programs=[f"nodes:{node}"])
+    elif action == "start":
+        await cluster.start_programs(programs=[f"nodes:{node}"])
+    else:
+        await cluster.restart_nodes(nodes=[node])
+
+
+async def _run_event(
+    cluster: api.Cluster, event: PlannedEvent, started_at: float, events_file: pl.Path
+) -> structs.ChaosEventRecord:
+    at = time.time()
+    error = ""
+    try:
+        await _do_action(cluster=cluster, action=event.action, node=event.node)
+    except api.ClusterError as excp:
+        error = str(excp)
+        LOGGER.warning(f"Chaos event '{event.action}' of '{event.node}' failed: {excp}")
+    else:
+        LOGGER.info(f"Chaos event: {event.action} {event.node}")
+
+    record = structs.ChaosEventRecord(
+        at=_to_datetime(at),
+        offset_sec=round(at - started_at, 3),
+        action=event.action,
+        node=event.node,
+        revert=event.revert,
+        error=error,
+    )
+    with open(events_file, "a", encoding="utf-8") as fp_out:
+        fp_out.write(f"{record.model_dump_json()}\n")
+    return record
+
+
+async def _run_events(
+    cluster: api.Cluster, planned: list[PlannedEvent], start: float, events_file: pl.Path
+) -> list[structs.ChaosEventRecord]:
+    """Run every event at its time, without waiting for the previous events to finish."""
+    started_at = time.time() - (time.monotonic() - start)
+    tasks = []
+    for event in planned:
+        if (delay := start + event.offset_sec - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        tasks.append(
+            asyncio.create_task(
+                _run_event(
+                    cluster=cluster, event=event, started_at=started_at, events_file=events_file
+                )
+            )
+        )
+    return list(await asyncio.gather(*tasks))
+
+
+async def _get_block_num(cluster: api.Cluster, node: str, timeout: float) -> int | None:
+    try:
+        metrics = await asyncio.wait_for(cluster.metrics(node=node), timeout=timeout)
+    except (api.ClusterError, asyncio.TimeoutError):
+        # A paused node doesn't respond
+        return None
+    return prometheus.get_block_num(metrics=metrics.metrics)
+
+
+async def _sample_tips(
+    cluster: api.Cluster,
+    nodes: tp.Sequence[str],
+    start: float,
+    until: float,
+    interval: float,
+) -> list[TipSample]:
+    samples = []
+    while (offset := time.monotonic() - start) < until:
+        tips = await asyncio.gather(
+            *(_get_block_num(cluster=cluster, node=n, timeout=interval) for n in nodes)
+        )
+        samples.append(
+            TipSample(offset_sec=round(offset, 3), tips=dict(zip(nodes, tips, strict=True)))
+        )
+        await asyncio.sleep(max(interval - (time.monotonic() - start - offset), 0))
+    return samples
+
+
+def _tip_at(samples: list[TipSample], offset_sec: float) -> int | None:
+    """Get the highest block number of the last sample before the offset."""
+    tip = None
+    for sample in samples:
+        if sample.offset_sec > offset_sec:
+            break
+        if sample.reported:
+            tip = max(sample.reported)
+    return tip
+
+
+def get_phase(
+    name: str,
+    samples: list[TipSample],
+    start_offset: float,
+    end_offset: float,
+    started_at: float,
+    config: structs.CombinedConfig,
+    tx_times: tx_latency.TxTimes,
+) -> structs.ChaosPhase:
+    """Summarize block production, tip divergence and tx latency of the phase of the run."""
+    duration = end_offset - start_offset
+    in_phase = [s for s in samples if start_offset <= s.offset_sec < end_offset]
+    spreads = [max(s.reported) - min(s.reported) for s in in_phase if s.reported]
+
+    divergent_sec = 0.0
+    for sample, next_sample in itertools.zip_longest(in_phase, in_phase[1:]):
+        next_offset = next_sample.offset_sec if next_sample else end_offset
+        if sample.reported and max(sample.reported) != min(sample.reported):
+            divergent_sec += next_offset - sample.offset_sec
+
+    first_tip = _tip_at(samples=samples, offset_sec=start_offset)
+    last_tip = _tip_at(samples=samples, offset_sec=end_offset)
+    blocks = last_tip - first_tip if first_tip is not None and last_tip is not None else None
+    expected_blocks = None
+    if config.slotLength and config.activeSlotsCoeff:
+        expected_blocks = round(duration / config.slotLength * config.activeSlotsCoeff, 1)
+
+    latency = tx_latency.get_latency_report(
+        tx_times=tx_times,
+        interval_sec=max(math.ceil(duration), 1),
+        grace_sec=consts.LATENCY_GRACE_SEC,
+        since=started_at + start_offset,
+        until=started_at + end_offset,
+    ).total
+
+    return structs.ChaosPhase(
+        name=name,
+        start=_to_datetime(started_at + start_offset),
+        end=_to_datetime(started_at + end_offset),
+        blocks=blocks,
+        expected_blocks=expected_blocks,
+        blocks_per_min=round(blocks / duration * 60, 2) if blocks is not None else None,
+        max_spread_blocks=max(spreads) if spreads else None,
+        divergent_sec=round(divergent_sec, 1),
+        latency=latency,
+    )
+
+
+def get_recoveries(
+    events: list[structs.ChaosEventRecord], samples: list[TipSample]
+) -> list[structs.ChaosRecovery]:
+    """Get how long every disrupted node took to catch up with the highest tip.
+
+    The outage of a paused, killed or stopped node lasts until the event that reverts
+    it; a killed node that is not started by the schedule is expected to be restarted
+    by supervisor (`autorestart`). The outage of a restarted node is the restart itself.
+    """
+    recoveries: list[structs.ChaosRecovery] = []
+    if not samples:
+        return recoveries
+
+    for num, event in enumerate(events):
+        if event.error or event.revert or event.action not in DISRUPT_ACTIONS:
+            continue
+        restored_offset = event.offset_sec
+        if event.action in REVERT_ACTIONS:
+            restored_offset = next(
+                (
+                    e.offset_sec
+                    for e in events[num + 1 :]
+                    if e.node == event.node and e.action == REVERT_ACTIONS[event.action]
+                ),
+                samples[-1].offset_sec if event.action != "kill" else event.offset_sec,
+            )
+        caught_up_sec = next(
+            (
+                round(s.offset_sec - restored_offset, 2)
+                for s in samples
+                if s.offset_sec > restored_offset
+                and s.tips.get(event.node) is not None
+                and s.tips[event.node] == max(s.reported)
+            ),
+            None,
+        )
+        recoveries.append(
+            structs.ChaosRecovery(
+                node=event.node,
+                action=event.action,
+                disrupted_at=event.at,
+                outage_sec=round(restored_offset - event.offset_sec, 2),
+                caught_up_sec=caught_up_sec,
+            )
+        )
+    return recoveries
+
+
+async def _resume_all(cluster: api.Cluster, nodes: tp.Iterable[str]) -> None:
+    """Make sure no node is left paused after the run."""
+    for node in nodes:
+        with contextlib.suppress(api.ClusterError):
+            await cluster.signal_node(node=node, sig=signal.SIGCONT)
+
+
+async def _start_load(cluster: api.Cluster, load: tp.Sequence[str]) -> list[str]:
+    """Start the supervisor programs of the load generators, return the started ones."""
+    states = await cluster.program_states()
+    started = []
+    for gen in load:
+        program = LOAD_PROGRAMS[gen]
+        programs = [p for p in states if p == program or p.startswith(f"{program}:")]
+        if not programs:
+            msg = f"The '{gen}' tx load generator is not enabled for the instance."
+            raise api.ClusterError(msg)
+        if idle := [p for p in programs if states[p] != "RUNNING"]:
+            await cluster.start_programs(programs=idle)
+            started.extend(idle)
+    return started
+
+
+async def run_chaos(
+    cluster: api.Cluster,
+    schedule: structs.ChaosSchedule,
+    schedule_file: pl.Path,
+    seed: int,
+    load: tp.Sequence[str] = (),
+) -> structs.ChaosReport:
+    """Run the schedule on the started testnet, optionally under tx load, and report impact.
+
+    The load generators are started before the run, when not running already, and
+    stopped after it.
+
+    Raises:
+        ValueError: An event targets an unknown node or group.
+        api.ClusterError: The load generators cannot be started.
+    """
+    statedir = cluster.statedir
+    nodes = await asyncio.to_thread(node_logs.get_node_names, statedir=statedir)
+    planned = plan_events(schedule=schedule, nodes=nodes, seed=seed)
+    config = await cluster.config()
+    events_file = statedir / EVENTS_FILE
+
+    run_sec = (planned[-1].offset_sec if planned else 0) + schedule.settle_sec
+    started_load: list[str] = []
+    try:
+        started_load = await _start_load(cluster=cluster, load=load)
+        LOGGER.info(f"Running {len(planned)} chaos events over {run_sec:.0f} sec, seed {seed}.")
+        start = time.monotonic()
+        started_at = time.time()
+        events, samples = await asyncio.gather(
+            _run_events(cluster=cluster, planned=planned, start=start, events_file=events_file),
+            _sample_tips(
+                cluster=cluster,
+                nodes=nodes,
+                start=start,
+                until=run_sec,
+                interval=schedule.sample_interval_sec,
+            ),
+        )
+        end_offset = time.monotonic() - start
+    finally:
+        await _resume_all(cluster=cluster, nodes=nodes)
+        if started_load:
+            await cluster.stop_programs(programs=started_load)
+
+    tx_times = await asyncio.to_thread(tx_latency.collect_tx_times, statedir=statedir)
+    bounds = [("baseline", 0.0)]
+    if planned:
+        bounds.extend((("chaos", planned[0].offset_sec), ("recovery", planned[-1].offset_sec)))
+    bounds.append(("", end_offset))
+    phases = [
+        get_phase(
+            name=name,
+            samples=samples,
+            start_offset=phase_start,
+            end_offset=phase_end,
+            started_at=started_at,
+            config=config,
+            tx_times=tx_times,
+        )
+        for (name, phase_start), (__, phase_end) in itertools.pairwise(bounds)
+        if phase_end > phase_start
+    ]
+
+    return structs.ChaosReport(
+        instance=cluster.instance_num,
+        schedule_file=schedule_file,
+        seed=seed,
+        load=list(load),
+        events_file=events_file,
+        events=events,
+        phases=phases,
+        recoveries=get_recoveries(events=events, samples=samples),
+    )
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import typing as tp
+
+from cardonnay import api
+from cardonnay import bench
+from cardonnay import ca_utils
+from cardonnay import consts
+from cardonnay import helpers
+from cardonnay import node_logs
+from cardonnay import variants
+
+LOGGER = logging.getLogger(__name__)
+
+
+def cmd_backends(
+    testnet_variant: str,
+    workdir: str,
+    instance_num: int,
+    backends: tp.Sequence[str],
+    stake_pools_num: int,
+    duration_sec: int,
+    load: str,
+    tx_tps: int,
+    topology_seed: int,
+    start_timeout_sec: int,
+    output_format: str,
+) -> int:
+    """Compare UTxO backends on the same testnet variant and load profile."""
+    if not variants.variant_exists(
+        name=testnet_variant, workdir=ca_utils.get_workdir(workdir=workdir).absolute()
+    ):
+        LOGGER.error(f"Testnet variant '{testnet_variant}' does not exist.")
+        return 1
+
+    params = bench.BenchParams(
+        testnet_variant=testnet_variant,
+        workdir=workdir,
+        instance_num=instance_num,
+        stake_pools_num=stake_pools_num,
+        duration_sec=duration_sec,
+        load=load,
+        tx_tps=tx_tps,
+        topology_seed=topology_seed,
+        start_timeout_sec=start_timeout_sec,
+    )
+    report = asyncio.run(
+        bench.compare_backends(params=params, backends=tuple(backends or consts.UTXO_BACKENDS))
+    )
+
+    if output_format == "markdown":
+        print(bench.format_backends_markdown(report=report))
+    else:
+        helpers.print_json(data=report)
+
+    return 1 if any(r.error for r in report.results) else 0
+
+
+def cmd_restart(
+    workdir: str,
+    instance_num: int,
+    nodes: tp.Sequence[str],
+    one_at_a_time: bool,
+    timeout_sec: int,
+    output_format: str,
+) -> int:
+    """Restart nodes of a started testnet and report how long they take to be usable again."""
+    cluster = api.Cluster.attach(instance_num=instance_num, workdir=workdir)
+    statedir = cluster.statedir
+    if not (statedir / ca_utils.STATUS_STARTED).exists():
+        LOGGER.error(f"Instance {instance_num} is not started.")
+        return 1
+
+    avail_nodes = node_logs.get_node_names(statedir=statedir)
+    if unknown := sorted(set(nodes).difference(avail_nodes)):
+        LOGGER.error(
+            f"Unknown nodes: {', '.join(unknown)}, available nodes: {', '.join(avail_nodes)}."
+        )
+        return 1
+
+    try:
+        report = asyncio.run(
+            bench.bench_restart(
+                cluster=cluster, nodes=nodes, one_at_a_time=one_at_a_time, timeout=timeout_sec
+            )
+        )
+    except api.ClusterError as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    if output_format == "markdown":
+        history = bench.load_restart_history(history_file=report.history_file)
+        print(bench.format_restart_markdown(report=report, history=history))
+    else:
+        helpers.print_json(data=report)
+
+    # Nodes that didn't get ready within the timeout
+    return 1 if any(r.ready_sec is None for r in report.results) else 0
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import pathlib as pl
+import random
+import typing as tp
+
+from cardonnay import api
+from cardonnay import ca_utils
+from cardonnay import chaos
+from cardonnay import helpers
+
+LOGGER = logging.getLogger(__name__)
+
+
+def cmd_chaos(
+    workdir: str,
+    instance_num: int,
+    schedule_file: str,
+    seed: int | None,
+    load: tp.Sequence[str],
+) -> int:
+    """Run the chaos schedule on a started testnet and report the impact."""
+    schedule_pl = pl.Path(schedule_file).absolute()
+    try:
+        schedule = chaos.load_schedule(schedule_file=schedule_pl)
+    except (OSError, ValueError) as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    cluster = api.Cluster.attach(instance_num=instance_num, workdir=workdir)
+    if not (cluster.statedir / ca_utils.STATUS_STARTED).exists():
+        LOGGER.error(f"Instance {instance_num} is not started.")
+        return 1
+
+    # The seed is recorded in the report, so a random run can be repeated
+    if seed is None:
+        seed = schedule.seed if schedule.seed is not None else random.randrange(2**32)
+
+    try:
+        report = asyncio.run(
+            chaos.run_chaos(
+                cluster=cluster,
+                schedule=schedule,
+                schedule_file=schedule_pl,
+                seed=seed,
+                load=load,
+            )
+        )
+    except (ValueError, api.ClusterError) as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    helpers.print_json(data=report)
+    return 1 if any(e.error for e in report.events) else 0
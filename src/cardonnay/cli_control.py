@@ -11,8 +11,11 @@ import typing as tp
 from cardonnay import ca_utils
 from cardonnay import colors
 from cardonnay import consts
+from cardonnay import daemon_client
+from cardonnay import fs_watch
 from cardonnay import helpers
-from cardonnay import structs
+from cardonnay import instance_registry
+from cardonnay import resource_limits
 
 LOGGER = logging.getLogger(__name__)
 
@@ -122,6 +125,58 @@ def kill_starting_testnet(pidfile: pl.Path, statedir: pl.Path) -> bool:
     return True
 
 
+def wait_for_state(workdir: pl.Path, instance_num: int, state: str, timeout: float) -> None:
+    """Wait until the testnet instance reaches the state.
+
+    Changes are detected using inotify on the workdir and the state dir, with a fallback
+    to polling. When waiting for the `started` state, the wait ends early if the start
+    process recorded in `start_cluster{N}.pid` exits before the instance was started.
+
+    Raises:
+        TimeoutError: The state was not reached within the timeout.
+        RuntimeError: The start process exited before the instance was started.
+    """
+    statedir = workdir / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+    pidfile = workdir / f"start_cluster{instance_num}.pid"
+    deadline = time.monotonic() + timeout
+
+    with fs_watch.DirWatcher() as watcher:
+        while True:
+            # Start watching before checking the state, so no change is missed in between
+            watcher.watch(workdir)
+            watcher.watch(statedir)
+            start_pid = 0
+            if state == consts.States.STARTED and pidfile.exists():
+                start_pid = read_valid_pid(pidfile=pidfile)
+                if start_pid:
+                    watcher.watch_pid(start_pid)
+
+            if ca_utils.get_instance_state(statedir=statedir) == state:
+                return
+
+            if start_pid and not pid_exists(start_pid):
+                # The status may have been updated just before the process exited
+                if ca_utils.get_instance_state(statedir=statedir) == state:
+                    return
+                msg = (
+                    f"The start process {start_pid} of instance {instance_num} exited before "
+                    f"the instance was started, see '{workdir}/start_cluster{instance_num}.log'."
+                )
+                raise RuntimeError(msg)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                msg = f"Instance {instance_num} didn't reach the '{state}' state in {timeout} sec."
+                raise TimeoutError(msg)
+            watcher.wait(timeout=remaining)
+
+
+def remove_instance_cgroup(statedir: pl.Path) -> None:
+    """Remove the cgroup of the stopped instance, if it was created for its nodes."""
+    if cgroup := load_testnet_info(statedir=statedir).get("cgroup"):
+        resource_limits.remove_instance_cgroup(cgroup=pl.Path(cgroup))
+
+
 def kill_and_stop_testnet(instance_num: int, workdir: pl.Path) -> int:
     """Kill the start script process of a starting instance and stop the testnet cluster.
 
@@ -135,6 +190,8 @@ def kill_and_stop_testnet(instance_num: int, workdir: pl.Path) -> int:
         pidfile=workdir / f"start_cluster{instance_num}.pid", statedir=statedir
     )
     run_retval = testnet_stop(statedir=statedir, env=env)
+    instance_registry.record_instance(workdir=workdir, instance_num=instance_num, start_pid=None)
+    remove_instance_cgroup(statedir=statedir)
     if not kill_ok:
         run_retval = 1
 
@@ -214,38 +271,24 @@ def load_testnet_info(statedir: pl.Path) -> dict[str, tp.Any]:
     return loaded
 
 
-def print_instances(workdir: pl.Path) -> None:
-    """Print a JSON summary of running testnet instances.
+def get_instances_summary(workdir: pl.Path) -> list[dict[str, tp.Any]]:
+    """Get a summary of running testnet instances from the instance registry.
 
     Instances whose `testnet.json` is missing or unreadable are reported with
     type "unknown".
     """
-    running_instances = sorted(ca_utils.get_running_instances(workdir=workdir))
-    out_list: list[structs.InstanceSummary] = []
-
-    for i in running_instances:
-        statedir = workdir / f"{ca_utils.STATE_CLUSTER_PREFIX}{i}"
-        testnet_info = load_testnet_info(statedir=statedir)
-
-        testnet_name = str(testnet_info.get("name") or "unknown")
-        comment = testnet_info.get("comment")
-
-        testnet_state = (
-            consts.States.STARTED
-            if (statedir / ca_utils.STATUS_STARTED).exists()
-            else consts.States.STARTING
-        )
-
-        out_list.append(
-            structs.InstanceSummary(
-                instance=i,
-                type=testnet_name,
-                state=testnet_state,
-                comment=str(comment) if comment is not None else None,
-            )
-        )
-
-    helpers.print_json(data=[item.model_dump(mode="json") for item in out_list])
+    # Plain dicts instead of a pydantic model, `ls` is often called in loops by scripts
+    # and importing pydantic would dominate its run time
+    return [
+        {
+            "instance": i,
+            "type": entry["type"],
+            "state": entry["state"],
+            "comment": entry["comment"],
+        }
+        for i, entry in sorted(instance_registry.get_instances(workdir=workdir).items())
+        if entry["state"] != consts.States.STOPPED
+    ]
 
 
 def print_env_sh(env: dict[str, str]) -> None:
@@ -269,10 +312,18 @@ def cmd_print_env(
         LOGGER.error("Valid instance number is required.")
         return 1
 
-    if instance_num not in ca_utils.get_running_instances(workdir=workdir_pl):
+    served, data = daemon_client.try_request(
+        workdir=workdir_pl, op="print_env", params={"instance_num": instance_num}
+    )
+    if served:
+        env, running = data["env"], data["running"]
+    else:
+        env = ca_utils.create_env_vars(workdir=workdir_pl, instance_num=instance_num)
+        running = instance_num in instance_registry.get_running_instances(workdir=workdir_pl)
+
+    if not running:
         LOGGER.warning(f"Instance {instance_num} is not running.")
 
-    env = ca_utils.create_env_vars(workdir=workdir_pl, instance_num=instance_num)
     print_env_sh(env=env)
 
     return 0
@@ -281,7 +332,10 @@ def cmd_print_env(
 def cmd_ls(workdir: str) -> int:
     """List all running testnet instances."""
     workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
-    print_instances(workdir=workdir_pl)
+    served, summary = daemon_client.try_request(workdir=workdir_pl, op="ls")
+    if not served:
+        summary = get_instances_summary(workdir=workdir_pl)
+    helpers.print_json(data=summary)
     return 0
 
 
@@ -380,3 +434,53 @@ def cmd_stopall(workdir: str) -> int:
         run_retval = stop_instance(instance_num=i, workdir=workdir_pl) or run_retval
 
     return run_retval
+
+
+def cmd_wait(
+    workdir: str,
+    instance_num: int,
+    state: str,
+    timeout: float,
+    dbsync_synced: bool = False,
+    max_lag_blocks: int = 0,
+) -> int:
+    """Wait until the testnet instance reaches the state.
+
+    With `dbsync_synced`, also wait until db-sync lags behind the node tip by at most
+    `max_lag_blocks` blocks.
+
+    Returns 0 when the state was reached, 1 on timeout or when the start failed.
+    """
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if instance_num < 0:
+        LOGGER.error("Valid instance number is required.")
+        return 1
+
+    if dbsync_synced and state != consts.States.STARTED:
+        LOGGER.error(f"Waiting for db-sync requires the '{consts.States.STARTED}' state.")
+        return 1
+
+    deadline = time.monotonic() + timeout
+    try:
+        wait_for_state(workdir=workdir_pl, instance_num=instance_num, state=state, timeout=timeout)
+        if dbsync_synced:
+            from cardonnay import dbsync  # noqa: PLC0415
+
+            if not dbsync.is_enabled(statedir=statedir):
+                LOGGER.error("db-sync is not enabled for the instance.")
+                return 1
+            status = dbsync.wait_for_sync(
+                statedir=statedir,
+                max_lag_blocks=max_lag_blocks,
+                timeout=max(deadline - time.monotonic(), 0),
+            )
+            LOGGER.info(f"db-sync is at block {status.block}, {status.lag_blocks} blocks behind.")
+    except (TimeoutError, RuntimeError) as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+    except KeyboardInterrupt:
+        return 1
+
+    return 0
@@ -1,21 +1,27 @@
 import json
 import logging
+import os
 import pathlib as pl
 import shlex
 import shutil
 
-import filelock
-
-import cardonnay_scripts
+from cardonnay import allocator
 from cardonnay import ca_utils
 from cardonnay import cli_control
 from cardonnay import colors
+from cardonnay import genesis_params
 from cardonnay import helpers
+from cardonnay import instance_registry
 from cardonnay import local_scripts
+from cardonnay import postgres
+from cardonnay import resource_limits
 from cardonnay import structs
+from cardonnay import variants
 
 LOGGER = logging.getLogger(__name__)
 
+TRACE_PROFILE_PREFIX = "trace-profile-"
+
 
 def write_env_vars(env: dict[str, str], workdir: pl.Path, instance_num: int) -> None:
     """Write environment variables to a file for sourcing later."""
@@ -25,29 +31,34 @@ def write_env_vars(env: dict[str, str], workdir: pl.Path, instance_num: int) ->
     sfile.write_text("\n".join(content))
 
 
-def print_available_testnets(scripts_base: pl.Path, verbose: bool) -> int:
-    """Print available testnet variants."""
+def print_available_testnets(scripts_base: pl.Path, workdir: pl.Path, verbose: bool) -> int:
+    """Print available testnet variants, including the user variants of the workdir.
+
+    With `verbose`, print also the info of every variant and its effective changes
+    to the base files.
+    """
     if not scripts_base.exists():
         LOGGER.error(f"Scripts directory '{scripts_base}' does not exist.")
         return 1
-    avail_scripts = sorted(
-        d.name
-        for d in scripts_base.iterdir()
-        if d.is_dir()
-        if not ("egg-info" in d.name or d.name == "common")
-    )
+    avail_scripts = variants.get_builtin_variants(scripts_base=scripts_base)
     if not avail_scripts:
         LOGGER.error(f"No script directories found in '{scripts_base}'.")
         return 1
+    avail_scripts.extend(
+        v for v in variants.get_user_variants(workdir=workdir) if v not in avail_scripts
+    )
 
     if verbose:
         out_list = []
         for d in avail_scripts:
             try:
-                with open(scripts_base / d / ca_utils.TESTNET_JSON, encoding="utf-8") as fp_in:
-                    testnet_info = json.load(fp_in) or {}
-            except Exception:
-                testnet_info = {"name": d}
+                files = variants.resolve_files(name=d, workdir=workdir, scripts_base=scripts_base)
+                testnet_info = json.loads(files[ca_utils.TESTNET_JSON]) or {}
+                testnet_info["overlay"] = variants.get_variant_diff(
+                    name=d, workdir=workdir, scripts_base=scripts_base
+                )
+            except Exception as excp:
+                testnet_info = {"name": d, "error": str(excp)}
             out_list.append(testnet_info)
         helpers.print_json(data=out_list)
     else:
@@ -117,6 +128,9 @@ def testnet_start(
             LOGGER.exception("Failed to start the testnet cluster")
             return 1
         pidfile.write_text(str(start_process.pid))
+        instance_registry.record_instance(
+            workdir=workdir, instance_num=instance_num, start_pid=start_process.pid
+        )
 
         statedir = workdir / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
         helpers.print_json(get_start_info(statedir=statedir, testnet_variant=testnet_variant))
@@ -130,12 +144,22 @@ def testnet_start(
         except (RuntimeError, OSError):
             LOGGER.exception("Failed to start the testnet cluster")
             return 1
+        finally:
+            instance_registry.record_instance(workdir=workdir, instance_num=instance_num)
 
     return 0
 
 
-def add_comment(destdir: pl.Path, comment: str) -> None:
-    """Add a comment to the testnet info file in the destination directory."""
+def get_trace_profiles(scripts_base: pl.Path) -> list[str]:
+    """Get names of the trace profiles available in the common scripts dir."""
+    return sorted(
+        f.stem.removeprefix(TRACE_PROFILE_PREFIX)
+        for f in (scripts_base / "common").glob(f"{TRACE_PROFILE_PREFIX}*.json")
+    )
+
+
+def update_testnet_info(destdir: pl.Path, **fields: object) -> None:
+    """Add or update fields in the testnet info file in the destination directory."""
     testnet_file = destdir / ca_utils.TESTNET_JSON
     try:
         with open(testnet_file, encoding="utf-8") as fp_in:
@@ -143,10 +167,100 @@ def add_comment(destdir: pl.Path, comment: str) -> None:
     except Exception:
         testnet_info = {}
 
-    testnet_info["comment"] = comment
+    testnet_info.update(fields)
     helpers.write_json(out_file=testnet_file, content=testnet_info)
 
 
+def generate_testnet_files(
+    destdir: pl.Path,
+    scriptsdir: pl.Path,
+    workdir: pl.Path,
+    instance_num: int,
+    stake_pools_num: int,
+    ports_base: int,
+    trace_profile: str,
+    comment: str,
+    keep: bool,
+    testnet_variant: str = "",
+    cpus: str = "",
+    mem_max_mib: int = 0,
+    topology_seed: int | None = None,
+    dbsync_schema_dir: str = "",
+    genesis_overrides: dict[str, int | float] | None = None,
+) -> dict[str, str]:
+    """Generate scripts and files of the testnet instance to the destination dir.
+
+    The `scriptsdir` is the dir of the resolved testnet variant, see `variants`.
+    Returns environment variables for the start script, including the CPU affinity and
+    memory limit of the nodes when requested. When db-sync is enabled and the shared
+    Postgres server of the workdir is running, the db-sync database is created from
+    a template database on that server.
+
+    The `genesis_overrides` are applied to the genesis spec files in the destination dir
+    and recorded in `testnet.json`.
+
+    The destination dir is reused when `keep` is set, the generated files are overwritten.
+    """
+    if not keep:
+        shutil.rmtree(destdir, ignore_errors=True)
+
+    destdir.mkdir(parents=True, exist_ok=keep)
+
+    local_scripts.prepare_scripts_files(
+        destdir=destdir,
+        scriptsdir=scriptsdir,
+        instance_num=instance_num,
+        num_pools=stake_pools_num,
+        ports_base=ports_base,
+        topology_seed=topology_seed,
+    )
+    if genesis_overrides:
+        genesis_params.apply_overrides(destdir=destdir, overrides=genesis_overrides)
+
+    env = ca_utils.create_env_vars(workdir=workdir, instance_num=instance_num)
+    env["TRACE_PROFILE"] = trace_profile
+
+    testnet_fields: dict[str, object] = {"trace_profile": trace_profile}
+    if comment:
+        testnet_fields["comment"] = comment
+    if topology_seed is not None:
+        testnet_fields["topology_seed"] = topology_seed
+    if genesis_overrides:
+        testnet_fields["genesis_params"] = genesis_overrides
+    if cpus or mem_max_mib:
+        env["NODE_CPUS"] = cpus
+        env["NODE_MEM_MAX_MIB"] = str(mem_max_mib)
+        cgroup = resource_limits.setup_instance_cgroup(
+            workdir=workdir, instance_num=instance_num, cpus=cpus, mem_max_mib=mem_max_mib
+        )
+        if cgroup:
+            env["NODE_CGROUP"] = str(cgroup)
+            testnet_fields["cgroup"] = str(cgroup)
+    if dbsync_schema_dir and postgres.get_server_port(workdir=workdir) is not None:
+        env.update(
+            postgres.get_instance_env(workdir=workdir, schema_dir=pl.Path(dbsync_schema_dir))
+        )
+        testnet_fields["dbsync_template"] = env[postgres.TEMPLATE_ENV]
+    update_testnet_info(destdir=destdir, **testnet_fields)
+    write_env_vars(env=env, workdir=workdir, instance_num=instance_num)
+
+    instance_registry.record_instance(
+        workdir=workdir,
+        instance_num=instance_num,
+        type=testnet_variant or scriptsdir.name,
+        comment=comment or None,
+        ports=local_scripts.get_ports_summary(
+            scriptsdir=scriptsdir,
+            instance_num=instance_num,
+            num_pools=stake_pools_num,
+            ports_base=ports_base,
+        ),
+        start_pid=None,
+    )
+
+    return env
+
+
 def cmd_create(  # noqa: PLR0911, C901
     testnet_variant: str,
     comment: str,
@@ -156,21 +270,52 @@ def cmd_create(  # noqa: PLR0911, C901
     keep: bool,
     stake_pools_num: int,
     ports_base: int,
+    trace_profile: str,
     workdir: str,
     instance_num: int,
     verbose: int,
+    wait: bool = False,
+    wait_timeout: int = 3600,
+    max_load: float = allocator.DEFAULT_MAX_LOAD,
+    node_mem: int = allocator.DEFAULT_NODE_MEM_MIB,
+    cpus: str = "",
+    mem_max: int = 0,
+    topology_seed: int | None = None,
+    genesis_overrides: dict[str, int | float] | None = None,
 ) -> int:
     """Create a testnet cluster with the specified parameters."""
-    scripts_base = pl.Path(str(cardonnay_scripts.SCRIPTS_ROOT))
+    scripts_base = variants.get_scripts_base()
+    workdir_pl = ca_utils.get_workdir(workdir=workdir)
+    workdir_abs = workdir_pl.absolute()
 
     if listit or not testnet_variant:
-        return print_available_testnets(scripts_base=scripts_base, verbose=bool(verbose))
+        return print_available_testnets(
+            scripts_base=scripts_base, workdir=workdir_abs, verbose=bool(verbose)
+        )
 
-    scriptsdir = scripts_base / testnet_variant
-    if not scriptsdir.exists():
-        LOGGER.error(f"Testnet variant '{testnet_variant}' does not exist in '{scripts_base}'.")
+    if not variants.variant_exists(
+        name=testnet_variant, workdir=workdir_abs, scripts_base=scripts_base
+    ):
+        LOGGER.error(
+            f"Testnet variant '{testnet_variant}' does not exist in '{scripts_base}' "
+            f"nor in '{workdir_abs / variants.USER_VARIANTS_DIR}'."
+        )
         return 1
 
+    if trace_profile not in (avail_profiles := get_trace_profiles(scripts_base=scripts_base)):
+        LOGGER.error(
+            f"Trace profile '{trace_profile}' does not exist, "
+            f"available profiles: {', '.join(avail_profiles)}."
+        )
+        return 1
+
+    if cpus:
+        try:
+            resource_limits.parse_cpu_list(cpus=cpus)
+        except ValueError as excp:
+            LOGGER.error(f"Invalid CPU list '{cpus}': {excp}")  # noqa: TRY400
+            return 1
+
     if instance_num > ca_utils.MAX_INSTANCES:
         LOGGER.error(
             f"Instance number {instance_num} exceeds maximum allowed {ca_utils.MAX_INSTANCES}."
@@ -178,46 +323,50 @@ def cmd_create(  # noqa: PLR0911, C901
         return 1
 
     if workdir and (
-        run_inst_default := ca_utils.get_running_instances(workdir=ca_utils.get_workdir(workdir=""))
+        run_inst_default := instance_registry.get_running_instances(
+            workdir=ca_utils.get_workdir(workdir="")
+        )
     ):
         run_insts_str = ",".join(sorted(str(i) for i in run_inst_default))
         LOGGER.error(f"Instances running in the default workdir '{workdir}': {run_insts_str}")
         LOGGER.error("Stop them first before using custom work dir.")
         return 1
 
-    workdir_pl = ca_utils.get_workdir(workdir=workdir)
-    workdir_abs = workdir_pl.absolute()
     ca_utils.create_workdir(workdir=workdir_abs)
 
-    lockfile = str(workdir_abs / ca_utils.DELAY_LOCK)
     try:
-        with filelock.FileLock(lock_file=lockfile, timeout=2):
-            avail_instances_gen = ca_utils.get_available_instances(workdir=workdir_abs)
-            delay_instances = ca_utils.get_delay_instances(workdir=workdir_abs)
-            if instance_num < 0:
-                free_instance = next(
-                    (i for i in avail_instances_gen if i not in delay_instances), None
-                )
-                if free_instance is None:
-                    LOGGER.error("All instances are already in use.")
-                    return 1
-                instance_num = free_instance
-            elif instance_num not in avail_instances_gen:
-                LOGGER.error(f"Instance number {instance_num} is already in use.")
-                return 1
-            elif instance_num in delay_instances:
-                LOGGER.error(
-                    f"There was a recent attempt to start/stop the instance number "
-                    f"{instance_num}. Re-try later."
-                )
-                return 1
+        scriptsdir = variants.resolve_variant(
+            name=testnet_variant, workdir=workdir_abs, scripts_base=scripts_base
+        )
+    except RuntimeError as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    if genesis_overrides:
+        try:
+            genesis_params.validate(scriptsdir=scriptsdir, overrides=genesis_overrides)
+        except ValueError as excp:
+            LOGGER.error(f"Invalid genesis parameters: {excp}")  # noqa: TRY400
+            return 1
 
-            ca_utils.create_delay_file(instance_num=instance_num, workdir=workdir_abs)
-    except filelock.Timeout:
-        LOGGER.error(f"Failed to acquire lock '{lockfile}'. Re-try later.")  # noqa: TRY400
+    try:
+        instance_num = allocator.allocate_instance(
+            workdir=workdir_abs,
+            instance_num=instance_num,
+            # Only a dir that is kept is worth reusing
+            testnet_variant=testnet_variant if keep else "",
+            # Generating the files doesn't need any capacity
+            num_nodes=0 if generate_only else stake_pools_num + 1,
+            limits=allocator.Capacity(max_load=max_load, node_mem_mib=node_mem),
+            wait=wait,
+            timeout=wait_timeout,
+        )
+    except ca_utils.InstanceBusyError as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        LOGGER.error("Use `--wait` to wait until an instance can be started.")  # noqa: TRY400
         return 1
-    except OSError as excp:
-        LOGGER.error(f"Failed to reserve testnet instance: {excp}")  # noqa: TRY400
+    except (RuntimeError, TimeoutError) as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
         return 1
 
     destdir = workdir_pl / f"cluster{instance_num}_{testnet_variant}"
@@ -226,35 +375,29 @@ def cmd_create(  # noqa: PLR0911, C901
     def _undelay() -> None:
         ca_utils.undelay_instance(instance_num=instance_num, workdir=workdir_abs)
 
-    if not keep:
-        shutil.rmtree(destdir_abs, ignore_errors=True)
-
-    if destdir.exists():
-        LOGGER.error(f"Destination directory '{destdir}' already exists.")
-        _undelay()
-        return 1
-
-    destdir_abs.mkdir(parents=True)
-
     try:
-        local_scripts.prepare_scripts_files(
+        env = generate_testnet_files(
             destdir=destdir_abs,
             scriptsdir=scriptsdir,
+            workdir=workdir_abs,
             instance_num=instance_num,
-            num_pools=stake_pools_num,
+            stake_pools_num=stake_pools_num,
             ports_base=ports_base,
+            trace_profile=trace_profile,
+            comment=comment,
+            keep=keep,
+            testnet_variant=testnet_variant,
+            cpus=cpus,
+            mem_max_mib=mem_max,
+            topology_seed=topology_seed,
+            dbsync_schema_dir=os.environ.get("DBSYNC_SCHEMA_DIR", ""),
+            genesis_overrides=genesis_overrides,
         )
     except Exception:
         LOGGER.exception("Failure")
         _undelay()
         return 1
 
-    if comment:
-        add_comment(destdir=destdir_abs, comment=comment)
-
-    env = ca_utils.create_env_vars(workdir=workdir_abs, instance_num=instance_num)
-    write_env_vars(env=env, workdir=workdir_abs, instance_num=instance_num)
-
     LOGGER.debug(f"Testnet files generated to {destdir}")
 
     run_retval = 0
@@ -0,0 +1,104 @@
+import contextlib
+import logging
+import pathlib as pl
+import sys
+import time
+
+from cardonnay import ca_utils
+from cardonnay import daemon_client
+from cardonnay import helpers
+
+LOGGER = logging.getLogger(__name__)
+
+DAEMON_START_TIMEOUT_SEC = 10
+DAEMON_STOP_TIMEOUT_SEC = 10
+
+
+def get_daemon_info(workdir: pl.Path) -> dict | None:
+    """Return info about the running daemon, None when it is not running."""
+    with contextlib.suppress(OSError, daemon_client.DaemonError):
+        info: dict = daemon_client.request(workdir=workdir, op="ping", timeout=2)
+        return info
+    return None
+
+
+def cmd_start(workdir: str) -> int:
+    """Start the daemon for the workdir in background and wait until it serves requests."""
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+
+    if get_daemon_info(workdir=workdir_pl) is not None:
+        LOGGER.warning(f"The daemon is already running in '{workdir_pl}'.")
+        return 0
+
+    try:
+        ca_utils.create_workdir(workdir=workdir_pl)
+    except (RuntimeError, OSError) as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    # Pass a custom workdir as an absolute path, the daemon doesn't run in the current dir
+    cmd = [sys.executable, "-m", "cardonnay", "daemon", "run"]
+    if workdir:
+        cmd.extend(["-w", str(workdir_pl)])
+    logfile = workdir_pl / daemon_client.LOGFILE_NAME
+    try:
+        daemon_process = helpers.run_detached_command(
+            command=cmd, logfile=logfile, workdir=workdir_pl
+        )
+    except OSError:
+        LOGGER.exception("Failed to start the daemon")
+        return 1
+
+    deadline = time.monotonic() + DAEMON_START_TIMEOUT_SEC
+    while time.monotonic() < deadline:
+        if (info := get_daemon_info(workdir=workdir_pl)) is not None:
+            helpers.print_json(data=info)
+            return 0
+        if daemon_process.poll() is not None:
+            break
+        time.sleep(0.1)
+
+    LOGGER.error(f"The daemon failed to start, see '{logfile}'.")
+    return 1
+
+
+def cmd_stop(workdir: str) -> int:
+    """Shut down the daemon for the workdir and wait until it exits."""
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+
+    try:
+        daemon_client.request(workdir=workdir_pl, op="shutdown", timeout=5)
+    except (OSError, daemon_client.DaemonError):
+        LOGGER.warning(f"The daemon is not running in '{workdir_pl}'.")
+        return 0
+
+    socket_path = daemon_client.get_socket_path(workdir_pl)
+    deadline = time.monotonic() + DAEMON_STOP_TIMEOUT_SEC
+    while time.monotonic() < deadline:
+        if not socket_path.exists():
+            return 0
+        time.sleep(0.1)
+
+    LOGGER.error(f"The daemon didn't shut down in {DAEMON_STOP_TIMEOUT_SEC} sec.")
+    return 1
+
+
+def cmd_status(workdir: str) -> int:
+    """Print info about the daemon; return 1 when it is not running."""
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+
+    info = get_daemon_info(workdir=workdir_pl)
+    helpers.print_json(data={"running": info is not None, **(info or {})})
+    return 0 if info is not None else 1
+
+
+def cmd_run(workdir: str) -> int:
+    """Run the daemon in the foreground."""
+    # The daemon imports the heavy dependencies of all the commands it serves
+    from cardonnay import daemon  # noqa: PLC0415
+
+    try:
+        return daemon.run_daemon(workdir_arg=workdir)
+    except (RuntimeError, OSError) as excp:
+        LOGGER.error(f"The daemon failed: {excp}")  # noqa: TRY400
+        return 1
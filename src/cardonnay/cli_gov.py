@@ -0,0 +1,127 @@
+import logging
+import pathlib as pl
+import tempfile
+
+from cardonnay import cli_load
+from cardonnay import gov
+from cardonnay import helpers
+from cardonnay import inspect_instance
+from cardonnay import structs
+from cardonnay import txbuild
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _propose(
+    ctx: txbuild.TxContext,
+    statedir: pl.Path,
+    payer: structs.AddressData,
+    pparams: dict[str, int],
+    hardfork: int | None,
+    proposal_file: str,
+    workdir: pl.Path,
+) -> str:
+    """Create the proposal unless given, submit it and return the action ID."""
+    deposit = int(
+        txbuild.query_protocol_params(ctx=ctx, out_file=workdir / "pparams.json")[
+            "govActionDeposit"
+        ]
+    )
+    if proposal_file:
+        proposal_pl = pl.Path(proposal_file).absolute()
+    elif hardfork is not None:
+        proposal_pl = gov.create_hardfork_action(
+            ctx=ctx,
+            statedir=statedir,
+            major_version=hardfork,
+            deposit=deposit,
+            prev_action_id=gov.get_prev_action_id(
+                gov_state=gov.query_gov_state(ctx=ctx), purpose=gov.PURPOSE_HARDFORK
+            ),
+            out_file=workdir / "hardfork.action",
+        )
+    else:
+        proposal_pl = gov.create_pparams_action(
+            ctx=ctx,
+            statedir=statedir,
+            pparams=pparams,
+            deposit=deposit,
+            prev_action_id=gov.get_prev_action_id(
+                gov_state=gov.query_gov_state(ctx=ctx), purpose=gov.PURPOSE_PPARAMS
+            ),
+            out_file=workdir / "pparams.action",
+        )
+
+    action_id = gov.submit_proposal(
+        ctx=ctx, payer=payer, proposal_file=proposal_pl, deposit=deposit, workdir=workdir
+    )
+    LOGGER.info(f"Proposed the governance action {action_id}.")
+    return action_id
+
+
+def cmd_enact(
+    workdir: str,
+    instance_num: int,
+    pparams: tuple[str, ...],
+    hardfork: int | None,
+    proposal_file: str,
+    action_id: str,
+    wait: bool,
+    timeout: int,
+) -> int:
+    """Propose a governance action, vote on it and wait for its enactment."""
+    if sum(bool(s) for s in (pparams, hardfork is not None, proposal_file, action_id)) != 1:
+        LOGGER.error(
+            "Exactly one of `--pparam`, `--hardfork`, `--proposal-file` or `--action-id` "
+            "must be given."
+        )
+        return 1
+
+    try:
+        pparams_dict = gov.parse_pparams(pairs=pparams)
+    except ValueError as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    if action_id and "#" not in action_id:
+        action_id = f"{action_id}#0"
+
+    statedir = cli_load.get_started_statedir(
+        workdir=workdir, instance_num=instance_num, need_cli=True
+    )
+    if statedir is None:
+        return 1
+
+    ctx = txbuild.get_tx_context(statedir=statedir)
+    faucet = inspect_instance.load_faucet_data(statedir=statedir)
+    slot_length = inspect_instance.get_config(statedir=statedir).slotLength or 1.0
+    try:
+        with tempfile.TemporaryDirectory(dir=statedir, prefix="gov-") as tmpdir:
+            if not action_id:
+                action_id = _propose(
+                    ctx=ctx,
+                    statedir=statedir,
+                    payer=faucet,
+                    pparams=pparams_dict,
+                    hardfork=hardfork,
+                    proposal_file=proposal_file,
+                    workdir=pl.Path(tmpdir),
+                )
+            report = gov.enact_action(
+                ctx=ctx,
+                statedir=statedir,
+                payer=faucet,
+                action_id=action_id,
+                workdir=pl.Path(tmpdir),
+                wait=wait,
+                timeout=timeout,
+                slot_length=slot_length,
+            )
+            if wait and pparams_dict:
+                gov.check_pparams(ctx=ctx, pparams=pparams_dict, workdir=pl.Path(tmpdir))
+    except (RuntimeError, TimeoutError, OSError) as excp:
+        LOGGER.error(f"Governance action failed: {excp}")  # noqa: TRY400
+        return 1
+
+    helpers.print_json(data=report)
+    return 0
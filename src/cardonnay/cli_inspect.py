@@ -1,9 +1,15 @@
+import asyncio
+import datetime as dt
 import logging
 import pathlib as pl
+import sys
+import typing as tp
 
 from cardonnay import ca_utils
+from cardonnay import consts
+from cardonnay import daemon_client
 from cardonnay import helpers
-from cardonnay import inspect_instance
+from cardonnay import node_logs
 
 LOGGER = logging.getLogger(__name__)
 
@@ -30,6 +36,15 @@ def cmd_faucet(workdir: str, instance_num: int) -> int:
     if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
         return ret
 
+    served, data = daemon_client.try_request(
+        workdir=workdir_pl, op="faucet", params={"instance_num": instance_num}
+    )
+    if served:
+        helpers.print_json(data=data)
+        return 0
+
+    from cardonnay import inspect_instance  # noqa: PLC0415
+
     helpers.print_json(data=inspect_instance.load_faucet_data(statedir=statedir))
     return 0
 
@@ -41,6 +56,15 @@ def cmd_pools(workdir: str, instance_num: int) -> int:
     if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
         return ret
 
+    served, data = daemon_client.try_request(
+        workdir=workdir_pl, op="pools", params={"instance_num": instance_num}
+    )
+    if served:
+        helpers.print_json(data=data)
+        return 0
+
+    from cardonnay import inspect_instance  # noqa: PLC0415
+
     pools_data = [
         d.model_dump(mode="json") for d in inspect_instance.load_pools_data(statedir=statedir)
     ]
@@ -55,6 +79,15 @@ def cmd_status(workdir: str, instance_num: int) -> int:
     if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
         return ret
 
+    served, data = daemon_client.try_request(
+        workdir=workdir_pl, op="status", params={"instance_num": instance_num}
+    )
+    if served:
+        helpers.print_json(data=data)
+        return 0
+
+    from cardonnay import inspect_instance  # noqa: PLC0415
+
     helpers.print_json(data=inspect_instance.get_testnet_info(statedir=statedir))
     return 0
 
@@ -66,5 +99,179 @@ def cmd_config(workdir: str, instance_num: int) -> int:
     if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
         return ret
 
+    served, data = daemon_client.try_request(
+        workdir=workdir_pl, op="config", params={"instance_num": instance_num}
+    )
+    if served:
+        helpers.print_json(data=data)
+        return 0
+
+    from cardonnay import inspect_instance  # noqa: PLC0415
+
     helpers.print_json(data=inspect_instance.get_config(statedir=statedir))
     return 0
+
+
+def cmd_latency(workdir: str, instance_num: int, interval_sec: int, grace_sec: int) -> int:
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
+        return ret
+
+    from cardonnay import tx_latency  # noqa: PLC0415
+
+    tx_times = tx_latency.collect_tx_times(statedir=statedir)
+    if not tx_times.submitted:
+        LOGGER.warning("No submitted transactions found in the tx generator logs.")
+
+    report = tx_latency.get_latency_report(
+        tx_times=tx_times, interval_sec=interval_sec, grace_sec=grace_sec
+    )
+    helpers.print_json(data=report)
+    return 0
+
+
+def cmd_resources(
+    workdir: str, instance_num: int, last_sec: int | None, programs: tp.Sequence[str]
+) -> int:
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
+        return ret
+
+    from cardonnay import resource_usage  # noqa: PLC0415
+
+    try:
+        report = resource_usage.get_resource_report(
+            statedir=statedir, last_sec=last_sec, programs=programs
+        )
+    except FileNotFoundError:
+        LOGGER.error(  # noqa: TRY400
+            "No resource usage samples found, the instance was not started with the sampler."
+        )
+        return 1
+
+    if not report.programs:
+        LOGGER.warning("No samples found for the selected programs and period.")
+
+    helpers.print_json(data=report)
+    return 0
+
+
+def cmd_dbsync(workdir: str, instance_num: int, rate_interval: float) -> int:
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
+        return ret
+
+    from cardonnay import dbsync  # noqa: PLC0415
+
+    if not dbsync.is_enabled(statedir=statedir):
+        LOGGER.error("db-sync is not enabled for the instance.")
+        return 1
+
+    try:
+        status = dbsync.get_status(statedir=statedir, rate_interval=rate_interval)
+    except (OSError, ValueError) as excp:
+        LOGGER.error(f"Cannot read db-sync progress: {excp}")  # noqa: TRY400
+        return 1
+
+    helpers.print_json(data=status)
+    return 0
+
+
+def cmd_forks(
+    workdir: str,
+    instance_num: int,
+    follow_sec: int,
+    last_sec: int | None,
+    prolonged_sec: float,
+) -> int:
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
+        return ret
+
+    from cardonnay import forks  # noqa: PLC0415
+    from cardonnay import inspect_instance  # noqa: PLC0415
+
+    records_file = statedir / forks.RECORDS_FILE
+    since = None
+    if last_sec:
+        since = dt.datetime.now(tz=dt.timezone.utc).timestamp() - last_sec
+
+    if follow_sec:
+        if ca_utils.get_instance_state(statedir=statedir) != consts.States.STARTED:
+            LOGGER.error(f"Instance {instance_num} is not started.")
+            return 1
+        nodes = node_logs.get_node_names(statedir=statedir)
+        if not (sockets := forks.get_sockets(statedir=statedir, nodes=nodes)):
+            LOGGER.error("No node socket found for the instance.")
+            return 1
+        monitor = forks.ForkMonitor(
+            sockets=sockets,
+            network_magic=inspect_instance.get_config(statedir=statedir).networkMagic or 0,
+            records_file=records_file,
+        )
+        LOGGER.info(f"Following the chains of {', '.join(sockets)} for {follow_sec} sec.")
+        run = asyncio.run(monitor.run(duration_sec=follow_sec))
+        since = run.start.timestamp()
+
+    try:
+        report = forks.get_forks_report(
+            records_file=records_file, since=since, prolonged_sec=prolonged_sec
+        )
+    except FileNotFoundError:
+        LOGGER.error(  # noqa: TRY400
+            "No fork records found, follow the node chains with `--follow` first."
+        )
+        return 1
+
+    helpers.print_json(data=report)
+    return 0
+
+
+def cmd_logs(
+    workdir: str,
+    instance_num: int,
+    name: str,
+    stderr: bool,
+    follow: bool,
+    tail: int | None,
+) -> int:
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if (ret := check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
+        return ret
+
+    logfile = statedir / f"{name}.{'stderr' if stderr else 'stdout'}"
+    if not any(s.exists() for s in node_logs.get_log_segments(logfile=logfile)):
+        LOGGER.error(f"Log file '{logfile.name}' doesn't exist.")
+        return 1
+
+    try:
+        if follow:
+            if tail is None:
+                # Print the whole history, the current log file is then followed from the start
+                sys.stdout.writelines(
+                    node_logs.iter_log_lines(logfile=logfile, include_current=False)
+                )
+            # The tail is read from the followed file, so no line is lost in between
+            for line in node_logs.follow_log_lines(logfile=logfile, from_end=False, tail=tail):
+                sys.stdout.write(line)
+                sys.stdout.flush()
+        elif tail is not None:
+            sys.stdout.writelines(node_logs.tail_log_lines(logfile=logfile, num_lines=tail))
+        else:
+            sys.stdout.writelines(node_logs.iter_log_lines(logfile=logfile))
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        helpers.discard_stdout()
+
+    return 0
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import pathlib as pl
+import shutil
+import socket
+import tempfile
+import time
+
+from cardonnay import ca_utils
+from cardonnay import cli_inspect
+from cardonnay import consts
+from cardonnay import corpus
+from cardonnay import helpers
+from cardonnay import inspect_instance
+from cardonnay import load
+from cardonnay import node_client
+from cardonnay import node_logs
+from cardonnay import structs
+from cardonnay import txbuild
+
+LOGGER = logging.getLogger(__name__)
+
+SUBMIT_API_HOST = "127.0.0.1"
+
+
+def _is_listening(host: str, port: int) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=2):
+            return True
+    except OSError:
+        return False
+
+
+def get_started_statedir(workdir: str, instance_num: int, need_cli: bool) -> pl.Path | None:
+    """Get state dir of the started instance, None (with the error logged) otherwise."""
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if cli_inspect.check_prereq(statedir=statedir, instance_num=instance_num) > 0:
+        return None
+
+    if ca_utils.get_instance_state(statedir=statedir) != consts.States.STARTED:
+        LOGGER.error(f"Instance {instance_num} is not started.")
+        return None
+
+    if need_cli and not shutil.which("cardano-cli"):
+        LOGGER.error("The `cardano-cli` binary is not found in PATH.")
+        return None
+
+    return statedir
+
+
+def _get_submit_api_port(statedir: pl.Path) -> int | None:
+    port = inspect_instance.get_submit_api_port(statedir=statedir)
+    if port < 0 or not _is_listening(host=SUBMIT_API_HOST, port=port):
+        LOGGER.error("submit-api is not running for the instance.")
+        return None
+    return port
+
+
+def cmd_submit_api(
+    workdir: str,
+    instance_num: int,
+    num_txs: int,
+    connections: int,
+    tps: float,
+    amount: int,
+    fee: int,
+    build_workers: int,
+) -> int:
+    """Post pre-built transactions to submit-api and report the throughput."""
+    statedir = get_started_statedir(workdir=workdir, instance_num=instance_num, need_cli=True)
+    if statedir is None:
+        return 1
+
+    if (port := _get_submit_api_port(statedir=statedir)) is None:
+        return 1
+
+    if amount - fee < txbuild.MIN_UTXO_VALUE:
+        LOGGER.error(f"The amount minus the fee must be at least {txbuild.MIN_UTXO_VALUE}.")
+        return 1
+
+    faucet = inspect_instance.load_faucet_data(statedir=statedir)
+    build_start = time.monotonic()
+    try:
+        with tempfile.TemporaryDirectory(dir=statedir, prefix="load-submit-api-") as tmpdir:
+            ctx = txbuild.get_tx_context(statedir=statedir)
+            LOGGER.info(f"Splitting faucet funds into {num_txs} UTxOs.")
+            txins = txbuild.split_utxos(
+                ctx=ctx, payer=faucet, count=num_txs, amount=amount, workdir=pl.Path(tmpdir)
+            )
+            LOGGER.info(f"Building and signing {num_txs} transactions.")
+            tx_files = txbuild.build_payment_txs(
+                ctx=ctx,
+                txins=txins,
+                payer=faucet,
+                fee=fee,
+                workdir=pl.Path(tmpdir),
+                workers=build_workers,
+            )
+            txs = [txbuild.read_tx_cbor(tx_file=f) for f in tx_files]
+    except (RuntimeError, TimeoutError, OSError) as excp:
+        LOGGER.error(f"Failed to prepare the transactions: {excp}")  # noqa: TRY400
+        return 1
+    build_sec = time.monotonic() - build_start
+
+    LOGGER.info(f"Posting {len(txs)} transactions over {connections} connections.")
+    results, duration_sec = asyncio.run(
+        load.post_txs(host=SUBMIT_API_HOST, port=port, txs=txs, connections=connections, tps=tps)
+    )
+    report = load.get_submit_report(
+        endpoint=f"http://{SUBMIT_API_HOST}:{port}{load.SUBMIT_API_PATH}",
+        results=results,
+        duration_sec=duration_sec,
+        connections=connections,
+        tps=tps,
+        build_sec=build_sec,
+    )
+    helpers.print_json(data=report)
+    return 0
+
+
+def cmd_corpus(
+    workdir: str,
+    instance_num: int,
+    corpus_file: str,
+    num_txs: int,
+    chains: int,
+    shape: corpus.TxShape,
+) -> int:
+    """Build a corpus of chained, signed transactions funded from the faucet."""
+    statedir = get_started_statedir(workdir=workdir, instance_num=instance_num, need_cli=True)
+    if statedir is None:
+        return 1
+
+    corpus_pl = pl.Path(corpus_file).absolute()
+    if corpus_pl.exists():
+        LOGGER.error(f"Corpus file '{corpus_pl}' already exists.")
+        return 1
+
+    faucet = inspect_instance.load_faucet_data(statedir=statedir)
+    try:
+        with tempfile.TemporaryDirectory(dir=statedir, prefix="txgen-corpus-") as tmpdir:
+            summary = corpus.build_corpus(
+                ctx=txbuild.get_tx_context(statedir=statedir),
+                payer=faucet,
+                corpus_file=corpus_pl,
+                shape=shape,
+                count=num_txs,
+                chains=min(chains, num_txs),
+                workdir=pl.Path(tmpdir),
+            )
+    except (RuntimeError, TimeoutError, OSError) as excp:
+        LOGGER.error(f"Failed to build the corpus: {excp}")  # noqa: TRY400
+        return 1
+
+    helpers.print_json(data=summary)
+    return 0
+
+
+def _get_submitters(
+    statedir: pl.Path, header: structs.CorpusHeader, target: str, connections: int
+) -> tuple[str, list[load.Submitter]] | None:
+    """Get the endpoint description and a submitter per connection."""
+    if target == "submit-api":
+        if (port := _get_submit_api_port(statedir=statedir)) is None:
+            return None
+        return f"http://{SUBMIT_API_HOST}:{port}{load.SUBMIT_API_PATH}", [
+            load.SubmitApiSubmitter(host=SUBMIT_API_HOST, port=port) for __ in range(connections)
+        ]
+
+    if header.era not in node_client.ERA_INDICES:
+        LOGGER.error(f"Submitting {header.era} era transactions is not supported.")
+        return None
+    sockets = [statedir / f"{n}.socket" for n in node_logs.get_node_names(statedir=statedir)]
+    if not (sockets := [s for s in sockets if s.exists()]):
+        LOGGER.error("No node socket found for the instance.")
+        return None
+    # The connections are spread over the sockets of all nodes
+    return ",".join(s.name for s in sockets), [
+        node_client.LocalTxSubmitter(
+            socket_path=sockets[c % len(sockets)],
+            network_magic=header.network_magic,
+            era=header.era,
+        )
+        for c in range(connections)
+    ]
+
+
+def cmd_replay(
+    workdir: str,
+    instance_num: int,
+    corpus_file: str,
+    target: str,
+    connections: int,
+    tps: float,
+) -> int:
+    """Submit the transaction corpus to the node sockets or submit-api at the target rate."""
+    statedir = get_started_statedir(workdir=workdir, instance_num=instance_num, need_cli=False)
+    if statedir is None:
+        return 1
+
+    try:
+        reader = corpus.CorpusReader(corpus_file=pl.Path(corpus_file))
+    except (OSError, ValueError) as excp:
+        LOGGER.error(f"Failed to open the corpus: {excp}")  # noqa: TRY400
+        return 1
+
+    with reader:
+        header = reader.header
+        network_magic = inspect_instance.get_config(statedir=statedir).networkMagic
+        if header.network_magic != network_magic:
+            LOGGER.error(
+                f"The corpus was built for network magic {header.network_magic}, "
+                f"the instance has {network_magic}."
+            )
+            return 1
+
+        # Every chain is submitted over a single connection, to keep its order
+        connections = min(connections, header.chains)
+        if not (
+            endpoint_submitters := _get_submitters(
+                statedir=statedir, header=header, target=target, connections=connections
+            )
+        ):
+            return 1
+        endpoint, submitters = endpoint_submitters
+
+        lanes = reader.get_lanes(num_lanes=connections)
+        LOGGER.info(
+            f"Submitting {sum(len(ln) for ln in lanes)} transactions to {endpoint} "
+            f"over {connections} connections."
+        )
+        results, duration_sec = asyncio.run(
+            load.submit_lanes(submitters=submitters, lanes=lanes, tps=tps)
+        )
+
+    report = load.get_submit_report(
+        endpoint=endpoint,
+        results=results,
+        duration_sec=duration_sec,
+        connections=connections,
+        tps=tps,
+        corpus=pl.Path(corpus_file).absolute(),
+    )
+    helpers.print_json(data=report)
+    return 0
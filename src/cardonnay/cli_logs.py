@@ -0,0 +1,77 @@
+import datetime as dt
+import itertools
+import logging
+import re
+import sys
+
+from cardonnay import ca_utils
+from cardonnay import cli_inspect
+from cardonnay import helpers
+from cardonnay import log_index
+from cardonnay import node_logs
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _to_timestamp(value: dt.datetime | None) -> float | None:
+    """Convert datetime to Unix time; naive datetime is in UTC, like the node traces."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return value.timestamp()
+
+
+def cmd_query(
+    workdir: str,
+    instance_num: int,
+    names: tuple[str, ...],
+    since: dt.datetime | None,
+    until: dt.datetime | None,
+    namespaces: tuple[str, ...],
+    min_severity: str,
+    regex: str,
+    limit: int | None,
+) -> int:
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    statedir = workdir_pl / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+    if (ret := cli_inspect.check_prereq(statedir=statedir, instance_num=instance_num)) > 0:
+        return ret
+
+    try:
+        pattern = re.compile(regex) if regex else None
+    except re.error as excp:
+        LOGGER.error(f"Invalid regular expression '{regex}': {excp}")  # noqa: TRY400
+        return 1
+
+    query = log_index.Query(
+        since=_to_timestamp(since),
+        until=_to_timestamp(until),
+        namespaces=namespaces,
+        min_severity=min_severity,
+        pattern=pattern,
+    )
+
+    logfiles = {
+        n: statedir / f"{n}.stdout" for n in (names or node_logs.get_node_names(statedir=statedir))
+    }
+    if not logfiles:
+        LOGGER.error("No node log files found.")
+        return 1
+    if missing := [
+        n
+        for n, f in logfiles.items()
+        if not any(s.exists() for s in node_logs.get_log_segments(logfile=f))
+    ]:
+        LOGGER.error(f"Log files don't exist for: {', '.join(missing)}")
+        return 1
+
+    matched = log_index.query_logs(logfiles=logfiles, query=query)
+    try:
+        for line in itertools.islice(matched, limit):
+            sys.stdout.write(f"{line.name}: {line.text}\n")
+    except BrokenPipeError:
+        helpers.discard_stdout()
+
+    return 0
@@ -0,0 +1,47 @@
+import logging
+
+from cardonnay import ca_utils
+from cardonnay import helpers
+from cardonnay import postgres
+
+LOGGER = logging.getLogger(__name__)
+
+
+def cmd_start(workdir: str, port: int) -> int:
+    """Start the shared Postgres server of the workdir."""
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+
+    if not postgres.has_pg_bins():
+        LOGGER.error(f"Postgres binaries are missing, needed: {', '.join(postgres.PG_BINS)}.")
+        return 1
+
+    try:
+        ca_utils.create_workdir(workdir=workdir_pl)
+        postgres.start_server(workdir=workdir_pl, port=port)
+    except (RuntimeError, OSError) as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    helpers.print_json(data=postgres.get_status(workdir=workdir_pl))
+    return 0
+
+
+def cmd_stop(workdir: str) -> int:
+    """Stop the shared Postgres server of the workdir."""
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+
+    try:
+        postgres.stop_server(workdir=workdir_pl)
+    except RuntimeError as excp:
+        LOGGER.error(str(excp))  # noqa: TRY400
+        return 1
+
+    return 0
+
+
+def cmd_status(workdir: str) -> int:
+    """Print status of the shared Postgres server of the workdir."""
+    workdir_pl = ca_utils.get_workdir(workdir=workdir).absolute()
+    status = postgres.get_status(workdir=workdir_pl)
+    helpers.print_json(data=status)
+    return 0 if status.running else 1
@@ -1,5 +1,26 @@
 import typing as tp
 
+# Defaults of the tx latency report
+LATENCY_INTERVAL_SEC: tp.Final[int] = 60
+LATENCY_GRACE_SEC: tp.Final[int] = 120
+
+# Trace severities from the lowest to the highest
+TRACE_SEVERITIES: tp.Final[tuple[str, ...]] = (
+    "Debug",
+    "Info",
+    "Notice",
+    "Warning",
+    "Error",
+    "Critical",
+    "Alert",
+    "Emergency",
+)
+
+# UTxO backends of the nodes, see `UTXO_BACKEND` in the testnet scripts
+UTXO_BACKENDS: tp.Final[tuple[str, ...]] = ("mem", "disk", "disklmdb")
+# Tx load generators of the benchmarks, "none" runs without load
+BENCH_LOADS: tp.Final[tuple[str, ...]] = ("firehose", "generator", "centrifuge", "none")
+
 
 class States:
     STARTED: tp.Final[str] = "started"
@@ -0,0 +1,448 @@
+"""Corpus of pre-built, signed transactions for replayable tx load.
+
+The corpus file starts with the magic bytes, the length of the JSON header and the header
+itself. Transactions follow as records: the length of the tx CBOR, the number of the chain
+the transaction belongs to, and the tx CBOR. Records are only ever appended, so an
+interrupted build leaves a valid corpus, and the file is read through `mmap`.
+
+Transactions of one chain spend outputs of the preceding transactions of the same chain
+and must be submitted in the corpus order. Transactions of different chains are
+independent of each other.
+"""
+
+import collections
+import concurrent.futures
+import dataclasses
+import datetime as dt
+import logging
+import math
+import mmap
+import pathlib as pl
+import struct
+import time
+import typing as tp
+
+from cardonnay import helpers
+from cardonnay import structs
+from cardonnay import txbuild
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"CDNYTXC1"
+VERSION = 1
+HEADER_LEN = struct.Struct(">I")
+# Length of the tx CBOR, number of the chain
+RECORD = struct.Struct(">IH")
+
+# CIP-20 transaction message
+METADATA_LABEL = 674
+METADATA_CHUNK = 64
+
+# Always succeeding Plutus V2 spending validator
+ALWAYS_SUCCEEDS_CBOR = "4e4d01000033222220051200120011"
+PLUTUS_DATUM = "42"
+# CPU steps and memory of the validator, with a large margin
+PLUTUS_EXUNITS = (10_000_000, 50_000)
+COLLATERAL_AMOUNT = 5_000_000
+
+# Minimal value of a chain output; outputs with an inline datum need more than the minimum
+CHAIN_MIN_VALUE = 2_000_000
+MAX_CHAIN_AMOUNT = 10**13
+# Inputs of the probe tx used for the fee calculation
+PROBE_TXID = "0" * 64
+PROBE_AMOUNT = 45_000_000_000_000
+FEE_SIZE_MARGIN = 64
+
+
+@dataclasses.dataclass(frozen=True)
+class TxShape:
+    inputs: int = 1
+    outputs: int = 1
+    metadata_bytes: int = 0
+    plutus: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class _ChainArgs:
+    """Arguments shared by all transactions of the corpus."""
+
+    shape: TxShape
+    address: str
+    skey_file: pl.Path
+    fee: int
+    txin_args: tuple[str, ...]
+    txout_args: tuple[str, ...]
+    extra_args: tuple[str, ...]
+
+
+class _LazyLane:
+    """Numbered transactions of a lane, read from the corpus only when iterated."""
+
+    def __init__(self, reader: "CorpusReader", items: list[tuple[int, int, int]]) -> None:
+        self.reader = reader
+        self.items = items
+
+    def __iter__(self) -> tp.Iterator[tuple[int, bytes]]:
+        for num, offset, length in self.items:
+            yield num, self.reader.get_tx(offset=offset, length=length)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class CorpusReader:
+    """Memory-mapped corpus file, read without loading the transactions into memory."""
+
+    def __init__(self, corpus_file: pl.Path) -> None:
+        self.corpus_file = corpus_file
+        with open(corpus_file, "rb") as fp_in:
+            self._mm = mmap.mmap(fp_in.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[: len(MAGIC)] != MAGIC:
+            self.close()
+            msg = f"'{corpus_file}' is not a tx corpus file."
+            raise ValueError(msg)
+        (header_len,) = HEADER_LEN.unpack_from(self._mm, len(MAGIC))
+        header_start = len(MAGIC) + HEADER_LEN.size
+        self.header = structs.CorpusHeader.model_validate_json(
+            self._mm[header_start : header_start + header_len]
+        )
+        self._records_start = header_start + header_len
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self) -> "CorpusReader":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def get_index(self) -> list[tuple[int, int, int]]:
+        """Get the chain number, offset and length of every complete record."""
+        index = []
+        pos, size = self._records_start, len(self._mm)
+        while pos + RECORD.size <= size:
+            length, chain = RECORD.unpack_from(self._mm, pos)
+            pos += RECORD.size
+            if pos + length > size:
+                # Partially appended record of an interrupted build
+                break
+            index.append((chain, pos, length))
+            pos += length
+        return index
+
+    def get_tx(self, offset: int, length: int) -> bytes:
+        return self._mm[offset : offset + length]
+
+    def get_lanes(self, num_lanes: int) -> list[_LazyLane]:
+        """Split the numbered transactions into lanes, every chain in a single lane."""
+        lanes: list[list[tuple[int, int, int]]] = [[] for __ in range(num_lanes)]
+        for num, (chain, offset, length) in enumerate(self.get_index()):
+            lanes[chain % num_lanes].append((num, offset, length))
+        return [_LazyLane(reader=self, items=lane) for lane in lanes]
+
+
+def write_header(corpus_file: pl.Path, header: structs.CorpusHeader) -> None:
+    """Create a new corpus file with the header."""
+    header_json = header.model_dump_json().encode()
+    with open(corpus_file, "xb") as fp_out:
+        fp_out.write(MAGIC + HEADER_LEN.pack(len(header_json)) + header_json)
+
+
+def append_tx(fp_out: tp.BinaryIO, chain: int, tx_cbor: bytes) -> None:
+    fp_out.write(RECORD.pack(len(tx_cbor), chain) + tx_cbor)
+
+
+def split_amount(total: int, outputs: int) -> list[int]:
+    """Split the amount evenly between the outputs, the remainder goes to the first one."""
+    share = total // outputs
+    return [share + total - share * outputs] + [share] * (outputs - 1)
+
+
+def get_pool_size(shape: TxShape, txs: int) -> int:
+    """Get number of UTxOs a chain of `txs` transactions needs to start with."""
+    return shape.inputs + max(0, (txs - 1) * (shape.inputs - shape.outputs))
+
+
+def _is_amount_sufficient(shape: TxShape, txs: int, amount: int, fee: int) -> bool:
+    pool = collections.deque([amount] * get_pool_size(shape=shape, txs=txs))
+    for __ in range(txs):
+        total = sum(pool.popleft() for __ in range(shape.inputs)) - fee
+        outputs = split_amount(total=total, outputs=shape.outputs)
+        if outputs[-1] < CHAIN_MIN_VALUE:
+            return False
+        pool.extend(outputs)
+    return True
+
+
+def get_chain_amount(shape: TxShape, txs: int, fee: int) -> int:
+    """Get amount of the starting UTxOs that keeps all outputs of the chain above minimum.
+
+    Raises:
+        RuntimeError: No reasonable amount is sufficient.
+    """
+    amount = CHAIN_MIN_VALUE
+    while not _is_amount_sufficient(shape=shape, txs=txs, amount=amount, fee=fee):
+        amount *= 2
+        if amount > MAX_CHAIN_AMOUNT:
+            msg = f"Chains of {txs} transactions with {shape} cannot be funded."
+            raise RuntimeError(msg)
+    return amount
+
+
+def _write_metadata_file(out_file: pl.Path, size: int) -> None:
+    # Metadata strings are limited to 64 bytes
+    chunks = [METADATA_CHUNK] * (size // METADATA_CHUNK)
+    if size % METADATA_CHUNK:
+        chunks.append(size % METADATA_CHUNK)
+    helpers.write_json(
+        out_file=out_file, content={str(METADATA_LABEL): {"msg": ["x" * c for c in chunks]}}
+    )
+
+
+def _write_plutus_script(out_file: pl.Path) -> None:
+    helpers.write_json(
+        out_file=out_file,
+        content={"type": "PlutusScriptV2", "description": "", "cborHex": ALWAYS_SUCCEEDS_CBOR},
+    )
+
+
+def _get_tx_args(chain_args: _ChainArgs, txins: list[str], amounts: list[int]) -> list[str]:
+    return [
+        *(a for t in txins for a in ("--tx-in", t, *chain_args.txin_args)),
+        *(
+            a
+            for amount in amounts
+            for a in (f"--tx-out={chain_args.address}+{amount}", *chain_args.txout_args)
+        ),
+        *chain_args.extra_args,
+    ]
+
+
+def _calc_fee(pparams: dict, tx_size: int, shape: TxShape) -> int:
+    fee = pparams["txFeeFixed"] + pparams["txFeePerByte"] * (tx_size + FEE_SIZE_MARGIN)
+    if shape.plutus:
+        prices = pparams["executionUnitPrices"]
+        steps, mem = PLUTUS_EXUNITS
+        fee += shape.inputs * math.ceil(steps * prices["priceSteps"] + mem * prices["priceMemory"])
+    return int(fee)
+
+
+def _build_chain_tx(
+    ctx: txbuild.TxContext,
+    chain_args: _ChainArgs,
+    pool: collections.deque[txbuild.TxIn],
+    out_base: pl.Path,
+) -> bytes:
+    """Build the next transaction of the chain and add its outputs to the pool."""
+    txins = [pool.popleft() for __ in range(chain_args.shape.inputs)]
+    amounts = split_amount(
+        total=sum(t.amount for t in txins) - chain_args.fee, outputs=chain_args.shape.outputs
+    )
+    tx_file = txbuild.build_and_sign(
+        ctx=ctx,
+        txins=[],
+        txouts=[],
+        fee=chain_args.fee,
+        skey_file=chain_args.skey_file,
+        out_base=out_base,
+        extra_args=_get_tx_args(
+            chain_args=chain_args, txins=[t.txin for t in txins], amounts=amounts
+        ),
+    )
+    txid = txbuild.get_txid(ctx=ctx, tx_file=tx_file)
+    pool.extend(txbuild.TxIn(txin=f"{txid}#{i}", amount=a) for i, a in enumerate(amounts))
+    tx_cbor = txbuild.read_tx_cbor(tx_file=tx_file)
+    tx_file.unlink()
+    out_base.with_suffix(".txbody").unlink()
+    return tx_cbor
+
+
+def _get_chain_args(
+    ctx: txbuild.TxContext,
+    shape: TxShape,
+    payment: structs.AddressData,
+    workdir: pl.Path,
+) -> tuple[_ChainArgs, str]:
+    """Get the tx arguments for the shape and the tx era.
+
+    The fee is calculated from the size of a probe tx of the same shape.
+    """
+    pparams_file = workdir / "pparams.json"
+    pparams = txbuild.query_protocol_params(ctx=ctx, out_file=pparams_file)
+
+    address = payment.address
+    txin_args: tuple[str, ...] = ()
+    txout_args: tuple[str, ...] = ()
+    extra_args: tuple[str, ...] = ()
+    if shape.plutus:
+        script_file = workdir / "always_succeeds.plutus"
+        _write_plutus_script(out_file=script_file)
+        address = txbuild.get_script_address(ctx=ctx, script_file=script_file)
+        txin_args = (
+            "--tx-in-script-file",
+            str(script_file),
+            "--tx-in-inline-datum-present",
+            "--tx-in-redeemer-value",
+            PLUTUS_DATUM,
+            "--tx-in-execution-units",
+            f"({PLUTUS_EXUNITS[0]},{PLUTUS_EXUNITS[1]})",
+        )
+        txout_args = ("--tx-out-inline-datum-value", PLUTUS_DATUM)
+        extra_args = ("--protocol-params-file", str(pparams_file))
+    if shape.metadata_bytes:
+        metadata_file = workdir / "metadata.json"
+        _write_metadata_file(out_file=metadata_file, size=shape.metadata_bytes)
+        extra_args = (*extra_args, "--metadata-json-file", str(metadata_file))
+
+    probe_args = _ChainArgs(
+        shape=shape,
+        address=address,
+        skey_file=payment.skey_file,
+        fee=1_000_000,
+        txin_args=txin_args,
+        txout_args=txout_args,
+        extra_args=(
+            *extra_args,
+            *(("--tx-in-collateral", f"{PROBE_TXID}#999") if shape.plutus else ()),
+        ),
+    )
+    probe_file = txbuild.build_and_sign(
+        ctx=ctx,
+        txins=[],
+        txouts=[],
+        fee=probe_args.fee,
+        skey_file=payment.skey_file,
+        out_base=workdir / "probe",
+        extra_args=_get_tx_args(
+            chain_args=probe_args,
+            txins=[f"{PROBE_TXID}#{i}" for i in range(shape.inputs)],
+            amounts=[PROBE_AMOUNT] * shape.outputs,
+        ),
+    )
+    fee = _calc_fee(
+        pparams=pparams, tx_size=len(txbuild.read_tx_cbor(tx_file=probe_file)), shape=shape
+    )
+    chain_args = dataclasses.replace(probe_args, fee=fee, extra_args=extra_args)
+    return chain_args, txbuild.get_tx_era(tx_file=probe_file)
+
+
+def build_corpus(
+    ctx: txbuild.TxContext,
+    payer: structs.AddressData,
+    corpus_file: pl.Path,
+    shape: TxShape,
+    count: int,
+    chains: int,
+    workdir: pl.Path,
+) -> structs.CorpusSummary:
+    """Fund the chains from the payer and build the corpus of `count` transactions.
+
+    The chain UTxOs are on an address with a newly generated key, saved next to the
+    corpus file, so that other users of the payer address cannot spend them before the
+    corpus is replayed.
+
+    Raises:
+        RuntimeError: Not enough funds, or a `cardano-cli` command failed.
+        TimeoutError: The funding transactions didn't appear on chain in time.
+        FileExistsError: The corpus file already exists.
+    """
+    start = time.monotonic()
+    payment = txbuild.gen_payment_address(
+        ctx=ctx, out_base=corpus_file.parent / f"{corpus_file.stem}_payment"
+    )
+    chain_args, era = _get_chain_args(ctx=ctx, shape=shape, payment=payment, workdir=workdir)
+
+    chain_txs = [count // chains + (c < count % chains) for c in range(chains)]
+    pool_size = get_pool_size(shape=shape, txs=chain_txs[0])
+    amount = get_chain_amount(shape=shape, txs=chain_txs[0], fee=chain_args.fee)
+
+    if shape.plutus:
+        collateral = txbuild.transfer(
+            ctx=ctx,
+            payer=payer,
+            address=payment.address,
+            amount=COLLATERAL_AMOUNT,
+            workdir=workdir,
+        )
+        chain_args = dataclasses.replace(
+            chain_args, extra_args=(*chain_args.extra_args, "--tx-in-collateral", collateral.txin)
+        )
+
+    LOGGER.info(f"Funding {chains} chains with {pool_size} UTxOs of {amount} lovelace each.")
+    split = txbuild.split_utxos(
+        ctx=ctx,
+        payer=payer,
+        count=chains * pool_size,
+        amount=amount,
+        workdir=workdir,
+        address=chain_args.address,
+        txout_args=chain_args.txout_args,
+    )
+    pools = [collections.deque(split[c * pool_size : (c + 1) * pool_size]) for c in range(chains)]
+
+    header = structs.CorpusHeader(
+        version=VERSION,
+        era=era,
+        network_magic=ctx.network_magic,
+        address=chain_args.address,
+        inputs=shape.inputs,
+        outputs=shape.outputs,
+        metadata_bytes=shape.metadata_bytes,
+        plutus=shape.plutus,
+        chains=chains,
+        fee=chain_args.fee,
+        created=dt.datetime.now(tz=dt.timezone.utc),
+    )
+    write_header(corpus_file=corpus_file, header=header)
+
+    LOGGER.info(f"Building {count} transactions in {chains} chains.")
+    with (
+        open(corpus_file, "ab") as fp_out,
+        concurrent.futures.ThreadPoolExecutor(max_workers=chains) as executor,
+    ):
+        # Chains are built in parallel, one transaction of every chain per round, and
+        # the rounds are appended to the corpus as they are done
+        for tx_num in range(chain_txs[0]):
+            active = [c for c in range(chains) if tx_num < chain_txs[c]]
+            built = executor.map(
+                lambda c, n=tx_num: _build_chain_tx(
+                    ctx=ctx,
+                    chain_args=chain_args,
+                    pool=pools[c],
+                    out_base=workdir / f"chain{c}_tx{n}",
+                ),
+                active,
+            )
+            for chain, tx_cbor in zip(active, built, strict=True):
+                append_tx(fp_out=fp_out, chain=chain, tx_cbor=tx_cbor)
+            fp_out.flush()
+
+    return get_summary(corpus_file=corpus_file, build_sec=time.monotonic() - start)
+
+
+def get_summary(corpus_file: pl.Path, build_sec: float | None = None) -> structs.CorpusSummary:
+    with CorpusReader(corpus_file=corpus_file) as reader:
+        index = reader.get_index()
+        header = reader.header
+    tx_sizes = sorted(length for __, __, length in index)
+
+    tx_size = None
+    if tx_sizes:
+        tx_size = structs.UsageStats(
+            mean=round(sum(tx_sizes) / len(tx_sizes), 1),
+            p50=helpers.percentile(tx_sizes, 50),
+            p95=helpers.percentile(tx_sizes, 95),
+            p99=helpers.percentile(tx_sizes, 99),
+            max=tx_sizes[-1],
+        )
+
+    return structs.CorpusSummary(
+        file=corpus_file,
+        header=header,
+        txs=len(index),
+        size_bytes=corpus_file.stat().st_size,
+        tx_size_bytes=tx_size,
+        build_sec=round(build_sec, 2) if build_sec is not None else None,
+    )
@@ -0,0 +1,475 @@
+"""Long-lived daemon serving `cardonnay` operations over a Unix socket.
+
+One daemon runs per workdir. It keeps an in-memory view of the testnet instances that is
+refreshed only when something changes in the workdir or in the state dirs of the
+instances, so repeated queries don't pay for the interpreter start-up and the directory
+scans. See `daemon_client` for the protocol.
+
+Query operations (`ls`, `print_env`, `status`, `config`, `faucet`, `pools`) return the same
+data as the corresponding CLI commands. Commands that change the instances (`create`,
+`stop`, `restart`, `restart_nodes`, `stop_all`) run one at a time and return the exit code
+and the output of the command. Testnets are always created in background, so a
+long-running start script doesn't block the daemon. A `create` with `wait` waits for a free
+instance and capacity before it is run, so the waiting doesn't block other commands.
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import pathlib as pl
+import signal
+import socketserver
+import threading
+import time
+import typing as tp
+
+from cardonnay import allocator
+from cardonnay import ca_utils
+from cardonnay import cli_control
+from cardonnay import cli_create
+from cardonnay import daemon_client
+from cardonnay import fs_watch
+from cardonnay import genesis_params
+from cardonnay import helpers
+from cardonnay import inspect_instance
+from cardonnay import proc_stats
+
+LOGGER = logging.getLogger(__name__)
+
+DAEMON_LOCK = "cardonnay-daemon.lock"
+
+
+class RequestError(Exception):
+    """The request is invalid or cannot be served."""
+
+
+def _get_param(params: dict, name: str, type_: type, default: tp.Any = None) -> tp.Any:  # noqa: ANN401
+    value = params.get(name, default)
+    # JSON doesn't distinguish whole floats from integers
+    if type_ is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    # `bool` is a subclass of `int`, don't accept it where a number is expected
+    if not isinstance(value, type_) or (type_ is int and isinstance(value, bool)):
+        msg = f"Parameter '{name}' must be of type '{type_.__name__}'."
+        raise RequestError(msg)
+    return value
+
+
+class InstanceCache:
+    """In-memory view of the testnet instances in the workdir.
+
+    The view is rebuilt lazily, on the first request after a change was detected in the
+    workdir or in any of the state dirs.
+    """
+
+    def __init__(self, workdir: pl.Path) -> None:
+        self.workdir = workdir
+        self._lock = threading.Lock()
+        self._watcher = fs_watch.DirWatcher()
+        self._stale = True
+        self._running: set[int] = set()
+        self._summary: list[dict[str, tp.Any]] = []
+        self._details: dict[tuple[str, int], tp.Any] = {}
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._watcher.uses_inotify
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stale = True
+
+    def _refresh(self) -> None:
+        if self._watcher.wait(timeout=0):
+            self._stale = True
+        if not self._stale:
+            return
+
+        # Watch the dirs before reading them, so no change made during the refresh is lost
+        self._watcher.watch(self.workdir)
+        for statedir in self.workdir.glob(f"{ca_utils.STATE_CLUSTER_PREFIX}*"):
+            self._watcher.watch(statedir)
+        self._stale = False
+
+        self._summary = cli_control.get_instances_summary(workdir=self.workdir)
+        self._running = {e["instance"] for e in self._summary}
+        self._details.clear()
+        LOGGER.debug(f"Refreshed the view of instances, running: {sorted(self._running)}")
+
+    def get_running(self) -> set[int]:
+        with self._lock:
+            self._refresh()
+            return set(self._running)
+
+    def get_summary(self) -> list[dict[str, tp.Any]]:
+        with self._lock:
+            self._refresh()
+            return list(self._summary)
+
+    def get_detail(self, kind: str, instance_num: int, loader: tp.Callable[[], tp.Any]) -> tp.Any:  # noqa: ANN401
+        """Return cached data of the instance, load them if they are not cached."""
+        with self._lock:
+            self._refresh()
+            key = (kind, instance_num)
+            if key not in self._details:
+                self._details[key] = loader()
+            return self._details[key]
+
+    def close(self) -> None:
+        self._watcher.close()
+
+
+class Daemon:
+    def __init__(self, workdir_arg: str) -> None:
+        # The original value is passed to the CLI commands, as they treat the default
+        # workdir differently from a custom one
+        self.workdir_arg = workdir_arg
+        self.workdir = ca_utils.get_workdir(workdir=workdir_arg).absolute()
+        self.cache = InstanceCache(workdir=self.workdir)
+        self.started_at = time.monotonic()
+        self.server: _Server | None = None
+        self._cmd_lock = threading.Lock()
+
+    def _get_statedir(self, params: dict) -> tuple[int, pl.Path]:
+        instance_num = _get_param(params, "instance_num", int)
+        if not 0 <= instance_num < ca_utils.MAX_INSTANCES:
+            msg = "Valid instance number is required."
+            raise RequestError(msg)
+        statedir = self.workdir / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+        if not statedir.exists():
+            msg = "State dir for the instance doesn't exist."
+            raise RequestError(msg)
+        return instance_num, statedir
+
+    def op_ping(self, params: dict) -> dict[str, tp.Any]:  # noqa: ARG002
+        return {
+            "pid": os.getpid(),
+            "workdir": str(self.workdir),
+            "uptime_sec": round(time.monotonic() - self.started_at, 3),
+            "inotify": self.cache.uses_inotify,
+        }
+
+    def op_ls(self, params: dict) -> list[dict[str, tp.Any]]:  # noqa: ARG002
+        return self.cache.get_summary()
+
+    def op_print_env(self, params: dict) -> dict[str, tp.Any]:
+        instance_num = _get_param(params, "instance_num", int)
+        if not 0 <= instance_num < ca_utils.MAX_INSTANCES:
+            msg = "Valid instance number is required."
+            raise RequestError(msg)
+        return {
+            "env": ca_utils.create_env_vars(workdir=self.workdir, instance_num=instance_num),
+            "running": instance_num in self.cache.get_running(),
+        }
+
+    def op_status(self, params: dict) -> tp.Any:  # noqa: ANN401
+        instance_num, statedir = self._get_statedir(params)
+        status = self.cache.get_detail(
+            kind="status",
+            instance_num=instance_num,
+            loader=lambda: inspect_instance.get_testnet_info(statedir=statedir).model_dump(
+                mode="json"
+            ),
+        )
+        # The resource usage changes all the time, don't serve it from the cache
+        if status.get("node_processes") and (supervisord_pid := status.get("supervisord_pid")):
+            node_stats = proc_stats.get_node_stats(supervisord_pid=supervisord_pid)
+            status = {
+                **status,
+                "node_processes": {n: s.model_dump(mode="json") for n, s in node_stats.items()},
+            }
+        return status
+
+    def op_config(self, params: dict) -> tp.Any:  # noqa: ANN401
+        instance_num, statedir = self._get_statedir(params)
+        return self.cache.get_detail(
+            kind="config",
+            instance_num=instance_num,
+            loader=lambda: inspect_instance.get_config(statedir=statedir).model_dump(mode="json"),
+        )
+
+    def op_faucet(self, params: dict) -> tp.Any:  # noqa: ANN401
+        instance_num, statedir = self._get_statedir(params)
+        return self.cache.get_detail(
+            kind="faucet",
+            instance_num=instance_num,
+            loader=lambda: inspect_instance.load_faucet_data(statedir=statedir).model_dump(
+                mode="json"
+            ),
+        )
+
+    def op_pools(self, params: dict) -> tp.Any:  # noqa: ANN401
+        instance_num, statedir = self._get_statedir(params)
+        return self.cache.get_detail(
+            kind="pools",
+            instance_num=instance_num,
+            loader=lambda: [
+                d.model_dump(mode="json")
+                for d in inspect_instance.load_pools_data(statedir=statedir)
+            ],
+        )
+
+    def _run_command(
+        self,
+        func: tp.Callable[..., int],
+        kwargs: dict[str, tp.Any],
+        env: dict[str, str] | None = None,
+    ) -> dict[str, tp.Any]:
+        """Run the CLI command handler and capture its output.
+
+        Commands are serialized, as they redirect the process-wide stdout and stderr and
+        modify the environment that is inherited by the started testnet scripts.
+        """
+        output = io.StringIO()
+        log_handler = logging.StreamHandler(output)
+        root_logger = logging.getLogger()
+
+        with self._cmd_lock:
+            saved_environ = os.environ.copy()
+            os.environ.update(env or {})
+            root_logger.addHandler(log_handler)
+            try:
+                with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                    retval = func(**kwargs)
+            except Exception as excp:
+                LOGGER.exception("Unexpected error while running the command")
+                retval = 1
+                output.write(f"{excp}\n")
+            finally:
+                root_logger.removeHandler(log_handler)
+                os.environ.clear()
+                os.environ.update(saved_environ)
+                self.cache.invalidate()
+
+        return {"retval": retval, "output": output.getvalue()}
+
+    @staticmethod
+    def _get_genesis_overrides(params: dict) -> dict[str, int | float]:
+        """Get the genesis parameter overrides, validated like the `create` options."""
+        overrides = _get_param(params, "genesis_params", dict, {})
+        parsed: dict[str, int | float] = {}
+        for name, value in overrides.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                msg = f"Value of the genesis parameter '{name}' must be a number."
+                raise RequestError(msg)
+            try:
+                parsed[name] = genesis_params.parse_value(name=name, value=str(value))
+            except ValueError as excp:
+                raise RequestError(str(excp)) from excp
+        return parsed
+
+    def op_create(self, params: dict) -> dict[str, tp.Any]:
+        env = _get_param(params, "env", dict, {})
+        if not all(isinstance(k, str) and isinstance(v, str) for k, v in env.items()):
+            msg = "Parameter 'env' must map strings to strings."
+            raise RequestError(msg)
+
+        kwargs = {
+            "testnet_variant": _get_param(params, "testnet_variant", str),
+            "comment": _get_param(params, "comment", str, ""),
+            "listit": False,
+            "background": True,
+            "generate_only": _get_param(params, "generate_only", bool, False),
+            "keep": _get_param(params, "keep", bool, False),
+            "stake_pools_num": _get_param(params, "stake_pools_num", int, 3),
+            "ports_base": _get_param(params, "ports_base", int, 23000),
+            "trace_profile": _get_param(params, "trace_profile", str, "default"),
+            "workdir": self.workdir_arg,
+            "instance_num": _get_param(params, "instance_num", int, -1),
+            "verbose": 0,
+            "cpus": _get_param(params, "cpus", str, ""),
+            "mem_max": _get_param(params, "mem_max", int, 0),
+            "genesis_overrides": self._get_genesis_overrides(params),
+            # The random topology is used when no seed is given
+            "topology_seed": (
+                _get_param(params, "topology_seed", int)
+                if params.get("topology_seed") is not None
+                else None
+            ),
+            "wait": _get_param(params, "wait", bool, False),
+            "wait_timeout": _get_param(params, "wait_timeout", int, 3600),
+            "max_load": _get_param(params, "max_load", float, allocator.DEFAULT_MAX_LOAD),
+            "node_mem": _get_param(params, "node_mem", int, allocator.DEFAULT_NODE_MEM_MIB),
+        }
+        for name in ("mem_max", "wait_timeout", "max_load", "node_mem"):
+            if kwargs[name] < 0:
+                msg = f"Parameter '{name}' must not be negative."
+                raise RequestError(msg)
+
+        if kwargs["wait"]:
+            # Commands run one at a time, wait for the capacity before taking the command lock
+            start = time.monotonic()
+            try:
+                self._wait_for_instance(kwargs=kwargs)
+            except (ca_utils.InstanceBusyError, RuntimeError, TimeoutError) as excp:
+                return {"retval": 1, "output": f"{excp}\n"}
+            # Another create can still take the instance, the command then waits for the rest
+            kwargs["wait_timeout"] = max(0, kwargs["wait_timeout"] - int(time.monotonic() - start))
+
+        return self._run_command(func=cli_create.cmd_create, kwargs=kwargs, env=env)
+
+    def _wait_for_instance(self, kwargs: dict[str, tp.Any]) -> None:
+        """Wait until an instance can be reserved for the create, without reserving it."""
+        ca_utils.create_workdir(workdir=self.workdir)
+        allocator.allocate_instance(
+            workdir=self.workdir,
+            instance_num=kwargs["instance_num"],
+            testnet_variant=kwargs["testnet_variant"] if kwargs["keep"] else "",
+            num_nodes=0 if kwargs["generate_only"] else kwargs["stake_pools_num"] + 1,
+            limits=allocator.Capacity(max_load=kwargs["max_load"], node_mem_mib=kwargs["node_mem"]),
+            wait=True,
+            timeout=kwargs["wait_timeout"],
+            dry_run=True,
+        )
+
+    def _run_action(self, params: dict, action: str) -> dict[str, tp.Any]:
+        kwargs = {
+            "workdir": self.workdir_arg,
+            "instance_num": _get_param(params, "instance_num", int),
+            action: True,
+        }
+        return self._run_command(func=cli_control.cmd_actions, kwargs=kwargs)
+
+    def op_stop(self, params: dict) -> dict[str, tp.Any]:
+        return self._run_action(params=params, action="stop")
+
+    def op_restart(self, params: dict) -> dict[str, tp.Any]:
+        return self._run_action(params=params, action="restart")
+
+    def op_restart_nodes(self, params: dict) -> dict[str, tp.Any]:
+        return self._run_action(params=params, action="restart_nodes")
+
+    def op_stop_all(self, params: dict) -> dict[str, tp.Any]:  # noqa: ARG002
+        return self._run_command(func=cli_control.cmd_stopall, kwargs={"workdir": self.workdir_arg})
+
+    def op_shutdown(self, params: dict) -> None:  # noqa: ARG002
+        self.request_shutdown()
+
+    def request_shutdown(self) -> None:
+        # `shutdown` blocks until `serve_forever` returns, it cannot be called from
+        # the thread that serves the requests
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def handle(self, request: tp.Any) -> dict[str, tp.Any]:  # noqa: ANN401
+        """Perform the requested operation and return the response."""
+        if not isinstance(request, dict) or not isinstance(request.get("op"), str):
+            return {"ok": False, "error": "The request must be an object with the 'op' key."}
+
+        op = request["op"]
+        handler = getattr(self, f"op_{op}", None)
+        if handler is None:
+            return {"ok": False, "error": f"Unknown operation '{op}'."}
+
+        try:
+            data = handler(request)
+        except RequestError as excp:
+            return {"ok": False, "error": str(excp)}
+        except Exception as excp:
+            LOGGER.exception(f"Failed to perform '{op}'")
+            return {"ok": False, "error": f"Failed to perform '{op}': {excp}"}
+
+        return {"ok": True, "data": data}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as excp:
+                response = {"ok": False, "error": f"Invalid JSON: {excp}"}
+            else:
+                response = self.server.daemon.handle(request)
+
+            out = json.dumps(response, cls=helpers.CustomEncoder) + "\n"
+            try:
+                self.wfile.write(out.encode("utf-8"))
+                self.wfile.flush()
+            except OSError:
+                return  # The client went away
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: pl.Path, daemon: Daemon) -> None:
+        self.daemon = daemon
+        super().__init__(str(socket_path), _RequestHandler)
+
+
+def _is_running(workdir: pl.Path) -> bool:
+    with contextlib.suppress(OSError, daemon_client.DaemonError):
+        daemon_client.request(workdir=workdir, op="ping", timeout=2)
+        return True
+    return False
+
+
+def _bind_server(daemon: Daemon) -> _Server | None:
+    """Bind the socket of the daemon, unless another daemon is running already."""
+    import filelock  # noqa: PLC0415
+
+    socket_path = daemon_client.get_socket_path(daemon.workdir)
+    lockfile = str(daemon.workdir / DAEMON_LOCK)
+    try:
+        with filelock.FileLock(lock_file=lockfile, timeout=5):
+            if _is_running(workdir=daemon.workdir):
+                LOGGER.error(f"The daemon is already running in '{daemon.workdir}'.")
+                return None
+            # Left behind by a daemon that was killed
+            socket_path.unlink(missing_ok=True)
+
+            # Only the owner of the workdir may talk to the daemon
+            old_umask = os.umask(0o077)
+            try:
+                server = _Server(socket_path=socket_path, daemon=daemon)
+            finally:
+                os.umask(old_umask)
+    except filelock.Timeout:
+        LOGGER.error(f"Failed to acquire lock '{lockfile}'. Re-try later.")  # noqa: TRY400
+        return None
+    except OSError as excp:
+        LOGGER.error(f"Failed to create the daemon socket '{socket_path}': {excp}")  # noqa: TRY400
+        return None
+
+    return server
+
+
+def run_daemon(workdir_arg: str) -> int:
+    """Run the daemon in the foreground until it is shut down."""
+    daemon = Daemon(workdir_arg=workdir_arg)
+    ca_utils.create_workdir(workdir=daemon.workdir)
+
+    server = _bind_server(daemon=daemon)
+    if server is None:
+        return 1
+    daemon.server = server
+
+    pidfile = daemon.workdir / daemon_client.PIDFILE_NAME
+    pidfile.write_text(str(os.getpid()))
+    socket_path = daemon_client.get_socket_path(daemon.workdir)
+
+    def _on_signal(signum: int, frame: tp.Any) -> None:  # noqa: ARG001, ANN401
+        LOGGER.info(f"Received signal {signum}, shutting down.")
+        daemon.request_shutdown()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    LOGGER.info(f"The daemon is listening on '{socket_path}'.")
+    try:
+        with server:
+            server.serve_forever()
+    finally:
+        socket_path.unlink(missing_ok=True)
+        with contextlib.suppress(OSError, ValueError):
+            if int(helpers.read_from_file(pidfile)) == os.getpid():
+                pidfile.unlink()
+        daemon.cache.close()
+
+    LOGGER.info("The daemon was shut down.")
+    return 0
@@ -0,0 +1,92 @@
+"""Client of the per-workdir `cardonnay` daemon.
+
+The daemon listens on a Unix socket in the workdir. Every request and response is a single
+line of JSON. A request is an object with the `op` key and the parameters of the
+operation. A response is either `{"ok": true, "data": ...}` or
+`{"ok": false, "error": "..."}`.
+
+This module is imported by the CLI on every invocation, so it must stay light.
+"""
+
+import json
+import logging
+import os
+import pathlib as pl
+import socket
+import typing as tp
+
+LOGGER = logging.getLogger(__name__)
+
+SOCKET_NAME = "cardonnay.sock"
+PIDFILE_NAME = "cardonnay-daemon.pid"
+LOGFILE_NAME = "cardonnay-daemon.log"
+REQUEST_TIMEOUT_SEC = 30.0
+# Set to "0" to make the CLI ignore a running daemon
+USE_DAEMON_ENV = "CARDONNAY_USE_DAEMON"
+
+
+class DaemonError(Exception):
+    """The daemon failed to perform the requested operation."""
+
+
+def get_socket_path(workdir: pl.Path) -> pl.Path:
+    return workdir / SOCKET_NAME
+
+
+def request(
+    workdir: pl.Path,
+    op: str,
+    params: dict[str, tp.Any] | None = None,
+    timeout: float = REQUEST_TIMEOUT_SEC,
+) -> tp.Any:  # noqa: ANN401
+    """Send a request to the daemon and return the data of the response.
+
+    Raises:
+        OSError: The daemon is not running or the connection failed.
+        DaemonError: The daemon returned an error.
+    """
+    payload = json.dumps({**(params or {}), "op": op}) + "\n"
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(get_socket_path(workdir)))
+        sock.sendall(payload.encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as fp_in:
+            line = fp_in.readline()
+
+    if not line:
+        msg = f"The daemon closed the connection without responding to '{op}'."
+        raise DaemonError(msg)
+
+    try:
+        response = json.loads(line)
+    except ValueError as excp:
+        msg = f"Invalid response from the daemon: {excp}"
+        raise DaemonError(msg) from excp
+
+    if not response.get("ok"):
+        raise DaemonError(response.get("error") or "Unknown error.")
+
+    return response.get("data")
+
+
+def try_request(
+    workdir: pl.Path, op: str, params: dict[str, tp.Any] | None = None
+) -> tuple[bool, tp.Any]:
+    """Send a request to the daemon if it is running.
+
+    Returns a tuple of a flag whether the daemon served the request and the data of the
+    response. Callers fall back to doing the work themselves when the flag is False.
+    """
+    if os.environ.get(USE_DAEMON_ENV) == "0":
+        return False, None
+    if not get_socket_path(workdir).exists():
+        return False, None
+
+    try:
+        data = request(workdir=workdir, op=op, params=params)
+    except (OSError, DaemonError) as excp:
+        LOGGER.debug(f"The daemon didn't serve '{op}', falling back to local processing: {excp}")
+        return False, None
+
+    return True, data
@@ -0,0 +1,180 @@
+"""Sync progress of db-sync, read from the Prometheus endpoints of db-sync and the nodes."""
+
+import contextlib
+import dataclasses
+import json
+import logging
+import pathlib as pl
+import re
+import time
+
+from cardonnay import node_logs
+from cardonnay import prometheus
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+DBSYNC_CONFIG = "dbsync-config.yaml"
+DBSYNC_RUN_SCRIPT = "run-cardano-dbsync"
+# Port used by db-sync when `PrometheusPort` is not configured
+DEFAULT_METRICS_PORT = 8080
+DB_BLOCK_METRIC = "cardano_db_sync_db_block_height"
+DB_SLOT_METRIC = "cardano_db_sync_db_slot_height"
+DB_QUEUE_METRIC = "cardano_db_sync_db_queue_length"
+NODE_BLOCK_METRIC = "cardano_db_sync_node_block_height"
+
+PROMETHEUS_PORT_RE = re.compile(r"^PrometheusPort:\s*(\d+)", re.MULTILINE)
+
+
+@dataclasses.dataclass(frozen=True)
+class SyncSample:
+    time: float
+    block: int
+    slot: int | None
+    queue_length: int | None
+    tip_block: int
+    tip_slot: int | None
+
+
+def is_enabled(statedir: pl.Path) -> bool:
+    """Check if db-sync was configured for the testnet instance."""
+    return (statedir / DBSYNC_RUN_SCRIPT).exists()
+
+
+def get_metrics_port(statedir: pl.Path) -> int:
+    """Get port of the db-sync Prometheus endpoint from the db-sync config."""
+    with contextlib.suppress(OSError):
+        content = (statedir / DBSYNC_CONFIG).read_text(encoding="utf-8")
+        if match := PROMETHEUS_PORT_RE.search(content):
+            return int(match.group(1))
+    return DEFAULT_METRICS_PORT
+
+
+def get_slot_length(statedir: pl.Path) -> float | None:
+    with (
+        contextlib.suppress(OSError, ValueError),
+        open(statedir / "shelley" / "genesis.json", encoding="utf-8") as fp_in,
+    ):
+        return float(json.load(fp_in)["slotLength"])
+    return None
+
+
+def get_node_tip(statedir: pl.Path) -> tuple[int | None, int | None]:
+    """Get block and slot number of the highest tip of the nodes with Prometheus metrics."""
+    tip: tuple[int | None, int | None] = (None, None)
+    for node in node_logs.get_node_names(statedir=statedir):
+        if not (address := prometheus.get_prometheus_address(statedir=statedir, node=node)):
+            continue
+        try:
+            metrics = prometheus.fetch_metrics(host=address[0], port=address[1])
+        except OSError as excp:
+            LOGGER.debug(f"Cannot read metrics of node '{node}': {excp}")
+            continue
+        block_num = prometheus.get_block_num(metrics=metrics)
+        if block_num is not None and block_num > (tip[0] or -1):
+            tip = (block_num, prometheus.get_slot_num(metrics=metrics))
+    return tip
+
+
+def read_sync_sample(statedir: pl.Path) -> SyncSample:
+    """Read the db-sync progress and the node tip.
+
+    Raises:
+        OSError: The db-sync Prometheus endpoint is not reachable.
+        ValueError: db-sync doesn't report its progress yet.
+    """
+    port = get_metrics_port(statedir=statedir)
+    metrics = prometheus.fetch_metrics(host="127.0.0.1", port=port)
+    sampled_at = time.time()
+
+    block = metrics.get(DB_BLOCK_METRIC)
+    if block is None:
+        msg = f"db-sync on port {port} doesn't report '{DB_BLOCK_METRIC}' yet."
+        raise ValueError(msg)
+    slot = metrics.get(DB_SLOT_METRIC)
+    queue_length = metrics.get(DB_QUEUE_METRIC)
+
+    tip_block, tip_slot = get_node_tip(statedir=statedir)
+    if tip_block is None:
+        # Fall back to the node tip as seen by db-sync
+        tip_block = int(metrics.get(NODE_BLOCK_METRIC, block))
+
+    return SyncSample(
+        time=sampled_at,
+        block=int(block),
+        slot=None if slot is None else int(slot),
+        queue_length=None if queue_length is None else int(queue_length),
+        tip_block=tip_block,
+        tip_slot=tip_slot,
+    )
+
+
+def get_sync_status(
+    statedir: pl.Path, sample: SyncSample, prev_sample: SyncSample | None = None
+) -> structs.DbSyncStatus:
+    """Get the db-sync lag, and the ingestion rate since the previous sample."""
+    lag_sec = None
+    if sample.slot is not None and sample.tip_slot is not None:
+        slot_length = get_slot_length(statedir=statedir)
+        if slot_length is not None:
+            lag_sec = round(max(sample.tip_slot - sample.slot, 0) * slot_length, 1)
+
+    blocks_per_sec = None
+    if prev_sample and sample.time > prev_sample.time:
+        blocks_per_sec = round(
+            (sample.block - prev_sample.block) / (sample.time - prev_sample.time), 2
+        )
+
+    return structs.DbSyncStatus(
+        metrics_port=get_metrics_port(statedir=statedir),
+        block=sample.block,
+        slot=sample.slot,
+        tip_block=sample.tip_block,
+        tip_slot=sample.tip_slot,
+        lag_blocks=max(sample.tip_block - sample.block, 0),
+        lag_sec=lag_sec,
+        queue_length=sample.queue_length,
+        blocks_per_sec=blocks_per_sec,
+    )
+
+
+def get_status(statedir: pl.Path, rate_interval: float = 0.0) -> structs.DbSyncStatus:
+    """Get the db-sync lag, measuring the ingestion rate over `rate_interval` seconds."""
+    prev_sample = None
+    if rate_interval > 0:
+        prev_sample = read_sync_sample(statedir=statedir)
+        time.sleep(rate_interval)
+    return get_sync_status(
+        statedir=statedir, sample=read_sync_sample(statedir=statedir), prev_sample=prev_sample
+    )
+
+
+def wait_for_sync(
+    statedir: pl.Path, max_lag_blocks: int, timeout: float, poll_interval: float = 1.0
+) -> structs.DbSyncStatus:
+    """Wait until db-sync lags behind the node tip by at most `max_lag_blocks` blocks.
+
+    Raises:
+        TimeoutError: db-sync didn't catch up within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    prev_sample = None
+    last_error = ""
+    while True:
+        try:
+            sample = read_sync_sample(statedir=statedir)
+        except (OSError, ValueError) as excp:
+            # db-sync is still starting
+            last_error = str(excp)
+        else:
+            status = get_sync_status(statedir=statedir, sample=sample, prev_sample=prev_sample)
+            if status.lag_blocks <= max_lag_blocks:
+                return status
+            LOGGER.debug(f"db-sync lags {status.lag_blocks} blocks behind the tip.")
+            prev_sample = sample
+            last_error = f"db-sync lags {status.lag_blocks} blocks behind the tip"
+
+        if time.monotonic() >= deadline:
+            msg = f"Timed out waiting for db-sync to sync: {last_error}."
+            raise TimeoutError(msg)
+        time.sleep(poll_interval)
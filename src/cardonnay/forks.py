@@ -0,0 +1,241 @@
+"""Forks and divergence of the node tips of a testnet instance.
+
+The monitor follows the chain of every node at once, over the node-to-client chain sync
+protocol on the node sockets. A node that switches to a fork rolls back the chain of the
+monitor, so the depth of every fork is known exactly. The tips of the nodes are compared
+after every change; while they differ, the tips are divergent.
+
+Every rollback and every divergence is appended to `forks.jsonl` in the state dir as
+soon as it happens, and a summary of the monitor run when the monitor is finished,
+including the number of orphaned blocks: rolled back blocks that are not on the chain of
+any node at the end of the run.
+"""
+
+import asyncio
+import collections
+import contextlib
+import datetime as dt
+import logging
+import pathlib as pl
+import time
+import typing as tp
+
+import pydantic
+
+from cardonnay import helpers
+from cardonnay import node_client
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+RECORDS_FILE = "forks.jsonl"
+# Divergence longer than this is not caused by the usual block propagation
+PROLONGED_DIVERGENCE_SEC = 5.0
+RECONNECT_SEC = 2.0
+# Blocks of the chain of every node kept for resolving rollbacks, more than `k` of testnets
+MAX_TRACKED_BLOCKS = 2000
+
+_RECORD_ADAPTER: pydantic.TypeAdapter[structs.ForkRecord] = pydantic.TypeAdapter(structs.ForkRecord)
+
+
+def _to_datetime(timestamp: float) -> dt.datetime:
+    return dt.datetime.fromtimestamp(timestamp, tz=dt.timezone.utc)
+
+
+class ForkMonitor:
+    """Follow chains of the nodes and record rollbacks and divergence of their tips."""
+
+    def __init__(
+        self, sockets: dict[str, pl.Path], network_magic: int, records_file: pl.Path
+    ) -> None:
+        self.sockets = sockets
+        self.network_magic = network_magic
+        self.records_file = records_file
+        # Tips of the nodes that are followed right now
+        self.tips: dict[str, node_client.ChainPoint] = {}
+        self.chains: dict[str, collections.deque[node_client.ChainPoint]] = {}
+        self.added: set[str] = set()
+        self.rolled_back: set[str] = set()
+        self._divergence_start: float | None = None
+        self._max_tips = 0
+        self._max_spread = 0
+
+    def _write(self, record: pydantic.BaseModel) -> None:
+        with open(self.records_file, "a", encoding="utf-8") as fp_out:
+            fp_out.write(f"{record.model_dump_json()}\n")
+
+    def _check_divergence(self) -> None:
+        now = time.time()
+        tips = list(self.tips.values())
+        if len({t.block_hash for t in tips}) > 1:
+            self._divergence_start = self._divergence_start or now
+            self._max_tips = max(self._max_tips, len({t.block_hash for t in tips}))
+            block_nos = [t.block_no for t in tips]
+            self._max_spread = max(self._max_spread, max(block_nos) - min(block_nos))
+        elif self._divergence_start is not None:
+            self._end_divergence(now=now)
+
+    def _end_divergence(self, now: float) -> None:
+        if self._divergence_start is None:
+            return
+        self._write(
+            structs.TipDivergence(
+                start=_to_datetime(self._divergence_start),
+                duration_sec=round(now - self._divergence_start, 3),
+                max_tips=self._max_tips,
+                max_spread_blocks=self._max_spread,
+            )
+        )
+        self._divergence_start = None
+        self._max_tips = self._max_spread = 0
+
+    def _on_event(self, node: str, event: node_client.ChainEvent) -> None:
+        chain = self.chains[node]
+        if event.forward:
+            chain.append(event.point)
+            self.added.add(event.point.block_hash)
+            self.rolled_back.discard(event.point.block_hash)
+        else:
+            rolled_back = []
+            while (
+                chain
+                and chain[-1].block_hash != event.point.block_hash
+                and chain[-1].slot > event.point.slot
+            ):
+                rolled_back.append(chain.pop().block_hash)
+            # The first rollback after the intersection is to the tip itself
+            if rolled_back:
+                self.rolled_back.update(rolled_back)
+                LOGGER.info(f"Node '{node}' switched to a fork, {len(rolled_back)} blocks deep.")
+                self._write(
+                    structs.ChainRollback(
+                        at=_to_datetime(time.time()),
+                        node=node,
+                        depth=len(rolled_back),
+                        slot=event.point.slot,
+                        rolled_back=rolled_back,
+                    )
+                )
+
+        self.tips[node] = event.tip
+        self._check_divergence()
+
+    async def _follow(self, node: str) -> None:
+        """Follow the chain of the node, reconnect when the connection is lost."""
+        while True:
+            follower = node_client.LocalChainFollower(
+                socket_path=self.sockets[node], network_magic=self.network_magic
+            )
+            try:
+                tip = await follower.follow_from_tip()
+                self.chains[node] = collections.deque([tip], maxlen=MAX_TRACKED_BLOCKS)
+                self.tips[node] = tip
+                self._check_divergence()
+                while True:
+                    self._on_event(node=node, event=await follower.next_event())
+            except (OSError, asyncio.IncompleteReadError, node_client.NodeClientError) as excp:
+                LOGGER.debug(f"Lost the chain of node '{node}': {excp}")
+            except Exception:
+                # E.g. an unexpected message from the node, keep following the other nodes
+                LOGGER.exception(f"Unexpected error when following the chain of node '{node}'")
+            finally:
+                await follower.close()
+
+            # A stopped node is not considered for the divergence
+            self.tips.pop(node, None)
+            self._check_divergence()
+            await asyncio.sleep(RECONNECT_SEC)
+
+    async def run(self, duration_sec: float) -> structs.ForkMonitorRun:
+        """Follow the nodes for the given time and record the summary of the run."""
+        start = time.time()
+        tasks = [asyncio.create_task(self._follow(node=n)) for n in self.sockets]
+        try:
+            await asyncio.sleep(duration_sec)
+        finally:
+            for task in tasks:
+                task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        end = time.time()
+        self._end_divergence(now=end)
+        on_chains = {p.block_hash for c in self.chains.values() for p in c}
+        run = structs.ForkMonitorRun(
+            start=_to_datetime(start),
+            end=_to_datetime(end),
+            nodes=list(self.sockets),
+            blocks=len(self.added),
+            orphaned_blocks=len(self.rolled_back.difference(on_chains)),
+        )
+        self._write(run)
+        return run
+
+
+def load_records(records_file: pl.Path, since: float | None = None) -> list[structs.ForkRecord]:
+    """Load the monitor records, optionally only the records from `since` or later."""
+    records: list[structs.ForkRecord] = []
+    with open(records_file, encoding="utf-8") as fp_in:
+        for line in fp_in:
+            try:
+                record = _RECORD_ADAPTER.validate_json(line)
+            except pydantic.ValidationError:
+                # A partially written last line
+                continue
+            at = record.at if isinstance(record, structs.ChainRollback) else record.start
+            if since is None or at.timestamp() >= since:
+                records.append(record)
+    return records
+
+
+def get_forks_report(
+    records_file: pl.Path,
+    since: float | None = None,
+    prolonged_sec: float = PROLONGED_DIVERGENCE_SEC,
+) -> structs.ForksReport:
+    """Summarize the recorded forks and divergence of the node tips.
+
+    Raises:
+        FileNotFoundError: The monitor was not run for the instance.
+    """
+    records = load_records(records_file=records_file, since=since)
+    runs = [r for r in records if isinstance(r, structs.ForkMonitorRun)]
+    rollbacks = [r for r in records if isinstance(r, structs.ChainRollback)]
+    durations = sorted(r.duration_sec for r in records if isinstance(r, structs.TipDivergence))
+
+    monitored_sec = sum((r.end - r.start).total_seconds() for r in runs)
+    blocks = sum(r.blocks for r in runs)
+    orphaned_blocks = sum(r.orphaned_blocks for r in runs)
+
+    divergence_sec = None
+    if durations:
+        divergence_sec = structs.UsageStats(
+            mean=round(sum(durations) / len(durations), 3),
+            p50=round(helpers.percentile(durations, 50), 3),
+            p95=round(helpers.percentile(durations, 95), 3),
+            p99=round(helpers.percentile(durations, 99), 3),
+            max=durations[-1],
+        )
+
+    return structs.ForksReport(
+        records_file=records_file,
+        since=_to_datetime(since) if since is not None else None,
+        runs=len(runs),
+        monitored_sec=round(monitored_sec, 1),
+        blocks=blocks,
+        orphaned_blocks=orphaned_blocks,
+        orphan_rate=round(orphaned_blocks / blocks, 4) if blocks else None,
+        rollbacks=len(rollbacks),
+        rollbacks_by_node=dict(collections.Counter(r.node for r in rollbacks).most_common()),
+        fork_depths=dict(sorted(collections.Counter(r.depth for r in rollbacks).items())),
+        max_fork_depth=max((r.depth for r in rollbacks), default=0),
+        divergences=len(durations),
+        divergence_sec=divergence_sec,
+        divergent_share=round(sum(durations) / monitored_sec, 4) if monitored_sec else None,
+        prolonged_threshold_sec=prolonged_sec,
+        prolonged_divergences=sum(1 for d in durations if d > prolonged_sec),
+    )
+
+
+def get_sockets(statedir: pl.Path, nodes: tp.Iterable[str]) -> dict[str, pl.Path]:
+    return {n: s for n in nodes if (s := statedir / f"{n}.socket").exists()}
@@ -0,0 +1,229 @@
+"""Watching directories for changes, using inotify on Linux and polling elsewhere."""
+
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import pathlib as pl
+import select
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# From <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+DEFAULT_POLL_INTERVAL_SEC = 0.5
+
+
+def _pid_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # The process exists, but it belongs to another user
+    return True
+
+
+class _Inotify:
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: pl.Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+
+    def drain(self) -> bool:
+        """Read all pending events; return True if there were any."""
+        had_events = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return had_events
+            if not data:
+                return had_events
+            had_events = True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class DirWatcher:
+    """Detect creation, removal and modification of files in watched directories.
+
+    Only the fact that something changed is reported, callers are expected to re-check
+    the state they are interested in. Directories that don't exist are ignored, watch
+    them again once they are created. Exits of watched processes are reported as a change
+    too.
+    """
+
+    def __init__(self, poll_interval: float = DEFAULT_POLL_INTERVAL_SEC) -> None:
+        self.poll_interval = poll_interval
+        self._dirs: set[pl.Path] = set()
+        self._snapshot: dict[pl.Path, tuple[int, int] | None] = {}
+        self._pidfds: dict[int, int] = {}
+        self._polled_pids: set[int] = set()
+        self._inotify: _Inotify | None = None
+        try:
+            self._inotify = _Inotify()
+        except (OSError, AttributeError) as excp:
+            LOGGER.debug(f"inotify is not available, falling back to polling: {excp}")
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def watch(self, path: pl.Path) -> None:
+        """Start watching the directory, if not watched already."""
+        if path in self._dirs:
+            return
+        if self._inotify is not None:
+            try:
+                self._inotify.add_watch(path)
+            except OSError as excp:
+                if excp.errno not in (errno.ENOENT, errno.ENOTDIR):
+                    raise
+                return
+        self._dirs.add(path)
+        self._snapshot[path] = self._stat(path)
+
+    def watch_pid(self, pid: int) -> None:
+        """Report a change also when the process exits.
+
+        The exit is reported only once, the process is not watched afterwards.
+        """
+        if pid in self._pidfds or pid in self._polled_pids:
+            return
+        if self._inotify is not None and hasattr(os, "pidfd_open"):
+            try:
+                self._pidfds[pid] = os.pidfd_open(pid)
+            except ProcessLookupError:
+                return
+            except OSError as excp:
+                LOGGER.debug(f"pidfd is not available, polling process {pid}: {excp}")
+            else:
+                return
+        self._polled_pids.add(pid)
+
+    def _poll_pids(self) -> bool:
+        exited = {p for p in self._polled_pids if not _pid_exists(p)}
+        self._polled_pids -= exited
+        return bool(exited)
+
+    def _stat(self, path: pl.Path) -> tuple[int, int] | None:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _poll_changed(self) -> bool:
+        changed = False
+        for path in self._dirs:
+            current = self._stat(path)
+            if current != self._snapshot.get(path):
+                self._snapshot[path] = current
+                changed = True
+        return changed
+
+    def _forget_replaced(self) -> None:
+        # Watches of removed directories are dropped by the kernel, let them be re-added
+        # once the directories are created again
+        kept = {
+            p
+            for p in self._dirs
+            if (st := self._stat(p)) and (prev := self._snapshot.get(p)) and st[0] == prev[0]
+        }
+        for path in self._dirs - kept:
+            self._snapshot.pop(path, None)
+        self._dirs = kept
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait until something changes in the watched directories.
+
+        Args:
+            timeout: Maximum time to wait in seconds, 0 for a non-blocking check and `None`
+                to wait indefinitely.
+
+        Returns:
+            True if a change was detected, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if self._inotify is not None:
+                changed = self._wait_events(inotify=self._inotify, timeout=remaining)
+            else:
+                changed = self._poll_changed()
+            changed = self._poll_pids() or changed
+
+            if changed:
+                self._forget_replaced()
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            if self._inotify is None:
+                time.sleep(min(self.poll_interval, remaining or self.poll_interval))
+
+    def _wait_events(self, inotify: _Inotify, timeout: float | None) -> bool:
+        # Processes without a pidfd are checked every poll interval
+        if self._polled_pids:
+            timeout = self.poll_interval if timeout is None else min(timeout, self.poll_interval)
+        ready, __, __ = select.select([inotify.fd, *self._pidfds.values()], [], [], timeout)
+
+        changed = False
+        if inotify.fd in ready:
+            changed = inotify.drain()
+        for pid, pidfd in list(self._pidfds.items()):
+            if pidfd in ready:
+                os.close(pidfd)
+                del self._pidfds[pid]
+                changed = True
+        return changed
+
+    def close(self) -> None:
+        for pidfd in self._pidfds.values():
+            with contextlib.suppress(OSError):
+                os.close(pidfd)
+        self._pidfds.clear()
+        if self._inotify is not None:
+            with contextlib.suppress(OSError):
+                self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self) -> "DirWatcher":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
@@ -0,0 +1,221 @@
+"""Overrides of the genesis parameters of a testnet instance.
+
+The overrides are applied to the genesis spec files copied to the destination dir of
+the instance, before the start script generates the genesis from them. Only the
+parameters listed in `PARAMS` can be overridden, and their values are validated, so
+an invalid genesis is rejected before any node is started.
+"""
+
+import dataclasses
+import json
+import math
+import pathlib as pl
+import typing as tp
+
+SHELLEY_SPEC = "genesis.spec.json"
+ALONZO_SPEC = "genesis.alonzo.spec.json"
+CONWAY_SPEC = "genesis.conway.spec.json"
+
+
+@dataclasses.dataclass(frozen=True)
+class GenesisParam:
+    spec_file: str
+    path: tuple[str, ...]
+    is_float: bool = False
+    min_value: float = 1
+    max_value: float | None = None
+    # The minimal value is exclusive
+    min_exclusive: bool = False
+
+
+PARAMS = {
+    # Epoch and slot parameters
+    "epochLength": GenesisParam(spec_file=SHELLEY_SPEC, path=("epochLength",)),
+    "slotLength": GenesisParam(
+        spec_file=SHELLEY_SPEC,
+        path=("slotLength",),
+        is_float=True,
+        min_value=0,
+        max_value=10,
+        min_exclusive=True,
+    ),
+    "activeSlotsCoeff": GenesisParam(
+        spec_file=SHELLEY_SPEC,
+        path=("activeSlotsCoeff",),
+        is_float=True,
+        min_value=0,
+        max_value=1,
+        min_exclusive=True,
+    ),
+    "securityParam": GenesisParam(spec_file=SHELLEY_SPEC, path=("securityParam",)),
+    # Shelley protocol parameters
+    "maxTxSize": GenesisParam(spec_file=SHELLEY_SPEC, path=("protocolParams", "maxTxSize")),
+    "maxBlockBodySize": GenesisParam(
+        spec_file=SHELLEY_SPEC, path=("protocolParams", "maxBlockBodySize")
+    ),
+    "maxBlockHeaderSize": GenesisParam(
+        spec_file=SHELLEY_SPEC, path=("protocolParams", "maxBlockHeaderSize"), min_value=1100
+    ),
+    "keyDeposit": GenesisParam(
+        spec_file=SHELLEY_SPEC, path=("protocolParams", "keyDeposit"), min_value=0
+    ),
+    "poolDeposit": GenesisParam(
+        spec_file=SHELLEY_SPEC, path=("protocolParams", "poolDeposit"), min_value=0
+    ),
+    "minFeeA": GenesisParam(
+        spec_file=SHELLEY_SPEC, path=("protocolParams", "minFeeA"), min_value=0
+    ),
+    "minFeeB": GenesisParam(
+        spec_file=SHELLEY_SPEC, path=("protocolParams", "minFeeB"), min_value=0
+    ),
+    "eMax": GenesisParam(spec_file=SHELLEY_SPEC, path=("protocolParams", "eMax")),
+    "nOpt": GenesisParam(spec_file=SHELLEY_SPEC, path=("protocolParams", "nOpt")),
+    "minPoolCost": GenesisParam(
+        spec_file=SHELLEY_SPEC, path=("protocolParams", "minPoolCost"), min_value=0
+    ),
+    # Alonzo protocol parameters
+    "collateralPercentage": GenesisParam(spec_file=ALONZO_SPEC, path=("collateralPercentage",)),
+    "maxCollateralInputs": GenesisParam(spec_file=ALONZO_SPEC, path=("maxCollateralInputs",)),
+    # Conway protocol parameters
+    "govActionLifetime": GenesisParam(spec_file=CONWAY_SPEC, path=("govActionLifetime",)),
+    "govActionDeposit": GenesisParam(
+        spec_file=CONWAY_SPEC, path=("govActionDeposit",), min_value=0
+    ),
+    "dRepDeposit": GenesisParam(spec_file=CONWAY_SPEC, path=("dRepDeposit",), min_value=0),
+    "dRepActivity": GenesisParam(spec_file=CONWAY_SPEC, path=("dRepActivity",)),
+    "committeeMinSize": GenesisParam(
+        spec_file=CONWAY_SPEC, path=("committeeMinSize",), min_value=0
+    ),
+    "committeeMaxTermLength": GenesisParam(spec_file=CONWAY_SPEC, path=("committeeMaxTermLength",)),
+}
+
+EPOCH_PARAMS = ("epochLength", "slotLength", "activeSlotsCoeff", "securityParam")
+
+
+def parse_value(name: str, value: str) -> int | float:
+    """Parse and check the value of the genesis parameter.
+
+    Raises:
+        ValueError: Unknown parameter, or invalid value.
+    """
+    param = PARAMS.get(name)
+    if param is None:
+        msg = f"Unknown genesis parameter '{name}', available: {', '.join(sorted(PARAMS))}."
+        raise ValueError(msg)
+
+    try:
+        parsed: int | float = float(value) if param.is_float else int(value)
+    except ValueError:
+        kind = "a number" if param.is_float else "an integer"
+        msg = f"Value of '{name}' must be {kind}, got '{value}'."
+        raise ValueError(msg) from None
+
+    if not math.isfinite(parsed):
+        msg = f"Value of '{name}' must be finite, got '{value}'."
+        raise ValueError(msg)
+    if parsed < param.min_value or (param.min_exclusive and parsed == param.min_value):
+        relation = ">" if param.min_exclusive else ">="
+        msg = f"Value of '{name}' must be {relation} {param.min_value}, got '{value}'."
+        raise ValueError(msg)
+    if param.max_value is not None and parsed > param.max_value:
+        msg = f"Value of '{name}' must be <= {param.max_value}, got '{value}'."
+        raise ValueError(msg)
+    return parsed
+
+
+def parse_overrides(pairs: tp.Iterable[str]) -> dict[str, int | float]:
+    """Parse overrides given as `NAME=VALUE` strings.
+
+    Raises:
+        ValueError: The override is not valid.
+    """
+    overrides: dict[str, int | float] = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            msg = f"Genesis parameter override must be in the `NAME=VALUE` format, got '{pair}'."
+            raise ValueError(msg)
+        overrides[name.strip()] = parse_value(name=name.strip(), value=value.strip())
+    return overrides
+
+
+def _get_number(data: dict, path: tuple[str, ...]) -> float:
+    value = data
+    for key in path:
+        value = value[key]
+    return float(value)  # type: ignore[arg-type]
+
+
+def _load_specs(scriptsdir: pl.Path, spec_files: set[str]) -> dict[str, dict]:
+    specs = {}
+    for spec_file in spec_files:
+        with open(scriptsdir / spec_file, encoding="utf-8") as fp_in:
+            specs[spec_file] = json.load(fp_in)
+    return specs
+
+
+def get_effective(
+    scriptsdir: pl.Path, overrides: dict[str, int | float], names: tp.Sequence[str]
+) -> dict[str, float]:
+    """Get values of the parameters after the overrides are applied to the variant specs."""
+    specs = _load_specs(scriptsdir=scriptsdir, spec_files={PARAMS[n].spec_file for n in names})
+    effective = {}
+    for name in names:
+        if name in overrides:
+            effective[name] = float(overrides[name])
+            continue
+        param = PARAMS[name]
+        effective[name] = _get_number(data=specs[param.spec_file], path=param.path)
+    return effective
+
+
+def validate(scriptsdir: pl.Path, overrides: dict[str, int | float]) -> None:
+    """Check the overrides and their consistency with the rest of the genesis.
+
+    Raises:
+        ValueError: Unknown parameter, invalid value, or the parameters are not consistent.
+    """
+    if not overrides:
+        return
+
+    for name, value in overrides.items():
+        parse_value(name=name, value=str(value))
+
+    values = get_effective(
+        scriptsdir=scriptsdir,
+        overrides=overrides,
+        names=(*EPOCH_PARAMS, "maxTxSize", "maxBlockBodySize"),
+    )
+
+    # The epoch must be long enough for the randomness of the next epoch to stabilize
+    min_epoch_length = math.ceil(4 * values["securityParam"] / values["activeSlotsCoeff"])
+    if values["epochLength"] < min_epoch_length:
+        msg = (
+            f"`epochLength` {int(values['epochLength'])} is too short for `securityParam` "
+            f"{int(values['securityParam'])} and `activeSlotsCoeff` "
+            f"{values['activeSlotsCoeff']}, it must be at least {min_epoch_length} (4k/f)."
+        )
+        raise ValueError(msg)
+
+    if values["maxBlockBodySize"] < values["maxTxSize"]:
+        msg = (
+            f"`maxBlockBodySize` {int(values['maxBlockBodySize'])} is smaller than "
+            f"`maxTxSize` {int(values['maxTxSize'])}."
+        )
+        raise ValueError(msg)
+
+
+def apply_overrides(destdir: pl.Path, overrides: dict[str, int | float]) -> None:
+    """Apply the overrides to the genesis spec files in the destination dir."""
+    specs = _load_specs(scriptsdir=destdir, spec_files={PARAMS[n].spec_file for n in overrides})
+    for name, value in overrides.items():
+        param = PARAMS[name]
+        data = specs[param.spec_file]
+        for key in param.path[:-1]:
+            data = data.setdefault(key, {})
+        data[param.path[-1]] = value
+
+    for spec_file, data in specs.items():
+        with open(destdir / spec_file, "w", encoding="utf-8") as fp_out:
+            json.dump(data, fp_out, indent=2)
+            fp_out.write("\n")
@@ -0,0 +1,543 @@
+"""Governance actions proposed, voted on and enacted with `cardano-cli`.
+
+All the votes needed for an action are cast with the keys the testnet scripts created:
+the CC hot keys, the pool cold keys and the DRep keys. The vote files are created in
+parallel `cardano-cli` processes, and the votes are submitted in as few transactions as
+the transaction size allows.
+
+The ledger ratifies and enacts actions only at epoch boundaries, so the ledger state is
+queried right after every epoch boundary, until the action is enacted.
+"""
+
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import pathlib as pl
+import time
+import typing as tp
+
+from cardonnay import structs
+from cardonnay import txbuild
+
+LOGGER = logging.getLogger(__name__)
+
+GOV_DATA_DIR = "governance_data"
+ANCHOR_URL = "http://www.cardonnay-gov.com"
+ANCHOR_DATA_HASH = "5d372dca1a4cc90d7d16d966c48270e33e3aa0abcb0e78f0d5ca7ff330d2245d"
+# A vote with its key witness takes about 170 bytes, so the batch is well below the 16 kB
+# max tx size of the testnet genesis
+MAX_VOTES_PER_TX = 40
+# Bytes added to the size of the probe tx, the final fee and change amounts can be longer
+FEE_SIZE_MARGIN = 64
+# Time after the epoch boundary before the ledger state is queried
+EPOCH_MARGIN_SEC = 1.0
+# First protocol version after the bootstrap phase, when DReps can vote
+DREP_VOTING_MAJOR_VERSION = 10
+
+# `cardano-cli` options of the protocol parameters that can be updated, by their names
+# in the output of `query protocol-parameters`
+PPARAM_FLAGS = {
+    "collateralPercentage": "--collateral-percent",
+    "committeeMaxTermLength": "--committee-term-length",
+    "committeeMinSize": "--min-committee-size",
+    "dRepActivity": "--drep-activity",
+    "dRepDeposit": "--drep-deposit",
+    "govActionDeposit": "--new-governance-action-deposit",
+    "govActionLifetime": "--governance-action-lifetime",
+    "maxBlockBodySize": "--max-block-body-size",
+    "maxBlockHeaderSize": "--max-block-header-size",
+    "maxCollateralInputs": "--max-collateral-inputs",
+    "maxTxSize": "--max-tx-size",
+    "maxValueSize": "--max-value-size",
+    "minFeeRefScriptCostPerByte": "--ref-script-cost-per-byte",
+    "minPoolCost": "--min-pool-cost",
+    "poolRetireMaxEpoch": "--pool-retirement-epoch-interval",
+    "stakeAddressDeposit": "--key-reg-deposit-amt",
+    "stakePoolDeposit": "--pool-reg-deposit",
+    "stakePoolTargetNum": "--number-of-pools",
+    "txFeeFixed": "--min-fee-constant",
+    "txFeePerByte": "--min-fee-linear",
+    "utxoCostPerByte": "--utxo-cost-per-byte",
+}
+
+# Parameters of the security group, the stake pools vote on updates of these
+SECURITY_PPARAMS = frozenset(
+    (
+        "govActionDeposit",
+        "maxBlockBodySize",
+        "maxBlockExecutionUnits",
+        "maxBlockHeaderSize",
+        "maxTxSize",
+        "maxValueSize",
+        "minFeeRefScriptCostPerByte",
+        "txFeeFixed",
+        "txFeePerByte",
+        "utxoCostPerByte",
+    )
+)
+
+# Purposes of the chains of actions that need the ID of the previous action
+PURPOSE_PPARAMS = "PParamUpdate"
+PURPOSE_HARDFORK = "HardFork"
+
+
+@dataclasses.dataclass(frozen=True)
+class Voter:
+    # "cc", "spo" or "drep"
+    role: str
+    vkey_file: pl.Path
+    skey_file: pl.Path
+
+    @property
+    def vkey_arg(self) -> str:
+        return {
+            "cc": "--cc-hot-verification-key-file",
+            "spo": "--cold-verification-key-file",
+            "drep": "--drep-verification-key-file",
+        }[self.role]
+
+
+def parse_pparams(pairs: tp.Iterable[str]) -> dict[str, int]:
+    """Parse protocol parameter updates given as `NAME=VALUE` strings.
+
+    Raises:
+        ValueError: The update is not valid.
+    """
+    pparams: dict[str, int] = {}
+    for pair in pairs:
+        name, sep, value = (p.strip() for p in pair.partition("="))
+        if not sep:
+            msg = f"Protocol parameter update must be in the `NAME=VALUE` format, got '{pair}'."
+            raise ValueError(msg)
+        if name not in PPARAM_FLAGS:
+            msg = f"Unknown protocol parameter '{name}', available: {', '.join(PPARAM_FLAGS)}."
+            raise ValueError(msg)
+        try:
+            pparams[name] = int(value)
+        except ValueError:
+            msg = f"Value of '{name}' must be an integer, got '{value}'."
+            raise ValueError(msg) from None
+        if pparams[name] < 0:
+            msg = f"Value of '{name}' must be >= 0, got '{value}'."
+            raise ValueError(msg)
+    return pparams
+
+
+def get_voters(statedir: pl.Path) -> list[Voter]:
+    """Get all the voters whose keys were created by the testnet scripts."""
+    gov_dir = statedir / GOV_DATA_DIR
+    keys = [
+        ("cc", sorted(gov_dir.glob("cc_member*_committee_hot.vkey")), "_hot.vkey", "_hot.skey"),
+        ("spo", sorted((statedir / "nodes").glob("node-pool*/cold.vkey")), ".vkey", ".skey"),
+        ("drep", sorted(gov_dir.glob("default_drep_*_drep.vkey")), ".vkey", ".skey"),
+    ]
+    voters = []
+    for role, vkey_files, vkey_suffix, skey_suffix in keys:
+        for vkey_file in vkey_files:
+            skey_file = vkey_file.with_name(vkey_file.name.removesuffix(vkey_suffix) + skey_suffix)
+            if skey_file.exists():
+                voters.append(Voter(role=role, vkey_file=vkey_file, skey_file=skey_file))
+    return voters
+
+
+def query_gov_state(ctx: txbuild.TxContext) -> dict:
+    output = txbuild.run_cli(ctx=ctx, args=["conway", "query", "gov-state", *ctx.magic_args])
+    return dict(json.loads(output))
+
+
+def _action_id(data: object) -> str:
+    if not isinstance(data, dict):
+        return ""
+    return f"{data.get('txId')}#{data.get('govActionIx')}"
+
+
+def _find_action(actions: object, action_id: str) -> dict | None:
+    for action in actions if isinstance(actions, list) else ():
+        if isinstance(action, dict) and _action_id(action.get("actionId")) == action_id:
+            return action
+    return None
+
+
+def get_prev_action_id(gov_state: dict, purpose: str) -> str:
+    """Get ID of the action the new action of the purpose follows, empty if there is none.
+
+    That is the last enacted action, or the ratified action that will be enacted next.
+    """
+    enact_state = (gov_state.get("nextRatifyState") or {}).get("nextEnactState") or {}
+    return _action_id((enact_state.get("prevGovActionIds") or {}).get(purpose))
+
+
+def _is_enacted(gov_state: dict, action_id: str) -> bool:
+    """Check if the action is the last enacted action of its purpose."""
+    enact_state = (gov_state.get("nextRatifyState") or {}).get("nextEnactState") or {}
+    prev_ids = (enact_state.get("prevGovActionIds") or {}).values()
+    return any(_action_id(a) == action_id for a in prev_ids)
+
+
+def _get_prev_args(prev_action_id: str) -> list[str]:
+    if not prev_action_id:
+        return []
+    txid, __, index = prev_action_id.partition("#")
+    return [
+        "--prev-governance-action-tx-id",
+        txid,
+        "--prev-governance-action-index",
+        index,
+    ]
+
+
+def create_pparams_action(
+    ctx: txbuild.TxContext,
+    statedir: pl.Path,
+    pparams: dict[str, int],
+    deposit: int,
+    prev_action_id: str,
+    out_file: pl.Path,
+) -> pl.Path:
+    """Create the proposal of the protocol parameters update."""
+    txbuild.run_cli(
+        ctx=ctx,
+        args=[
+            "conway",
+            "governance",
+            "action",
+            "create-protocol-parameters-update",
+            "--testnet",
+            "--governance-action-deposit",
+            str(deposit),
+            "--deposit-return-stake-verification-key-file",
+            str(statedir / "nodes" / "node-pool1" / "reward.vkey"),
+            *_get_prev_args(prev_action_id=prev_action_id),
+            "--anchor-url",
+            ANCHOR_URL,
+            "--anchor-data-hash",
+            ANCHOR_DATA_HASH,
+            *(a for n, v in pparams.items() for a in (PPARAM_FLAGS[n], str(v))),
+            "--out-file",
+            str(out_file),
+        ],
+    )
+    return out_file
+
+
+def create_hardfork_action(
+    ctx: txbuild.TxContext,
+    statedir: pl.Path,
+    major_version: int,
+    deposit: int,
+    prev_action_id: str,
+    out_file: pl.Path,
+) -> pl.Path:
+    """Create the proposal of the hard fork to the protocol major version."""
+    txbuild.run_cli(
+        ctx=ctx,
+        args=[
+            "conway",
+            "governance",
+            "action",
+            "create-hardfork",
+            "--testnet",
+            "--governance-action-deposit",
+            str(deposit),
+            "--deposit-return-stake-verification-key-file",
+            str(statedir / "nodes" / "node-pool1" / "reward.vkey"),
+            *_get_prev_args(prev_action_id=prev_action_id),
+            "--anchor-url",
+            ANCHOR_URL,
+            "--anchor-data-hash",
+            ANCHOR_DATA_HASH,
+            "--protocol-major-version",
+            str(major_version),
+            "--protocol-minor-version",
+            "0",
+            "--out-file",
+            str(out_file),
+        ],
+    )
+    return out_file
+
+
+def submit_proposal(
+    ctx: txbuild.TxContext,
+    payer: structs.AddressData,
+    proposal_file: pl.Path,
+    deposit: int,
+    workdir: pl.Path,
+) -> str:
+    """Submit the proposal, wait until it is on chain and return the action ID."""
+    needed = deposit + txbuild.DEFAULT_FEE + txbuild.MIN_UTXO_VALUE
+    txins = txbuild.select_txins(ctx=ctx, address=payer.address, needed=needed)
+    change = sum(t.amount for t in txins) - deposit - txbuild.DEFAULT_FEE
+    tx_file = txbuild.build_and_sign(
+        ctx=ctx,
+        txins=txins,
+        txouts=[f"{payer.address}+{change}"],
+        fee=txbuild.DEFAULT_FEE,
+        skey_file=payer.skey_file,
+        out_base=workdir / "proposal",
+        extra_args=["--proposal-file", str(proposal_file)],
+    )
+    txbuild.submit_tx(ctx=ctx, tx_file=tx_file)
+    txid = txbuild.get_txid(ctx=ctx, tx_file=tx_file)
+    txbuild.wait_for_utxo(ctx=ctx, txin=f"{txid}#0")
+    return f"{txid}#0"
+
+
+def select_voters(voters: tp.Sequence[Voter], action: dict, protocol_major: int) -> list[Voter]:
+    """Select the voters that are allowed to vote on the action, see CIP-1694."""
+    gov_action = (action.get("proposalProcedure") or {}).get("govAction") or {}
+    tag = gov_action.get("tag", "")
+
+    roles = set()
+    if tag not in ("NoConfidence", "UpdateCommittee"):
+        roles.add("cc")
+    if tag in ("HardForkInitiation", "NoConfidence", "UpdateCommittee", "InfoAction"):
+        roles.add("spo")
+    elif tag == "ParameterChange":
+        contents = gov_action.get("contents") or []
+        updated = {k for c in contents if isinstance(c, dict) for k in c}
+        if updated & SECURITY_PPARAMS:
+            roles.add("spo")
+    # DReps can vote only on info actions during the bootstrap phase
+    if protocol_major >= DREP_VOTING_MAJOR_VERSION or tag == "InfoAction":
+        roles.add("drep")
+
+    return [v for v in voters if v.role in roles]
+
+
+def create_votes(
+    ctx: txbuild.TxContext,
+    action_id: str,
+    voters: tp.Sequence[Voter],
+    workdir: pl.Path,
+    workers: int = 8,
+) -> list[pl.Path]:
+    """Create a "yes" vote file of every voter, in parallel `cardano-cli` processes."""
+    txid, __, index = action_id.partition("#")
+
+    def _create(num: int, voter: Voter) -> pl.Path:
+        out_file = workdir / f"{voter.role}{num}.vote"
+        txbuild.run_cli(
+            ctx=ctx,
+            args=[
+                "conway",
+                "governance",
+                "vote",
+                "create",
+                "--yes",
+                "--governance-action-tx-id",
+                txid,
+                "--governance-action-index",
+                index,
+                voter.vkey_arg,
+                str(voter.vkey_file),
+                "--out-file",
+                str(out_file),
+            ],
+        )
+        return out_file
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_create, range(len(voters)), voters))
+
+
+def _calc_fee(pparams: dict, tx_size: int) -> int:
+    return int(pparams["txFeeFixed"] + pparams["txFeePerByte"] * (tx_size + FEE_SIZE_MARGIN))
+
+
+def submit_votes(
+    ctx: txbuild.TxContext,
+    payer: structs.AddressData,
+    voters: tp.Sequence[Voter],
+    vote_files: tp.Sequence[pl.Path],
+    workdir: pl.Path,
+) -> int:
+    """Submit the votes in as few transactions as possible; return the number of them.
+
+    The fee of every transaction is calculated from the size of the signed probe tx with
+    the same votes and witnesses. The transactions are chained through their change
+    outputs and submitted one after another, only the last one is waited for.
+
+    Raises:
+        RuntimeError: Not enough funds, a transaction is over the max size, or
+            a `cardano-cli` command failed.
+    """
+    pparams = txbuild.query_protocol_params(ctx=ctx, out_file=workdir / "pparams.json")
+    max_tx_size = int(pparams["maxTxSize"])
+    batches = [
+        range(i, min(i + MAX_VOTES_PER_TX, len(voters)))
+        for i in range(0, len(voters), MAX_VOTES_PER_TX)
+    ]
+    # No transaction can pay more than the fee of a tx of the max size
+    needed = len(batches) * _calc_fee(pparams=pparams, tx_size=max_tx_size)
+    txins = txbuild.select_txins(
+        ctx=ctx, address=payer.address, needed=needed + txbuild.MIN_UTXO_VALUE
+    )
+    total = sum(t.amount for t in txins)
+
+    for tx_num, batch in enumerate(batches):
+        extra_args = [a for i in batch for a in ("--vote-file", str(vote_files[i]))]
+        extra_skey_files = [voters[i].skey_file for i in batch]
+        probe_file = txbuild.build_and_sign(
+            ctx=ctx,
+            txins=txins,
+            txouts=[f"{payer.address}+{total}"],
+            fee=0,
+            skey_file=payer.skey_file,
+            out_base=workdir / f"votes{tx_num}_probe",
+            extra_args=extra_args,
+            extra_skey_files=extra_skey_files,
+        )
+        tx_size = len(txbuild.read_tx_cbor(tx_file=probe_file))
+        if tx_size + FEE_SIZE_MARGIN > max_tx_size:
+            msg = f"The tx with {len(batch)} votes is over the max tx size {max_tx_size}."
+            raise RuntimeError(msg)
+        fee = _calc_fee(pparams=pparams, tx_size=tx_size)
+        change = total - fee
+        tx_file = txbuild.build_and_sign(
+            ctx=ctx,
+            txins=txins,
+            txouts=[f"{payer.address}+{change}"],
+            fee=fee,
+            skey_file=payer.skey_file,
+            out_base=workdir / f"votes{tx_num}",
+            extra_args=extra_args,
+            extra_skey_files=extra_skey_files,
+        )
+        txbuild.submit_tx(ctx=ctx, tx_file=tx_file)
+        txid = txbuild.get_txid(ctx=ctx, tx_file=tx_file)
+        txins = [txbuild.TxIn(txin=f"{txid}#0", amount=change)]
+        total = change
+
+    txbuild.wait_for_utxo(ctx=ctx, txin=txins[0].txin)
+    return len(batches)
+
+
+def _sleep_to_next_epoch(ctx: txbuild.TxContext, slot_length: float, deadline: float) -> None:
+    tip = txbuild.query_tip(ctx=ctx)
+    slots_left = tip.get("slotsToEpochEnd")
+    # Without the information, check again after a few slots
+    sleep_sec = slots_left * slot_length if slots_left is not None else 10 * slot_length
+    time.sleep(max(0.0, min(sleep_sec + EPOCH_MARGIN_SEC, deadline - time.monotonic())))
+
+
+def wait_for_enactment(
+    ctx: txbuild.TxContext, action_id: str, slot_length: float, timeout: float
+) -> tuple[int, int]:
+    """Wait until the action is enacted; return the ratification and enactment epochs.
+
+    The action that is ratified in an epoch is enacted at the start of the next epoch.
+
+    Raises:
+        RuntimeError: The action expired or was removed without being enacted.
+        TimeoutError: The action was not enacted within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    ratified_epoch: int | None = None
+    while True:
+        epoch = int(txbuild.query_tip(ctx=ctx)["epoch"])
+        gov_state = query_gov_state(ctx=ctx)
+        ratify_state = gov_state.get("nextRatifyState") or {}
+        is_proposed = _find_action(gov_state.get("proposals"), action_id) is not None
+
+        if ratified_epoch is None:
+            if _find_action(ratify_state.get("enactedGovActions"), action_id):
+                ratified_epoch = epoch
+                LOGGER.info(f"Action {action_id} ratified in epoch {epoch}.")
+            elif _find_action(ratify_state.get("expiredGovActions"), action_id):
+                msg = f"Action {action_id} expired in epoch {epoch} without being ratified."
+                raise RuntimeError(msg)
+            elif not is_proposed and _is_enacted(gov_state=gov_state, action_id=action_id):
+                # Ratified and enacted between the queries, in the previous epoch at the latest
+                LOGGER.info(f"Action {action_id} enacted by epoch {epoch}.")
+                return epoch - 1, epoch
+            elif not is_proposed:
+                msg = f"Action {action_id} was removed in epoch {epoch} without being ratified."
+                raise RuntimeError(msg)
+        elif epoch > ratified_epoch and not is_proposed:
+            return ratified_epoch, ratified_epoch + 1
+
+        if time.monotonic() >= deadline:
+            msg = f"Action {action_id} was not enacted within {timeout} sec."
+            raise TimeoutError(msg)
+        _sleep_to_next_epoch(ctx=ctx, slot_length=slot_length, deadline=deadline)
+
+
+def check_pparams(ctx: txbuild.TxContext, pparams: dict[str, int], workdir: pl.Path) -> None:
+    """Check that the current protocol parameters have the updated values.
+
+    Raises:
+        RuntimeError: A parameter doesn't have the updated value.
+    """
+    current = txbuild.query_protocol_params(ctx=ctx, out_file=workdir / "pparams.json")
+    if mismatched := {n: current.get(n) for n, v in pparams.items() if current.get(n) != v}:
+        msg = f"Protocol parameters don't have the updated values: {mismatched}"
+        raise RuntimeError(msg)
+
+
+def enact_action(
+    ctx: txbuild.TxContext,
+    statedir: pl.Path,
+    payer: structs.AddressData,
+    action_id: str,
+    workdir: pl.Path,
+    wait: bool = True,
+    timeout: float = 3600,
+    slot_length: float = 1.0,
+) -> structs.GovActionReport:
+    """Vote on the proposed action with all the allowed voters and wait for its enactment.
+
+    Raises:
+        RuntimeError: The action is not proposed, a transaction failed, or the action
+            was not enacted.
+        TimeoutError: The votes didn't get on chain, or the action was not enacted in time.
+    """
+    start = time.monotonic()
+    gov_state = query_gov_state(ctx=ctx)
+    action = _find_action(gov_state.get("proposals"), action_id)
+    if action is None:
+        msg = f"Action {action_id} is not among the proposed governance actions."
+        raise RuntimeError(msg)
+
+    protocol_major = int(
+        ((gov_state.get("currentPParams") or {}).get("protocolVersion") or {}).get("major", 0)
+    )
+    voters = select_voters(
+        voters=get_voters(statedir=statedir), action=action, protocol_major=protocol_major
+    )
+    if not voters:
+        msg = f"No keys found for voting on the action {action_id}."
+        raise RuntimeError(msg)
+
+    vote_files = create_votes(ctx=ctx, action_id=action_id, voters=voters, workdir=workdir)
+    vote_txs = submit_votes(
+        ctx=ctx, payer=payer, voters=voters, vote_files=vote_files, workdir=workdir
+    )
+    voted_epoch = int(txbuild.query_tip(ctx=ctx)["epoch"])
+    votes: dict[str, int] = {}
+    for voter in voters:
+        votes[voter.role] = votes.get(voter.role, 0) + 1
+    LOGGER.info(f"Submitted {len(voters)} votes on {action_id} in {vote_txs} transactions.")
+
+    ratified_epoch = enacted_epoch = None
+    if wait:
+        ratified_epoch, enacted_epoch = wait_for_enactment(
+            ctx=ctx,
+            action_id=action_id,
+            slot_length=slot_length,
+            timeout=max(0.0, timeout - (time.monotonic() - start)),
+        )
+
+    gov_action = (action.get("proposalProcedure") or {}).get("govAction") or {}
+    return structs.GovActionReport(
+        action_id=action_id,
+        action_type=str(gov_action.get("tag", "")),
+        proposed_epoch=action.get("proposedIn"),
+        votes=votes,
+        vote_txs=vote_txs,
+        voted_epoch=voted_epoch,
+        ratified_epoch=ratified_epoch,
+        enacted_epoch=enacted_epoch,
+        duration_sec=round(time.monotonic() - start, 2),
+    )
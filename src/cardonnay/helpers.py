@@ -9,13 +9,11 @@ import threading
 import time
 import typing as tp
 
-import pydantic
-import pygments
-from pygments.formatters import terminal as pterminal
-from pygments.lexers import data as pdata
-
 from cardonnay import ttypes
 
+if tp.TYPE_CHECKING:
+    import pydantic
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -38,6 +36,15 @@ def should_use_color() -> bool:
     return False
 
 
+def discard_stdout() -> None:
+    """Redirect stdout to /dev/null after the reader of a pipe went away.
+
+    Prevents another `BrokenPipeError` when stdout is flushed at interpreter exit.
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+
 def write_json(out_file: pl.Path, content: dict) -> pl.Path:
     """Write dictionary content to JSON file."""
     with open(out_file, "w", encoding="utf-8") as out_fp:
@@ -48,6 +55,11 @@ def write_json(out_file: pl.Path, content: dict) -> pl.Path:
 def print_json_str(data: str) -> None:
     """Print JSON string to stdout in a pretty format."""
     if should_use_color():
+        # Pygments is slow to import, load it only when the output is colored
+        import pygments  # noqa: PLC0415
+        from pygments.formatters import terminal as pterminal  # noqa: PLC0415
+        from pygments.lexers import data as pdata  # noqa: PLC0415
+
         print(
             pygments.highlight(
                 code=data, lexer=pdata.JsonLexer(), formatter=pterminal.TerminalFormatter()
@@ -57,12 +69,12 @@ def print_json_str(data: str) -> None:
         print(data)
 
 
-def print_json(data: dict | list | pydantic.BaseModel) -> None:
+def print_json(data: "dict | list | pydantic.BaseModel") -> None:
     """Print JSON data to stdout in a pretty format."""
-    if isinstance(data, pydantic.BaseModel):
-        json_str = data.model_dump_json(indent=2)
-    else:
+    if isinstance(data, dict | list):
         json_str = json.dumps(data, cls=CustomEncoder, indent=2)
+    else:
+        json_str = data.model_dump_json(indent=2)
     print_json_str(data=json_str)
 
 
@@ -160,6 +172,23 @@ def read_from_file(file: ttypes.FileType) -> str:
         return in_file.read().strip()
 
 
+def percentile(values: tp.Sequence[float], pct: float) -> float:
+    """Return the percentile of sorted values, linearly interpolated between closest ranks.
+
+    Args:
+        values: Non-empty sequence of values, sorted in ascending order.
+        pct: Percentile in the 0-100 range.
+    """
+    if not values:
+        msg = "Cannot compute percentile of an empty sequence."
+        raise ValueError(msg)
+
+    rank = (len(values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
 def wait_for_file(
     file: ttypes.FileType,
     timeout: float,
@@ -167,24 +196,34 @@ def wait_for_file(
 ) -> bool:
     """Wait for a file to appear within a time limit.
 
+    Uses inotify when available, so it returns as soon as the file is created.
+
     Args:
         file: Path to the target file.
         timeout: Time limit in seconds.
-        poll_interval: Time between checks (default 0.2s).
+        poll_interval: Time between checks when inotify is not available (default 0.2s).
 
     Returns:
         True if file appeared in time, False otherwise.
     """
+    from cardonnay import fs_watch  # noqa: PLC0415
+
     file = pl.Path(file)
     deadline = time.monotonic() + timeout
 
-    while time.monotonic() < deadline:
-        try:
+    with fs_watch.DirWatcher(poll_interval=poll_interval) as watcher:
+        while True:
+            # Any parent component may not exist yet, watch the closest existing one
+            watched = file.parent
+            while not watched.is_dir() and watched != watched.parent:
+                watched = watched.parent
+            watcher.watch(watched)
+            watcher.watch(file.parent)
+
             if file.is_file():
                 return True
-        except FileNotFoundError:
-            pass  # Any parent component may not exist yet
 
-        time.sleep(poll_interval)
-
-    return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            watcher.wait(timeout=remaining)
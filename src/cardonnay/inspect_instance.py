@@ -7,6 +7,7 @@ import re
 from cardonnay import ca_utils
 from cardonnay import consts
 from cardonnay import helpers
+from cardonnay import proc_stats
 from cardonnay import structs
 
 LOGGER = logging.getLogger(__name__)
@@ -159,14 +160,7 @@ def get_supervisor_env(statedir: pl.Path) -> structs.SupervisorData:
 
 def get_testnet_info(statedir: pl.Path) -> structs.InstanceInfo:
     """Get information about the testnet instance."""
-    if (statedir / "supervisord.sock").exists():
-        testnet_state = (
-            consts.States.STARTED
-            if (statedir / ca_utils.STATUS_STARTED).exists()
-            else consts.States.STARTING
-        )
-    else:
-        testnet_state = consts.States.STOPPED
+    testnet_state = ca_utils.get_instance_state(statedir=statedir)
 
     try:
         with open(statedir / ca_utils.TESTNET_JSON, encoding="utf-8") as fp_in:
@@ -214,6 +208,9 @@ def get_testnet_info(statedir: pl.Path) -> structs.InstanceInfo:
         start_logfile=start_logfile,
         control_env=get_control_env(statedir=statedir),
         supervisor_env=get_supervisor_env(statedir=statedir),
+        node_processes=proc_stats.get_node_stats(supervisord_pid=supervisord_pid)
+        if supervisord_pid > 0 and testnet_state != consts.States.STOPPED
+        else {},
     )
 
     return instance_info
@@ -229,6 +226,7 @@ def get_config(statedir: pl.Path) -> structs.CombinedConfig:
         open(statedir / "shelley" / "genesis.json", encoding="utf-8") as fp_in,
     ):
         data = json.load(fp_in)
+        config.activeSlotsCoeff = data.get("activeSlotsCoeff")
         config.epochLength = data.get("epochLength")
         config.maxLovelaceSupply = data.get("maxLovelaceSupply")
         config.networkMagic = data.get("networkMagic")
@@ -248,15 +246,35 @@ def get_config(statedir: pl.Path) -> structs.CombinedConfig:
         config.govActionDeposit = data.get("govActionDeposit")
         config.govActionLifetime = data.get("govActionLifetime")
 
-    # config-pool1.json
+    # config-<node>.json, the backend can differ between nodes with `MIXED_UTXO_BACKENDS`
+    node_names = sorted(
+        (
+            f.stem.removeprefix("config-")
+            for f in statedir.glob("config-*.json")
+            if f.stem.removeprefix("config-").startswith(("bft", "pool"))
+        ),
+        key=lambda n: (not n.startswith("bft"), len(n), n),
+    )
+    for node_name in node_names:
+        with (
+            contextlib.suppress(Exception),
+            open(statedir / f"config-{node_name}.json", encoding="utf-8") as fp_in,
+        ):
+            data = json.load(fp_in)
+            config.ledgerdb_backends[node_name] = (data.get("LedgerDB") or {}).get(
+                "Backend", "default"
+            )
+    config.ledgerdb_backend = config.ledgerdb_backends.get("pool1", "default")
+
+    # testnet.json
     with (
         contextlib.suppress(Exception),
-        open(statedir / "config-pool1.json", encoding="utf-8") as fp_in,
+        open(statedir / ca_utils.TESTNET_JSON, encoding="utf-8") as fp_in,
     ):
         data = json.load(fp_in)
-        config.ledgerdb_backend = (
-            data.get("LedgerDB", {}).get("Backend", "default") if "LedgerDB" in data else "default"
-        )
+        config.trace_profile = data.get("trace_profile") or "default"
+        config.topology_seed = data.get("topology_seed")
+        config.genesis_params = data.get("genesis_params") or {}
 
     # Derived field
     if config.epochLength is not None and config.slotLength is not None:
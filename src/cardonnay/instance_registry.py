@@ -0,0 +1,182 @@
+"""Registry of testnet instances in the workdir.
+
+The registry file `instances.json` records every instance created in the workdir: its
+testnet variant, last seen state, ports, PIDs and comment. It is written atomically by
+the create and stop paths, so listing the instances needs a single `open` instead of
+globbing the workdir and reading `testnet.json` of every instance.
+
+The state recorded for every instance is checked against the state files in its state
+dir on each read. When any of them differs, or the registry is missing or was written by
+an incompatible version, the workdir is scanned and the registry is rewritten. A state dir
+that was not created through cardonnay is found only on such a rescan.
+"""
+
+import json
+import logging
+import os
+import pathlib as pl
+import typing as tp
+
+from cardonnay import ca_utils
+from cardonnay import consts
+from cardonnay import helpers
+
+LOGGER = logging.getLogger(__name__)
+
+REGISTRY_FILE = "instances.json"
+REGISTRY_LOCK = "instances.lock"
+REGISTRY_VERSION = 1
+
+
+def _get_statedir(workdir: pl.Path, instance_num: int) -> pl.Path:
+    return workdir / f"{ca_utils.STATE_CLUSTER_PREFIX}{instance_num}"
+
+
+def _read_pid(pidfile: pl.Path) -> int | None:
+    try:
+        pid = int(helpers.read_from_file(pidfile))
+    except (OSError, ValueError):
+        return None
+    return pid if pid > 0 else None
+
+
+def load_registry(workdir: pl.Path) -> dict[int, dict[str, tp.Any]] | None:
+    """Load instances from the registry; return None when it is missing or not valid."""
+    try:
+        with open(workdir / REGISTRY_FILE, encoding="utf-8") as fp_in:
+            content = json.load(fp_in)
+        if content.get("version") != REGISTRY_VERSION:
+            return None
+        return {int(e["instance"]): e for e in content["instances"]}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as excp:
+        LOGGER.debug(f"Ignoring invalid instance registry in '{workdir}': {excp}")
+        return None
+
+
+def _write_registry(workdir: pl.Path, instances: dict[int, dict[str, tp.Any]]) -> None:
+    content = {
+        "version": REGISTRY_VERSION,
+        "instances": [instances[i] for i in sorted(instances)],
+    }
+    registry_file = workdir / REGISTRY_FILE
+    tmp_file = workdir / f".{REGISTRY_FILE}.tmp{os.getpid()}"
+    with open(tmp_file, "w", encoding="utf-8") as fp_out:
+        json.dump(content, fp_out, indent=2)
+    tmp_file.replace(registry_file)
+
+
+def is_consistent(workdir: pl.Path, instances: dict[int, dict[str, tp.Any]]) -> bool:
+    """Check that the recorded state of every instance matches its state dir."""
+    return all(
+        entry.get("state")
+        == ca_utils.get_instance_state(statedir=_get_statedir(workdir=workdir, instance_num=i))
+        for i, entry in instances.items()
+    )
+
+
+def _refresh_entry(workdir: pl.Path, entry: dict[str, tp.Any]) -> dict[str, tp.Any]:
+    """Update state, variant, comment and supervisord PID of the instance from its state dir."""
+    statedir = _get_statedir(workdir=workdir, instance_num=entry["instance"])
+    state = ca_utils.get_instance_state(statedir=statedir)
+
+    # `testnet.json` is copied to the state dir only when the instance starts
+    testnet_info: dict[str, tp.Any] = {}
+    try:
+        with open(statedir / ca_utils.TESTNET_JSON, encoding="utf-8") as fp_in:
+            loaded = json.load(fp_in)
+        if isinstance(loaded, dict):
+            testnet_info = loaded
+    except (OSError, ValueError):
+        pass
+
+    refreshed: dict[str, tp.Any] = {
+        "instance": entry["instance"],
+        "type": "unknown",
+        "state": state,
+        "comment": None,
+        "ports": None,
+        "start_pid": None,
+        "supervisord_pid": None,
+        **entry,
+    }
+    refreshed["state"] = state
+    refreshed["supervisord_pid"] = (
+        _read_pid(statedir / "supervisord.pid") if state != consts.States.STOPPED else None
+    )
+    if testnet_info.get("name"):
+        refreshed["type"] = str(testnet_info["name"])
+    if testnet_info.get("comment") is not None:
+        refreshed["comment"] = str(testnet_info["comment"])
+    return refreshed
+
+
+def _scan(
+    workdir: pl.Path, instances: dict[int, dict[str, tp.Any]]
+) -> dict[int, dict[str, tp.Any]]:
+    """Refresh the recorded instances and add the ones found in the workdir."""
+    instance_nums = set(instances)
+    for statedir in workdir.glob(f"{ca_utils.STATE_CLUSTER_PREFIX}*"):
+        suffix = statedir.name[ca_utils.STATE_CLUSTER_PREFIX_LEN :]
+        if suffix.isascii() and suffix.isdigit():
+            instance_nums.add(int(suffix))
+
+    return {
+        i: _refresh_entry(workdir=workdir, entry=instances.get(i) or {"instance": i})
+        for i in instance_nums
+    }
+
+
+def _locked_update(
+    workdir: pl.Path,
+    update: tp.Callable[[dict[int, dict[str, tp.Any]]], dict[int, dict[str, tp.Any]]],
+) -> dict[int, dict[str, tp.Any]]:
+    import filelock  # noqa: PLC0415
+
+    with filelock.FileLock(lock_file=str(workdir / REGISTRY_LOCK), timeout=5):
+        instances = update(load_registry(workdir=workdir) or {})
+        _write_registry(workdir=workdir, instances=instances)
+    return instances
+
+
+def get_instances(workdir: pl.Path) -> dict[int, dict[str, tp.Any]]:
+    """Get all instances recorded in the registry, rebuild the registry when it is stale."""
+    instances = load_registry(workdir=workdir)
+    if instances is not None and is_consistent(workdir=workdir, instances=instances):
+        return instances
+
+    LOGGER.debug(f"The instance registry in '{workdir}' is stale, scanning the workdir.")
+    if not workdir.is_dir():
+        return {}
+    try:
+        return _locked_update(workdir=workdir, update=lambda i: _scan(workdir=workdir, instances=i))
+    except Exception as excp:
+        LOGGER.debug(f"Cannot update the instance registry in '{workdir}': {excp}")
+        return _scan(workdir=workdir, instances=instances or {})
+
+
+def get_running_instances(workdir: pl.Path) -> set[int]:
+    """Get numbers of the instances that are starting or started."""
+    return {
+        i
+        for i, entry in get_instances(workdir=workdir).items()
+        if entry["state"] != consts.States.STOPPED
+    }
+
+
+def record_instance(workdir: pl.Path, instance_num: int, **fields: object) -> None:
+    """Record the instance with the given fields, its state is read from the state dir.
+
+    Failures are only logged, the registry is rebuilt on the next read when it is stale.
+    """
+
+    def _update(instances: dict[int, dict[str, tp.Any]]) -> dict[int, dict[str, tp.Any]]:
+        entry = {**instances.get(instance_num, {}), **fields, "instance": instance_num}
+        instances[instance_num] = _refresh_entry(workdir=workdir, entry=entry)
+        return instances
+
+    try:
+        _locked_update(workdir=workdir, update=_update)
+    except Exception as excp:
+        LOGGER.warning(f"Cannot update the instance registry in '{workdir}': {excp}")
@@ -0,0 +1,233 @@
+"""Transaction load submitted to `cardano-submit-api` or directly to the node sockets.
+
+Signed transactions are submitted concurrently, every worker over its own long-lived
+connection: a keep-alive HTTP/1.1 connection to submit-api, or a node-to-client
+connection to a node socket. Every worker submits its share of transactions in order,
+so transactions that depend on each other can be assigned to the same worker.
+
+The report lists the accepted TPS, latency percentiles and the number of errors by kind.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import json
+import logging
+import pathlib as pl
+import time
+import typing as tp
+
+from cardonnay import helpers
+from cardonnay import node_client
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+SUBMIT_API_PATH = "/api/submit/tx"
+SUBMIT_TIMEOUT_SEC = 30
+# Depth of nested `tag` fields used to classify submit errors
+ERROR_TAG_DEPTH = 3
+
+
+@dataclasses.dataclass(frozen=True)
+class SubmitResult:
+    latency_ms: float
+    error: str = ""
+    # False when the connection failed before any response was received
+    responded: bool = True
+
+
+class Submitter(tp.Protocol):
+    async def submit(self, tx: bytes) -> str:
+        """Submit the transaction; return an empty string when accepted, error kind otherwise."""
+        ...
+
+    async def close(self) -> None: ...
+
+
+class HttpConnection:
+    """Keep-alive HTTP/1.1 client connection, reconnected when the server closes it."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def close(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        with contextlib.suppress(OSError):
+            await self._writer.wait_closed()
+        self._reader = self._writer = None
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: dict[str, str]) -> bytes:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks: list[bytes] = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+        return await reader.readexactly(int(headers.get("content-length", "0")))
+
+    async def post(self, path: str, body: bytes, content_type: str) -> tuple[int, bytes]:
+        """Post the body and return the response status and body."""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        assert self._reader is not None
+
+        request = (
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+        )
+        self._writer.write(request.encode() + body)
+        await self._writer.drain()
+
+        head = (await self._reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        status_line, *header_lines = head.strip().split("\r\n")
+        headers = {
+            k.strip().lower(): v.strip() for k, __, v in (h.partition(":") for h in header_lines)
+        }
+        response_body = await self._read_body(reader=self._reader, headers=headers)
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return int(status_line.split()[1]), response_body
+
+
+def _collect_tags(data: object, depth: int) -> list[str]:
+    if depth <= 0 or not isinstance(data, dict):
+        return []
+    tag = data.get("tag")
+    nested = data.get("contents")
+    if isinstance(nested, list) and nested:
+        nested = nested[0]
+    return ([str(tag)] if tag else []) + _collect_tags(nested, depth - 1)
+
+
+def get_error_kind(status: int, body: bytes) -> str:
+    """Classify the submit error by the HTTP status and the error tags in the response."""
+    with contextlib.suppress(ValueError):
+        if tags := _collect_tags(json.loads(body), depth=ERROR_TAG_DEPTH):
+            return f"HTTP {status}: {'/'.join(tags)}"
+    return f"HTTP {status}"
+
+
+class SubmitApiSubmitter(HttpConnection):
+    async def submit(self, tx: bytes) -> str:
+        status, body = await self.post(
+            path=SUBMIT_API_PATH, body=tx, content_type="application/cbor"
+        )
+        return "" if status == 202 else get_error_kind(status=status, body=body)  # noqa: PLR2004
+
+
+async def _submit_worker(
+    submitter: Submitter,
+    lane: tp.Iterable[tuple[int, bytes]],
+    results: list[SubmitResult],
+    start: float,
+    tps: float,
+) -> None:
+    for num, tx_cbor in lane:
+        if tps > 0 and (delay := start + num / tps - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+        sent = time.monotonic()
+        try:
+            error = await asyncio.wait_for(submitter.submit(tx=tx_cbor), timeout=SUBMIT_TIMEOUT_SEC)
+        except (
+            OSError,
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            ValueError,
+            node_client.NodeClientError,
+        ) as excp:
+            await submitter.close()
+            latency_ms = (time.monotonic() - sent) * 1000
+            results.append(
+                SubmitResult(latency_ms=latency_ms, error=type(excp).__name__, responded=False)
+            )
+            continue
+
+        latency_ms = (time.monotonic() - sent) * 1000
+        results.append(SubmitResult(latency_ms=latency_ms, error=error))
+
+
+async def submit_lanes(
+    submitters: tp.Sequence[Submitter],
+    lanes: tp.Sequence[tp.Iterable[tuple[int, bytes]]],
+    tps: float = 0,
+) -> tuple[list[SubmitResult], float]:
+    """Submit every lane of numbered transactions in order, through its own submitter.
+
+    With `tps` > 0, the transaction number `n` is not submitted sooner than `n / tps`
+    seconds after the start.
+    Returns the results and the duration of the submission in seconds.
+    """
+    results: list[SubmitResult] = []
+    start = time.monotonic()
+    try:
+        await asyncio.gather(
+            *(
+                _submit_worker(submitter=s, lane=ln, results=results, start=start, tps=tps)
+                for s, ln in zip(submitters, lanes, strict=True)
+            )
+        )
+    finally:
+        await asyncio.gather(*(s.close() for s in submitters))
+    return results, time.monotonic() - start
+
+
+async def post_txs(
+    host: str, port: int, txs: list[bytes], connections: int, tps: float = 0
+) -> tuple[list[SubmitResult], float]:
+    """Post the independent transactions to submit-api over concurrent connections."""
+    submitters = [SubmitApiSubmitter(host=host, port=port) for __ in range(connections)]
+    numbered = list(enumerate(txs))
+    lanes = [numbered[c::connections] for c in range(connections)]
+    return await submit_lanes(submitters=submitters, lanes=lanes, tps=tps)
+
+
+def get_submit_report(
+    endpoint: str,
+    results: list[SubmitResult],
+    duration_sec: float,
+    connections: int,
+    tps: float,
+    build_sec: float | None = None,
+    corpus: pl.Path | None = None,
+) -> structs.SubmitLoadReport:
+    accepted = [r for r in results if not r.error]
+    latencies = sorted(r.latency_ms for r in results if r.responded)
+    errors: dict[str, int] = {}
+    for result in results:
+        if result.error:
+            errors[result.error] = errors.get(result.error, 0) + 1
+
+    latency_ms = None
+    if latencies:
+        latency_ms = structs.UsageStats(
+            mean=round(sum(latencies) / len(latencies), 1),
+            p50=round(helpers.percentile(latencies, 50), 1),
+            p95=round(helpers.percentile(latencies, 95), 1),
+            p99=round(helpers.percentile(latencies, 99), 1),
+            max=round(latencies[-1], 1),
+        )
+
+    return structs.SubmitLoadReport(
+        endpoint=endpoint,
+        corpus=corpus,
+        txs=len(results),
+        connections=connections,
+        target_tps=tps or None,
+        build_sec=round(build_sec, 2) if build_sec is not None else None,
+        duration_sec=round(duration_sec, 2),
+        accepted=len(accepted),
+        rejected=len(results) - len(accepted),
+        accepted_tps=round(len(accepted) / duration_sec, 1) if duration_sec > 0 else 0.0,
+        latency_ms=latency_ms,
+        errors=dict(sorted(errors.items(), key=lambda e: -e[1])),
+    )
@@ -1,7 +1,6 @@
 """Functionality for cluster scripts (starting and stopping clusters)."""
 
 import dataclasses
-import itertools
 import logging
 import pathlib as pl
 import random
@@ -36,6 +35,7 @@ class InstancePorts:
     metrics_submit_api: int
     submit_api: int
     smash: int
+    metrics_dbsync: int
     supervisor: int
     relay1: int
     ekg_relay1: int
@@ -58,10 +58,18 @@ class InstancePorts:
 class LocalScripts:
     """Scripts for starting local cluster."""
 
-    def __init__(self, num_pools: int, scripts_dir: pl.Path, ports_base: int) -> None:
+    def __init__(
+        self,
+        num_pools: int,
+        scripts_dir: pl.Path,
+        ports_base: int,
+        topology_seed: int | None = None,
+    ) -> None:
         self.num_pools = num_pools
         self.scripts_dir = scripts_dir
         self.ports_base = ports_base
+        # The same seed generates the same topology, so runs can be compared
+        self._random = random.Random(topology_seed)
 
     def get_instance_ports(self, instance_num: int) -> InstancePorts:
         """Return ports mapping for given cluster instance."""
@@ -89,6 +97,7 @@ class LocalScripts:
             metrics_submit_api=last_port - 1,
             submit_api=last_port - 2,
             smash=last_port - 3,
+            metrics_dbsync=last_port - 4,
             supervisor=12001 + instance_num,
             # Relay1
             relay1=0,
@@ -148,6 +157,10 @@ class LocalScripts:
         new_content = new_content.replace(
             "%%METRICS_SUBMIT_API_PORT%%", str(instance_ports.metrics_submit_api)
         )
+        # Reconfigure db-sync metrics port
+        new_content = new_content.replace(
+            "%%METRICS_DBSYNC_PORT%%", str(instance_ports.metrics_dbsync)
+        )
         # Reconfigure smash port
         new_content = new_content.replace("%%SMASH_PORT%%", str(instance_ports.smash))
         # Reconfigure webserver port
@@ -158,8 +171,8 @@ class LocalScripts:
         """Generate topology for given ports."""
         # Select fixed ports and several randomly selected ports
         rand_threshold = 3
-        sample_ports = random.sample(ports, 3) if len(ports) > rand_threshold else ports
-        selected_ports = set(fixed_ports + sample_ports)
+        sample_ports = self._random.sample(ports, 3) if len(ports) > rand_threshold else ports
+        selected_ports = sorted(set(fixed_ports + sample_ports))
         access_points = [{"address": addr, "port": port} for port in selected_ports]
         topology = {
             "localRoots": [
@@ -195,12 +208,10 @@ class LocalScripts:
         instance_ports = self.get_instance_ports(instance_num=instance_num)
         ports_per_node = instance_ports.pool1 - instance_ports.bft1
         addr = "127.0.0.1"
-        common_dir = indir.parent / "common"
 
-        # Reconfigure cluster instance files.
-        # Make sure the files originating from "common" dir are overwritten if there are
-        # duplicate files in the `indir`.
-        for infile in itertools.chain(common_dir.glob("*"), indir.glob("*")):
+        # Reconfigure cluster instance files. The `indir` is the resolved testnet variant,
+        # so it already contains the files originating from the "common" dir.
+        for infile in indir.glob("*"):
             fname = infile.name
 
             # Skip template files
@@ -272,6 +283,7 @@ def prepare_scripts_files(
     instance_num: int,
     num_pools: int,
     ports_base: int,
+    topology_seed: int | None = None,
 ) -> InstanceFiles:
     """Prepare scripts files for starting and stopping cluster instance."""
     testnet_path = scriptsdir / "testnet.json"
@@ -279,10 +291,31 @@ def prepare_scripts_files(
         msg = f"Testnet file not found in '{scriptsdir}'."
         raise RuntimeError(msg)
 
-    local_scripts = LocalScripts(num_pools=num_pools, scripts_dir=scriptsdir, ports_base=ports_base)
+    local_scripts = LocalScripts(
+        num_pools=num_pools,
+        scripts_dir=scriptsdir,
+        ports_base=ports_base,
+        topology_seed=topology_seed,
+    )
     startup_files = local_scripts.prepare_scripts_files(
         destdir=destdir,
         instance_num=instance_num,
         scriptsdir=scriptsdir,
     )
     return startup_files
+
+
+def get_ports_summary(
+    scriptsdir: pl.Path, instance_num: int, num_pools: int, ports_base: int
+) -> dict[str, tp.Any]:
+    """Return the main ports of the cluster instance and the ports of its nodes."""
+    local_scripts = LocalScripts(num_pools=num_pools, scripts_dir=scriptsdir, ports_base=ports_base)
+    ports = local_scripts.get_instance_ports(instance_num=instance_num)
+    return {
+        "base": ports.base,
+        "supervisor": ports.supervisor,
+        "submit_api": ports.submit_api,
+        "smash": ports.smash,
+        "webserver": ports.webserver,
+        "nodes": {("bft1" if n.num == 0 else f"pool{n.num}"): n.node for n in ports.node_ports},
+    }
@@ -0,0 +1,421 @@
+"""Incremental offset index of node logs, and queries across the logs of all nodes.
+
+Every log segment gets a sidecar index file `.<log name>.<inode>.idx` next to the log.
+The index is a JSON-lines file with a header line followed by one line per block of
+about `BLOCK_SIZE` bytes of the log. Each block records its byte range, the range of
+trace timestamps and the sets of namespaces and severities seen in it, so a query reads
+only the blocks that can contain matching lines.
+
+The index is keyed by inode, so it stays valid when supervisord renames the log file
+during rotation. The archive gzipped from a rotated segment has a new inode, it takes over
+the index of the segment, as the offsets in the uncompressed content are the same.
+
+Only complete blocks of the current (growing) log file are indexed, the remaining tail
+is scanned on every query and indexed once it grows to a full block.
+"""
+
+import dataclasses
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import os
+import pathlib as pl
+import re
+import typing as tp
+
+from cardonnay import consts
+from cardonnay import node_logs
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+BLOCK_SIZE = 256 * 1024
+# Size of the file head used to detect a reused inode
+HEAD_SIZE = 4096
+
+SEVERITIES = consts.TRACE_SEVERITIES
+
+
+@dataclasses.dataclass(frozen=True)
+class Block:
+    offset: int
+    end: int
+    first_ts: float | None
+    last_ts: float | None
+    namespaces: frozenset[str]
+    severities: frozenset[str]
+
+
+@dataclasses.dataclass(frozen=True)
+class Query:
+    since: float | None = None
+    until: float | None = None
+    namespaces: tuple[str, ...] = ()
+    min_severity: str = ""
+    pattern: re.Pattern[str] | None = None
+
+    def _ns_matches(self, namespace: str) -> bool:
+        return any(namespace == n or namespace.startswith(f"{n}.") for n in self.namespaces)
+
+    def _sev_matches(self, severity: str) -> bool:
+        try:
+            return SEVERITIES.index(severity) >= SEVERITIES.index(self.min_severity)
+        except ValueError:
+            return False
+
+    def match_block(self, block: Block) -> bool:
+        """Check if the block can contain lines matching the query."""
+        if block.first_ts is not None and block.last_ts is not None:
+            if self.since is not None and block.last_ts < self.since:
+                return False
+            if self.until is not None and block.first_ts >= self.until:
+                return False
+        if self.namespaces and not any(self._ns_matches(n) for n in block.namespaces):
+            return False
+        return not (self.min_severity and not any(self._sev_matches(s) for s in block.severities))
+
+    def match_trace(self, trace: node_logs.TraceLine, timestamp: float | None) -> bool:
+        """Check if the trace line matches the query.
+
+        The timestamp of lines without their own timestamp is inherited from the preceding
+        line, so multi-line traces are kept together.
+        """
+        if timestamp is not None:
+            if self.since is not None and timestamp < self.since:
+                return False
+            if self.until is not None and timestamp >= self.until:
+                return False
+        elif self.since is not None or self.until is not None:
+            return False
+        if self.namespaces and not self._ns_matches(trace.namespace):
+            return False
+        if self.min_severity and not self._sev_matches(trace.severity):
+            return False
+        return not (self.pattern and not self.pattern.search(trace.text))
+
+
+@dataclasses.dataclass(frozen=True)
+class MatchedLine:
+    timestamp: float
+    name: str
+    text: str
+
+
+def _open_binary(segment: pl.Path) -> tp.BinaryIO:
+    if segment.suffix == ".gz":
+        return gzip.open(segment, "rb")  # type: ignore[return-value]
+    return open(segment, "rb")
+
+
+def _get_head_digest(segment: pl.Path, size: int) -> str:
+    with _open_binary(segment) as fp_in:
+        return hashlib.sha1(fp_in.read(size), usedforsecurity=False).hexdigest()
+
+
+def get_index_path(logfile: pl.Path, inode: int) -> pl.Path:
+    """Return path of the sidecar index file of a log segment with the given inode."""
+    return logfile.with_name(f".{logfile.name}.{inode}.idx")
+
+
+def _block_to_json(block: Block) -> str:
+    return json.dumps(
+        {
+            "offset": block.offset,
+            "end": block.end,
+            "first_ts": block.first_ts,
+            "last_ts": block.last_ts,
+            "namespaces": sorted(block.namespaces),
+            "severities": sorted(block.severities),
+        }
+    )
+
+
+def _block_from_dict(record: dict) -> Block:
+    return Block(
+        offset=int(record["offset"]),
+        end=int(record["end"]),
+        first_ts=record.get("first_ts"),
+        last_ts=record.get("last_ts"),
+        namespaces=frozenset(record.get("namespaces") or ()),
+        severities=frozenset(record.get("severities") or ()),
+    )
+
+
+def _load_index(index_file: pl.Path, segment: pl.Path, stat: os.stat_result) -> list[Block]:
+    """Load blocks from the index file; return an empty list if the index is not valid."""
+    try:
+        with open(index_file, encoding="utf-8") as fp_in:
+            header = json.loads(fp_in.readline() or "{}")
+            if (
+                header.get("version") != INDEX_VERSION
+                or header.get("dev") != stat.st_dev
+                or header.get("inode") != stat.st_ino
+            ):
+                return []
+            # Compressed segments are indexed in one go, a different size means the
+            # index was created from an incomplete archive
+            if segment.suffix == ".gz" and header.get("file_size") != stat.st_size:
+                return []
+            head_len = int(header.get("head_len") or 0)
+            if head_len and _get_head_digest(segment, head_len) != header.get("head_sha1"):
+                return []
+            return _read_blocks(fp_in)
+    except (OSError, ValueError):
+        return []
+
+
+def _read_blocks(fp_in: tp.TextIO) -> list[Block]:
+    """Read the blocks that follow the header of the index file."""
+    blocks: list[Block] = []
+    for line in fp_in:
+        try:
+            block = _block_from_dict(json.loads(line))
+        except (ValueError, KeyError, TypeError):
+            break  # Partially written line
+        # Blocks appended concurrently by another process may be duplicated
+        if block.offset != (blocks[-1].end if blocks else 0):
+            continue
+        blocks.append(block)
+    return blocks
+
+
+def _get_gzip_size(segment: pl.Path) -> int | None:
+    """Get size of the uncompressed content (modulo 4 GiB) from the gzip trailer."""
+    try:
+        with open(segment, "rb") as fp_in:
+            fp_in.seek(-4, os.SEEK_END)
+            return int.from_bytes(fp_in.read(4), "little")
+    except OSError:
+        return None
+
+
+def _find_source_index(logfile: pl.Path, segment: pl.Path, size: int) -> list[Block]:
+    """Find blocks of the rotated segment the compressed segment was created from.
+
+    The log compressor gzips the rotated segment to a file with a new inode, but the
+    uncompressed content, and so the offsets of the blocks, stay the same.
+    """
+    digests: dict[int, str] = {}
+    for index_file in logfile.parent.glob(f".{logfile.name}.*.idx"):
+        try:
+            with open(index_file, encoding="utf-8") as fp_in:
+                header = json.loads(fp_in.readline() or "{}")
+                blocks = _read_blocks(fp_in)
+            head_len = int(header.get("head_len") or 0)
+            if (
+                header.get("version") != INDEX_VERSION
+                or not head_len
+                or not blocks
+                or blocks[-1].end > size
+            ):
+                continue
+            if head_len not in digests:
+                digests[head_len] = _get_head_digest(segment, head_len)
+            if digests[head_len] == header.get("head_sha1"):
+                return blocks
+        except (OSError, ValueError, EOFError):
+            continue
+    return []
+
+
+def _scan_blocks(fp_in: tp.BinaryIO, offset: int, final: bool) -> tp.Iterator[Block]:
+    """Read the log from the offset and split it to blocks of complete lines."""
+    lines: list[bytes] = []
+    block_start = block_end = offset
+
+    def _make_block() -> Block:
+        timestamps: list[float] = []
+        namespaces: set[str] = set()
+        severities: set[str] = set()
+        for raw_line in lines:
+            trace = node_logs.parse_trace_line(raw_line.decode("utf-8", errors="replace"))
+            if trace.timestamp is not None:
+                timestamps.append(trace.timestamp)
+            if trace.namespace:
+                namespaces.add(trace.namespace)
+            if trace.severity:
+                severities.add(trace.severity)
+        return Block(
+            offset=block_start,
+            end=block_end,
+            first_ts=min(timestamps) if timestamps else None,
+            last_ts=max(timestamps) if timestamps else None,
+            namespaces=frozenset(namespaces),
+            severities=frozenset(severities),
+        )
+
+    fp_in.seek(offset)
+    for raw_line in fp_in:
+        # Incomplete last line of the current log file will be indexed later
+        if not raw_line.endswith(b"\n") and not final:
+            break
+        lines.append(raw_line)
+        block_end += len(raw_line)
+        if block_end - block_start >= BLOCK_SIZE:
+            yield _make_block()
+            lines = []
+            block_start = block_end
+
+    if lines and final:
+        yield _make_block()
+
+
+def update_index(logfile: pl.Path, segment: pl.Path, final: bool) -> tuple[list[Block], int]:
+    """Index the not yet indexed part of the log segment.
+
+    Args:
+        logfile: Path to the current log file.
+        segment: Path to the log segment.
+        final: Whether the segment is complete, i.e. it is not the current log file.
+
+    Returns:
+        Indexed blocks and the offset where the unindexed tail of the segment starts.
+    """
+    stat = segment.stat()
+    index_file = get_index_path(logfile=logfile, inode=stat.st_ino)
+    blocks = _load_index(index_file=index_file, segment=segment, stat=stat)
+    indexed_end = blocks[-1].end if blocks else 0
+
+    # The log file was truncated, or the index was created from an incomplete archive
+    if segment.suffix != ".gz" and stat.st_size < indexed_end:
+        blocks, indexed_end = [], 0
+    if segment.suffix != ".gz" and stat.st_size - indexed_end < BLOCK_SIZE and not final:
+        return blocks, indexed_end
+    if segment.suffix == ".gz" and blocks:
+        return blocks, indexed_end
+
+    # A new archive reuses the index of its rotated segment, only the part of the segment
+    # that was not indexed yet is scanned
+    adopted: list[Block] = []
+    if segment.suffix == ".gz" and (size := _get_gzip_size(segment)) is not None:
+        adopted = _find_source_index(logfile=logfile, segment=segment, size=size)
+        indexed_end = adopted[-1].end if adopted else 0
+
+    new_blocks: list[Block] = []
+    # Seeking in the archive decompresses it, skip a fully indexed one
+    if not adopted or indexed_end != size:
+        with _open_binary(segment) as fp_in:
+            new_blocks = list(_scan_blocks(fp_in=fp_in, offset=indexed_end, final=final))
+    new_blocks = [*adopted, *new_blocks]
+    if not new_blocks:
+        return blocks, indexed_end
+
+    try:
+        if blocks:
+            with open(index_file, "a", encoding="utf-8") as fp_out:
+                fp_out.writelines(f"{_block_to_json(b)}\n" for b in new_blocks)
+        else:
+            head_len = min(HEAD_SIZE, new_blocks[-1].end)
+            header = {
+                "version": INDEX_VERSION,
+                "dev": stat.st_dev,
+                "inode": stat.st_ino,
+                "file_size": stat.st_size,
+                "head_len": head_len,
+                "head_sha1": _get_head_digest(segment, head_len),
+            }
+            tmp_file = index_file.with_name(f"{index_file.name}.tmp{os.getpid()}")
+            with open(tmp_file, "w", encoding="utf-8") as fp_out:
+                fp_out.write(f"{json.dumps(header)}\n")
+                fp_out.writelines(f"{_block_to_json(b)}\n" for b in new_blocks)
+            tmp_file.replace(index_file)
+    except OSError as excp:
+        LOGGER.warning(f"Failed to write log index '{index_file}': {excp}")
+
+    blocks.extend(new_blocks)
+    return blocks, blocks[-1].end
+
+
+def remove_stale_indexes(logfile: pl.Path, segments: tp.Iterable[pl.Path]) -> None:
+    """Remove index files of log segments that no longer exist."""
+    valid = set()
+    for segment in segments:
+        try:
+            inode = segment.stat().st_ino
+        except FileNotFoundError:
+            # Claimed and compressed by the log compressor in the meantime
+            continue
+        valid.add(get_index_path(logfile=logfile, inode=inode).name)
+
+    for index_file in logfile.parent.glob(f".{logfile.name}.*.idx"):
+        if index_file.name not in valid:
+            index_file.unlink(missing_ok=True)
+
+
+def _iter_matching_lines(
+    fp_in: tp.BinaryIO, start: int, end: int | None, query: Query, timestamp: float | None
+) -> tp.Iterator[tuple[float | None, str]]:
+    fp_in.seek(start)
+    data = fp_in.read() if end is None else fp_in.read(end - start)
+    for raw_line in data.splitlines():
+        trace = node_logs.parse_trace_line(raw_line.decode("utf-8", errors="replace"))
+        if trace.timestamp is not None:
+            timestamp = trace.timestamp
+        if query.match_trace(trace=trace, timestamp=timestamp):
+            yield timestamp, trace.text
+
+
+def query_segment(
+    logfile: pl.Path, segment: pl.Path, final: bool, query: Query
+) -> tp.Iterator[tuple[float, str]]:
+    """Iterate over lines of the log segment that match the query."""
+    try:
+        blocks, tail_start = update_index(logfile=logfile, segment=segment, final=final)
+        fp_in = _open_binary(segment)
+    except FileNotFoundError:
+        return
+
+    last_ts: float | None = None
+    with fp_in:
+        for block in blocks:
+            if block.last_ts is not None:
+                last_ts = block.last_ts
+            if not query.match_block(block):
+                continue
+            for timestamp, text in _iter_matching_lines(
+                fp_in=fp_in,
+                start=block.offset,
+                end=block.end,
+                query=query,
+                timestamp=block.first_ts,
+            ):
+                yield timestamp or 0.0, text
+
+        # Complete segments are fully indexed, there is no tail to scan
+        if final:
+            return
+        for timestamp, text in _iter_matching_lines(
+            fp_in=fp_in, start=tail_start, end=None, query=query, timestamp=last_ts
+        ):
+            yield timestamp or 0.0, text
+
+
+def query_log(logfile: pl.Path, query: Query) -> tp.Iterator[tuple[float, str]]:
+    """Iterate over lines of all segments of the rotated log that match the query."""
+    segments = node_logs.get_log_segments(logfile=logfile)
+    try:
+        for segment in segments:
+            yield from query_segment(
+                logfile=logfile, segment=segment, final=segment != logfile, query=query
+            )
+    finally:
+        # Only after the new archives took over the indexes of their rotated segments
+        remove_stale_indexes(logfile=logfile, segments=segments)
+
+
+def query_logs(logfiles: dict[str, pl.Path], query: Query) -> tp.Iterator[MatchedLine]:
+    """Iterate over matching lines of multiple logs, merged in timestamp order.
+
+    Args:
+        logfiles: Mapping of names (e.g. node names) to log files.
+        query: The query.
+    """
+
+    def _named(name: str, logfile: pl.Path) -> tp.Iterator[MatchedLine]:
+        for timestamp, text in query_log(logfile=logfile, query=query):
+            yield MatchedLine(timestamp=timestamp, name=name, text=text)
+
+    iterators = [_named(name=n, logfile=f) for n, f in logfiles.items()]
+    yield from heapq.merge(*iterators, key=lambda m: m.timestamp)
@@ -1,18 +1,27 @@
 """Cardonnay CLI entry point."""
 
+import datetime as dt
 import logging
 import typing as tp
 
 import click
 
+# The `cli_*` command handlers and their dependencies (pydantic, pygments, filelock) are
+# imported inside the commands, so every invocation loads only what the command needs
 from cardonnay import ca_utils
-from cardonnay import cli_control
-from cardonnay import cli_create
-from cardonnay import cli_inspect
 from cardonnay import color_logger
+from cardonnay import consts
 
 LOGGER = logging.getLogger(__name__)
 
+DATETIME_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S.%f",
+)
+
 
 def common_options_dir(func: tp.Callable) -> tp.Callable:
     """Add shared options using a decorator."""
@@ -87,7 +96,38 @@ def main() -> None:
 @click.option(
     "-g", "--generate-only", is_flag=True, help="Don't run the testnet cluster (default: false)."
 )
-@click.option("-k", "--keep", is_flag=True, help="Don't delete destination directory if it exists.")
+@click.option(
+    "-k",
+    "--keep",
+    is_flag=True,
+    help="Reuse the destination directory if it exists, instead of re-creating it.",
+)
+@click.option(
+    "--wait",
+    is_flag=True,
+    help="Wait until an instance is free and the machine has capacity for it, instead of failing.",
+)
+@click.option(
+    "--wait-timeout",
+    type=click.IntRange(min=0),
+    default=3600,
+    show_default=True,
+    help="Maximum time to wait for a free instance, in seconds.",
+)
+@click.option(
+    "--max-load",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    help="Don't start the testnet when the load average per CPU would exceed this (0 = no limit).",
+)
+@click.option(
+    "--node-mem",
+    type=click.IntRange(min=0),
+    default=400,
+    show_default=True,
+    help="Memory in MiB needed by a single node, checked before starting (0 = no check).",
+)
 @click.option(
     "-i",
     "--instance-num",
@@ -107,6 +147,58 @@ def main() -> None:
 @click.option(
     "-p", "--ports-base", type=int, default=23000, show_default=True, help="Base port number."
 )
+@click.option(
+    "--trace-profile",
+    type=str,
+    envvar="TRACE_PROFILE",
+    default="default",
+    show_default=True,
+    help="Trace profile applied to node configs (minimal, default, debug, benchmark).",
+)
+@click.option(
+    "--cpus",
+    type=str,
+    default="",
+    help="CPU list the nodes are pinned to, e.g. '0-3,8' (default: no pinning).",
+)
+@click.option(
+    "--mem-max",
+    type=click.IntRange(min=0),
+    default=0,
+    help="Memory limit in MiB for all nodes of the instance (default: no limit).",
+)
+@click.option(
+    "--topology-seed",
+    type=int,
+    help="Seed for the random part of the node topology, for reproducible runs.",
+)
+@click.option(
+    "--epoch-length",
+    type=click.IntRange(min=1),
+    help="Epoch length in slots (default: from the testnet variant).",
+)
+@click.option(
+    "--slot-length",
+    type=click.FloatRange(min=0, max=10, min_open=True),
+    help="Slot length in seconds (default: from the testnet variant).",
+)
+@click.option(
+    "--active-slots-coeff",
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    help="Active slots coefficient `f` (default: from the testnet variant).",
+)
+@click.option(
+    "--security-param",
+    type=click.IntRange(min=1),
+    help="Security parameter `k` (default: from the testnet variant).",
+)
+@click.option(
+    "--pparam",
+    "pparams",
+    multiple=True,
+    metavar="NAME=VALUE",
+    help="Override a genesis protocol parameter, e.g. 'maxTxSize=32768' (can be repeated).",
+)
 @click.option("-v", "--verbose", count=True, help="Increase verbosity (use -vv for more).")
 @common_options_dir
 @click.pass_context
@@ -118,9 +210,22 @@ def create(
     background: bool,
     generate_only: bool,
     keep: bool,
+    wait: bool,
+    wait_timeout: int,
+    max_load: float,
+    node_mem: int,
+    cpus: str,
+    mem_max: int,
+    topology_seed: int | None,
+    epoch_length: int | None,
+    slot_length: float | None,
+    active_slots_coeff: float | None,
+    security_param: int | None,
+    pparams: tuple[str, ...],
     instance_num: int,
     stake_pools_num: int,
     ports_base: int,
+    trace_profile: str,
     verbose: int,
     work_dir: str,
 ) -> None:
@@ -129,6 +234,21 @@ def create(
         click.echo(ctx.get_help())
         ctx.exit(1)
 
+    from cardonnay import cli_create  # noqa: PLC0415
+    from cardonnay import genesis_params  # noqa: PLC0415
+
+    try:
+        genesis_overrides = genesis_params.parse_overrides(pairs=pparams)
+    except ValueError as excp:
+        raise click.BadParameter(str(excp), param_hint="--pparam") from excp
+    epoch_params = {
+        "epochLength": epoch_length,
+        "slotLength": slot_length,
+        "activeSlotsCoeff": active_slots_coeff,
+        "securityParam": security_param,
+    }
+    genesis_overrides.update({k: v for k, v in epoch_params.items() if v is not None})
+
     retval = cli_create.cmd_create(
         testnet_variant=testnet_variant,
         comment=comment,
@@ -138,9 +258,18 @@ def create(
         keep=keep,
         stake_pools_num=stake_pools_num,
         ports_base=ports_base,
+        trace_profile=trace_profile,
         workdir=work_dir,
         instance_num=instance_num,
         verbose=verbose,
+        wait=wait,
+        wait_timeout=wait_timeout,
+        max_load=max_load,
+        node_mem=node_mem,
+        cpus=cpus,
+        mem_max=mem_max,
+        topology_seed=topology_seed,
+        genesis_overrides=genesis_overrides,
     )
     ctx.exit(retval)
 
@@ -155,6 +284,8 @@ def make_actions_cmd(flag_name: str, help_text: str) -> None:
     @common_options_instance
     @common_options_dir
     def cmd(instance_num: int, work_dir: str) -> None:
+        from cardonnay import cli_control  # noqa: PLC0415
+
         retval = cli_control.cmd_actions(
             **{flag_name: True},
             workdir=work_dir,
@@ -166,6 +297,8 @@ def make_actions_cmd(flag_name: str, help_text: str) -> None:
 @control.command(name="ls", help="List running testnet instances.")
 @common_options_dir
 def control_ls(work_dir: str) -> None:
+    from cardonnay import cli_control  # noqa: PLC0415
+
     retval = cli_control.cmd_ls(workdir=work_dir)
     exit_with(retval)
 
@@ -174,6 +307,8 @@ def control_ls(work_dir: str) -> None:
 @common_options_instance
 @common_options_dir
 def control_print_env(instance_num: int, work_dir: str) -> None:
+    from cardonnay import cli_control  # noqa: PLC0415
+
     retval = cli_control.cmd_print_env(workdir=work_dir, instance_num=instance_num)
     exit_with(retval)
 
@@ -186,9 +321,61 @@ for name, help_text in [
     make_actions_cmd(name, help_text)
 
 
+@control.command(name="wait", help="Wait until the testnet instance reaches the state.")
+@click.option(
+    "--state",
+    type=click.Choice([consts.States.STARTED, consts.States.STOPPED]),
+    default=consts.States.STARTED,
+    show_default=True,
+    help="State to wait for.",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0),
+    default=600,
+    show_default=True,
+    help="Maximum time to wait in seconds.",
+)
+@click.option(
+    "--dbsync-synced",
+    is_flag=True,
+    help="After the testnet is started, wait also until db-sync catches up with the node tip.",
+)
+@click.option(
+    "--max-lag",
+    type=click.IntRange(min=0),
+    default=2,
+    show_default=True,
+    help="Maximum number of blocks db-sync can lag behind the tip to be considered synced.",
+)
+@common_options_instance
+@common_options_dir
+def control_wait(
+    state: str,
+    timeout: float,
+    dbsync_synced: bool,
+    max_lag: int,
+    instance_num: int,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_control  # noqa: PLC0415
+
+    retval = cli_control.cmd_wait(
+        workdir=work_dir,
+        instance_num=instance_num,
+        state=state,
+        timeout=timeout,
+        dbsync_synced=dbsync_synced,
+        max_lag_blocks=max_lag,
+    )
+    exit_with(retval)
+
+
 @control.command(name="stop-all", help="Stop all running testnet instances.")
 @common_options_dir
 def control_stopall(work_dir: str) -> None:
+    from cardonnay import cli_control  # noqa: PLC0415
+
     retval = cli_control.cmd_stopall(workdir=work_dir)
     exit_with(retval)
 
@@ -202,6 +389,8 @@ def inspect() -> None:
 @common_options_instance
 @common_options_dir
 def inspect_faucet(instance_num: int, work_dir: str) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
     retval = cli_inspect.cmd_faucet(
         workdir=work_dir,
         instance_num=instance_num,
@@ -213,6 +402,8 @@ def inspect_faucet(instance_num: int, work_dir: str) -> None:
 @common_options_instance
 @common_options_dir
 def inspect_pools(instance_num: int, work_dir: str) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
     retval = cli_inspect.cmd_pools(
         workdir=work_dir,
         instance_num=instance_num,
@@ -224,6 +415,8 @@ def inspect_pools(instance_num: int, work_dir: str) -> None:
 @common_options_instance
 @common_options_dir
 def inspect_status(instance_num: int, work_dir: str) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
     retval = cli_inspect.cmd_status(
         workdir=work_dir,
         instance_num=instance_num,
@@ -235,8 +428,800 @@ def inspect_status(instance_num: int, work_dir: str) -> None:
 @common_options_instance
 @common_options_dir
 def inspect_config(instance_num: int, work_dir: str) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
     retval = cli_inspect.cmd_config(
         workdir=work_dir,
         instance_num=instance_num,
     )
     exit_with(retval)
+
+
+@inspect.command(name="latency", help="Inspect submit-to-inclusion latency of load transactions.")
+@click.option(
+    "--interval",
+    type=click.IntRange(min=1),
+    default=consts.LATENCY_INTERVAL_SEC,
+    show_default=True,
+    help="Length of the reporting interval in seconds.",
+)
+@click.option(
+    "--grace",
+    type=click.IntRange(min=0),
+    default=consts.LATENCY_GRACE_SEC,
+    show_default=True,
+    help="Seconds after submission before a not included transaction counts as dropped.",
+)
+@common_options_instance
+@common_options_dir
+def inspect_latency(interval: int, grace: int, instance_num: int, work_dir: str) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
+    retval = cli_inspect.cmd_latency(
+        workdir=work_dir,
+        instance_num=instance_num,
+        interval_sec=interval,
+        grace_sec=grace,
+    )
+    exit_with(retval)
+
+
+@inspect.command(name="resources", help="Inspect resource usage of the supervisor programs.")
+@click.option(
+    "--last",
+    type=click.IntRange(min=1),
+    help="Summarize only the samples from the last given number of seconds.",
+)
+@click.option(
+    "-p",
+    "--program",
+    "programs",
+    multiple=True,
+    help="Supervisor program to summarize, e.g. 'pool1' or 'dbsync' (default: all).",
+)
+@common_options_instance
+@common_options_dir
+def inspect_resources(
+    last: int | None, programs: tuple[str, ...], instance_num: int, work_dir: str
+) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
+    retval = cli_inspect.cmd_resources(
+        workdir=work_dir,
+        instance_num=instance_num,
+        last_sec=last,
+        programs=programs,
+    )
+    exit_with(retval)
+
+
+@inspect.command(name="forks", help="Inspect forks and divergence of the node tips.")
+@click.option(
+    "--follow",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Follow the node chains for the given number of seconds and summarize this run.",
+)
+@click.option(
+    "--last",
+    type=click.IntRange(min=1),
+    help="Summarize only the records from the last given number of seconds.",
+)
+@click.option(
+    "--prolonged",
+    type=click.FloatRange(min=0),
+    default=5.0,
+    show_default=True,
+    help="Divergence longer than this number of seconds counts as prolonged.",
+)
+@common_options_instance
+@common_options_dir
+def inspect_forks(
+    follow: int, last: int | None, prolonged: float, instance_num: int, work_dir: str
+) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
+    retval = cli_inspect.cmd_forks(
+        workdir=work_dir,
+        instance_num=instance_num,
+        follow_sec=follow,
+        last_sec=last,
+        prolonged_sec=prolonged,
+    )
+    exit_with(retval)
+
+
+@inspect.command(name="dbsync", help="Inspect db-sync lag behind the node tip.")
+@click.option(
+    "--rate-interval",
+    type=click.FloatRange(min=0),
+    default=2,
+    show_default=True,
+    help="Time to measure the db-sync ingestion rate over, in seconds (0 = don't measure).",
+)
+@common_options_instance
+@common_options_dir
+def inspect_dbsync(rate_interval: float, instance_num: int, work_dir: str) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
+    retval = cli_inspect.cmd_dbsync(
+        workdir=work_dir, instance_num=instance_num, rate_interval=rate_interval
+    )
+    exit_with(retval)
+
+
+@inspect.command(name="logs", help="Print logs of a node or service, including rotated segments.")
+@click.option(
+    "--node",
+    "name",
+    required=True,
+    help="Name of the node or service, e.g. 'pool2' or 'tx-firehose'.",
+)
+@click.option(
+    "--stderr",
+    is_flag=True,
+    help="Print the stderr log instead of the stdout log.",
+)
+@click.option(
+    "-f",
+    "--follow",
+    is_flag=True,
+    help="Keep printing new lines as they are written.",
+)
+@click.option(
+    "-n",
+    "--tail",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Print only the last N lines.",
+)
+@common_options_instance
+@common_options_dir
+def inspect_logs(
+    name: str, stderr: bool, follow: bool, tail: int | None, instance_num: int, work_dir: str
+) -> None:
+    from cardonnay import cli_inspect  # noqa: PLC0415
+
+    retval = cli_inspect.cmd_logs(
+        workdir=work_dir,
+        instance_num=instance_num,
+        name=name,
+        stderr=stderr,
+        follow=follow,
+        tail=tail,
+    )
+    exit_with(retval)
+
+
+@main.group(help="Search testnet logs.")
+def logs() -> None:
+    """Log search interface for Cardonnay instances."""
+
+
+@logs.command(
+    name="query",
+    help="Query node logs using an incremental index; lines of all nodes are merged by time.",
+)
+@click.option(
+    "--node",
+    "names",
+    multiple=True,
+    help="Name of the node or service whose stdout log is searched, all nodes by default.",
+)
+@click.option(
+    "--since",
+    type=click.DateTime(formats=DATETIME_FORMATS),
+    default=None,
+    help="Only lines at or after this time (UTC unless timezone is given).",
+)
+@click.option(
+    "--until",
+    type=click.DateTime(formats=DATETIME_FORMATS),
+    default=None,
+    help="Only lines before this time (UTC unless timezone is given).",
+)
+@click.option(
+    "--namespace",
+    "namespaces",
+    multiple=True,
+    help="Only traces in this namespace or its sub-namespaces, e.g. 'Forge.Loop'.",
+)
+@click.option(
+    "--severity",
+    type=click.Choice(consts.TRACE_SEVERITIES),
+    default=None,
+    help="Only traces with at least this severity.",
+)
+@click.option("-e", "--regex", default="", help="Only lines matching this regular expression.")
+@click.option(
+    "-n",
+    "--limit",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Print at most this many lines.",
+)
+@common_options_instance
+@common_options_dir
+def logs_query(
+    names: tuple[str, ...],
+    since: dt.datetime | None,
+    until: dt.datetime | None,
+    namespaces: tuple[str, ...],
+    severity: str | None,
+    regex: str,
+    limit: int | None,
+    instance_num: int,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_logs  # noqa: PLC0415
+
+    retval = cli_logs.cmd_query(
+        workdir=work_dir,
+        instance_num=instance_num,
+        names=names,
+        since=since,
+        until=until,
+        namespaces=namespaces,
+        min_severity=severity or "",
+        regex=regex,
+        limit=limit,
+    )
+    exit_with(retval)
+
+
+@main.group(help="Manage the shared Postgres server for db-sync databases of a work dir.")
+def postgres() -> None:
+    """Shared Postgres interface for Cardonnay work dirs."""
+
+
+@postgres.command(name="start", help="Start the shared Postgres server, initialize it if needed.")
+@click.option(
+    "-p",
+    "--port",
+    type=click.IntRange(1, 65535),
+    default=5432,
+    show_default=True,
+    help="Port number of the server; it listens only on a Unix socket in the work dir.",
+)
+@common_options_dir
+def postgres_start(port: int, work_dir: str) -> None:
+    from cardonnay import cli_postgres  # noqa: PLC0415
+
+    retval = cli_postgres.cmd_start(workdir=work_dir, port=port)
+    exit_with(retval)
+
+
+@postgres.command(name="stop", help="Stop the shared Postgres server.")
+@common_options_dir
+def postgres_stop(work_dir: str) -> None:
+    from cardonnay import cli_postgres  # noqa: PLC0415
+
+    retval = cli_postgres.cmd_stop(workdir=work_dir)
+    exit_with(retval)
+
+
+@postgres.command(name="status", help="Show status, templates and databases of the server.")
+@common_options_dir
+def postgres_status(work_dir: str) -> None:
+    from cardonnay import cli_postgres  # noqa: PLC0415
+
+    retval = cli_postgres.cmd_status(workdir=work_dir)
+    exit_with(retval)
+
+
+@main.group(help="Put transaction load on a testnet instance.")
+def load() -> None:
+    """Load interface for Cardonnay instances."""
+
+
+@load.command(
+    name="submit-api",
+    help="Post pre-built transactions to submit-api over keep-alive connections.",
+)
+@click.option(
+    "-n",
+    "--txs",
+    type=click.IntRange(min=1),
+    default=1000,
+    show_default=True,
+    help="Number of transactions to build and post.",
+)
+@click.option(
+    "--connections",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of concurrent HTTP connections.",
+)
+@click.option(
+    "--tps",
+    type=click.FloatRange(min=0),
+    default=0,
+    show_default=True,
+    help="Maximum rate of posted transactions (0 = as fast as possible).",
+)
+@click.option(
+    "--amount",
+    type=click.IntRange(min=1),
+    default=2_000_000,
+    show_default=True,
+    help="Lovelace in every UTxO split from the faucet, spent by one transaction.",
+)
+@click.option(
+    "--fee",
+    type=click.IntRange(min=0),
+    default=200_000,
+    show_default=True,
+    help="Fixed fee of every transaction, in lovelace.",
+)
+@click.option(
+    "--build-workers",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of parallel `cardano-cli` processes building the transactions.",
+)
+@common_options_instance
+@common_options_dir
+def load_submit_api(
+    txs: int,
+    connections: int,
+    tps: float,
+    amount: int,
+    fee: int,
+    build_workers: int,
+    instance_num: int,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_load  # noqa: PLC0415
+
+    retval = cli_load.cmd_submit_api(
+        workdir=work_dir,
+        instance_num=instance_num,
+        num_txs=txs,
+        connections=connections,
+        tps=tps,
+        amount=amount,
+        fee=fee,
+        build_workers=build_workers,
+    )
+    exit_with(retval)
+
+
+@load.command(name="replay", help="Submit a transaction corpus at a target rate.")
+@click.argument("corpus_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--target",
+    type=click.Choice(["node", "submit-api"]),
+    default="node",
+    show_default=True,
+    help="Submit to the node sockets or to submit-api.",
+)
+@click.option(
+    "--connections",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of concurrent connections, at most one per chain of the corpus.",
+)
+@click.option(
+    "--tps",
+    type=click.FloatRange(min=0),
+    default=0,
+    show_default=True,
+    help="Target rate of submitted transactions (0 = as fast as possible).",
+)
+@common_options_instance
+@common_options_dir
+def load_replay(
+    corpus_file: str,
+    target: str,
+    connections: int,
+    tps: float,
+    instance_num: int,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_load  # noqa: PLC0415
+
+    retval = cli_load.cmd_replay(
+        workdir=work_dir,
+        instance_num=instance_num,
+        corpus_file=corpus_file,
+        target=target,
+        connections=connections,
+        tps=tps,
+    )
+    exit_with(retval)
+
+
+@main.group(help="Generate transactions for replayable load.")
+def txgen() -> None:
+    """Transaction generator interface for Cardonnay instances."""
+
+
+@txgen.command(name="corpus", help="Pre-build a corpus of chained, signed transactions.")
+@click.option(
+    "-o",
+    "--out-file",
+    type=click.Path(dir_okay=False),
+    required=True,
+    help="Corpus file to create.",
+)
+@click.option(
+    "-n",
+    "--txs",
+    type=click.IntRange(min=1),
+    default=1000,
+    show_default=True,
+    help="Number of transactions.",
+)
+@click.option(
+    "--chains",
+    type=click.IntRange(min=1, max=1000),
+    default=4,
+    show_default=True,
+    help="Number of independent chains of transactions, built in parallel.",
+)
+@click.option(
+    "--inputs",
+    type=click.IntRange(min=1, max=100),
+    default=1,
+    show_default=True,
+    help="Number of inputs of every transaction.",
+)
+@click.option(
+    "--outputs",
+    type=click.IntRange(min=1, max=100),
+    default=1,
+    show_default=True,
+    help="Number of outputs of every transaction.",
+)
+@click.option(
+    "--metadata-bytes",
+    type=click.IntRange(min=0, max=16000),
+    default=0,
+    show_default=True,
+    help="Size of the metadata of every transaction.",
+)
+@click.option(
+    "--plutus",
+    is_flag=True,
+    help="Spend every input from an always succeeding Plutus script.",
+)
+@common_options_instance
+@common_options_dir
+def txgen_corpus(
+    out_file: str,
+    txs: int,
+    chains: int,
+    inputs: int,
+    outputs: int,
+    metadata_bytes: int,
+    plutus: bool,
+    instance_num: int,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_load  # noqa: PLC0415
+    from cardonnay import corpus  # noqa: PLC0415
+
+    retval = cli_load.cmd_corpus(
+        workdir=work_dir,
+        instance_num=instance_num,
+        corpus_file=out_file,
+        num_txs=txs,
+        chains=chains,
+        shape=corpus.TxShape(
+            inputs=inputs, outputs=outputs, metadata_bytes=metadata_bytes, plutus=plutus
+        ),
+    )
+    exit_with(retval)
+
+
+@main.group(help="Propose and vote on governance actions.")
+def gov() -> None:
+    """Governance interface for Cardonnay instances."""
+
+
+@gov.command(
+    name="enact",
+    help="Propose a governance action, vote on it with all the testnet keys and wait "
+    "for its enactment.",
+)
+@click.option(
+    "--pparam",
+    "pparams",
+    multiple=True,
+    metavar="NAME=VALUE",
+    help="Propose a protocol parameters update, e.g. 'maxTxSize=32768' (can be repeated).",
+)
+@click.option(
+    "--hardfork",
+    type=click.IntRange(min=1),
+    help="Propose a hard fork to the protocol major version.",
+)
+@click.option(
+    "--proposal-file",
+    type=click.Path(exists=True, dir_okay=False),
+    default="",
+    help="Submit the proposal created with `cardano-cli`.",
+)
+@click.option(
+    "--action-id",
+    type=str,
+    default="",
+    help="Vote on the already proposed action, 'TXID#INDEX'.",
+)
+@click.option(
+    "--wait/--no-wait",
+    default=True,
+    show_default=True,
+    help="Wait until the action is enacted.",
+)
+@click.option(
+    "--timeout",
+    type=click.IntRange(min=0),
+    default=3600,
+    show_default=True,
+    help="Maximum time to wait for the enactment, in seconds.",
+)
+@common_options_instance
+@common_options_dir
+def gov_enact(
+    pparams: tuple[str, ...],
+    hardfork: int | None,
+    proposal_file: str,
+    action_id: str,
+    wait: bool,
+    timeout: int,
+    instance_num: int,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_gov  # noqa: PLC0415
+
+    retval = cli_gov.cmd_enact(
+        workdir=work_dir,
+        instance_num=instance_num,
+        pparams=pparams,
+        hardfork=hardfork,
+        proposal_file=proposal_file,
+        action_id=action_id,
+        wait=wait,
+        timeout=timeout,
+    )
+    exit_with(retval)
+
+
+@main.command(help="Pause, kill and restart nodes by a schedule and report the impact.")
+@click.argument("schedule_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--seed",
+    type=int,
+    default=None,
+    help="Seed of the random events (default: the schedule seed, or a random one).",
+)
+@click.option(
+    "--load",
+    type=click.Choice(["firehose", "generator", "centrifuge"]),
+    multiple=True,
+    help="Tx load generator to run during the schedule, can be repeated.",
+)
+@common_options_instance
+@common_options_dir
+def chaos(
+    schedule_file: str, seed: int | None, load: tuple[str, ...], instance_num: int, work_dir: str
+) -> None:
+    from cardonnay import cli_chaos  # noqa: PLC0415
+
+    retval = cli_chaos.cmd_chaos(
+        workdir=work_dir,
+        instance_num=instance_num,
+        schedule_file=schedule_file,
+        seed=seed,
+        load=load,
+    )
+    exit_with(retval)
+
+
+@main.group(help="Benchmark testnets started with different settings.")
+def bench() -> None:
+    """Benchmark interface for Cardonnay testnets."""
+
+
+@bench.command(
+    name="backends",
+    help="Start the testnet once per UTxO backend under the same load and compare the nodes.",
+)
+@click.option("-t", "--testnet-variant", type=str, required=True, help="Testnet variant to use.")
+@click.option(
+    "--backend",
+    "backends",
+    type=click.Choice(consts.UTXO_BACKENDS),
+    multiple=True,
+    help="UTxO backend to compare, can be repeated (default: all backends).",
+)
+@click.option(
+    "--duration",
+    type=click.IntRange(min=0),
+    default=300,
+    show_default=True,
+    help="Time to run every testnet under load, in seconds.",
+)
+@click.option(
+    "--load",
+    type=click.Choice(consts.BENCH_LOADS),
+    default="firehose",
+    show_default=True,
+    help="Tx load generator to run.",
+)
+@click.option(
+    "--tx-tps",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="Transactions-per-second rate of the load generator.",
+)
+@click.option(
+    "--topology-seed",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Seed for the random part of the node topology, shared by all runs.",
+)
+@click.option(
+    "-s",
+    "--stake-pools-num",
+    type=click.IntRange(3, 10),
+    default=3,
+    show_default=True,
+    help="Number of stake pools to create.",
+)
+@click.option(
+    "-i",
+    "--instance-num",
+    default=-1,
+    type=click.IntRange(-1, ca_utils.MAX_INSTANCES - 1),
+    show_default=True,
+    help="Instance number, auto-selected by default.",
+)
+@click.option(
+    "--start-timeout",
+    type=click.IntRange(min=1),
+    default=600,
+    show_default=True,
+    help="Maximum time to wait for every testnet to start, in seconds.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["json", "markdown"]),
+    default="json",
+    show_default=True,
+    help="Format of the report.",
+)
+@common_options_dir
+def bench_backends(
+    testnet_variant: str,
+    backends: tuple[str, ...],
+    duration: int,
+    load: str,
+    tx_tps: int,
+    topology_seed: int,
+    stake_pools_num: int,
+    instance_num: int,
+    start_timeout: int,
+    output_format: str,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_bench  # noqa: PLC0415
+
+    retval = cli_bench.cmd_backends(
+        testnet_variant=testnet_variant,
+        workdir=work_dir,
+        instance_num=instance_num,
+        backends=backends,
+        stake_pools_num=stake_pools_num,
+        duration_sec=duration,
+        load=load,
+        tx_tps=tx_tps,
+        topology_seed=topology_seed,
+        start_timeout_sec=start_timeout,
+        output_format=output_format,
+    )
+    exit_with(retval)
+
+
+@bench.command(
+    name="restart",
+    help="Restart nodes and measure the time until socket up, ledger replay end and tip catch-up.",
+)
+@click.option(
+    "--node",
+    "nodes",
+    type=str,
+    multiple=True,
+    help="Node to restart, can be repeated (default: all nodes).",
+)
+@click.option(
+    "--one-at-a-time",
+    is_flag=True,
+    help="Restart the next node only after the previous one is usable again.",
+)
+@click.option(
+    "--timeout",
+    type=click.IntRange(min=1),
+    default=600,
+    show_default=True,
+    help="Maximum time to wait for the restarted nodes, in seconds.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["json", "markdown"]),
+    default="json",
+    show_default=True,
+    help="Format of the report.",
+)
+@common_options_instance
+@common_options_dir
+def bench_restart(
+    nodes: tuple[str, ...],
+    one_at_a_time: bool,
+    timeout: int,
+    output_format: str,
+    instance_num: int,
+    work_dir: str,
+) -> None:
+    from cardonnay import cli_bench  # noqa: PLC0415
+
+    retval = cli_bench.cmd_restart(
+        workdir=work_dir,
+        instance_num=instance_num,
+        nodes=nodes,
+        one_at_a_time=one_at_a_time,
+        timeout_sec=timeout,
+        output_format=output_format,
+    )
+    exit_with(retval)
+
+
+@main.group(help="Manage the optional daemon that serves commands for a work dir.")
+def daemon() -> None:
+    """Daemon interface for Cardonnay work dirs."""
+
+
+@daemon.command(name="start", help="Start the daemon in background.")
+@common_options_dir
+def daemon_start(work_dir: str) -> None:
+    from cardonnay import cli_daemon  # noqa: PLC0415
+
+    retval = cli_daemon.cmd_start(workdir=work_dir)
+    exit_with(retval)
+
+
+@daemon.command(name="stop", help="Stop the daemon.")
+@common_options_dir
+def daemon_stop(work_dir: str) -> None:
+    from cardonnay import cli_daemon  # noqa: PLC0415
+
+    retval = cli_daemon.cmd_stop(workdir=work_dir)
+    exit_with(retval)
+
+
+@daemon.command(name="status", help="Show status of the daemon.")
+@common_options_dir
+def daemon_status(work_dir: str) -> None:
+    from cardonnay import cli_daemon  # noqa: PLC0415
+
+    retval = cli_daemon.cmd_status(workdir=work_dir)
+    exit_with(retval)
+
+
+@daemon.command(name="run", help="Run the daemon in the foreground.")
+@common_options_dir
+def daemon_run(work_dir: str) -> None:
+    from cardonnay import cli_daemon  # noqa: PLC0415
+
+    color_logger.configure_logging(fmt="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    retval = cli_daemon.cmd_run(workdir=work_dir)
+    exit_with(retval)
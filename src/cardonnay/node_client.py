@@ -0,0 +1,402 @@
+"""Minimal node-to-client connections over the node socket.
+
+Only what is needed for submitting transactions and following the node tip is
+implemented: the multiplexer framing, the handshake, the LocalTxSubmission mini-protocol
+and the LocalChainSync mini-protocol. The CBOR messages sent are small and fixed, so they
+are encoded by hand; of the received blocks, only the header is decoded.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import pathlib as pl
+import struct
+import time
+
+# Transmission time, mini-protocol number with the mode bit, payload length
+MUX_HEADER = struct.Struct(">IHH")
+MAX_SDU = 12288
+RESPONDER_BIT = 0x8000
+PROTO_HANDSHAKE = 0
+PROTO_CHAIN_SYNC = 5
+PROTO_TX_SUBMISSION = 6
+# NodeToClientV_16 to NodeToClientV_20
+N2C_VERSIONS = range(32784, 32789)
+# Era indices of the hard fork combinator
+ERA_INDICES = {"Babbage": 5, "Conway": 6}
+
+MSG_ACCEPT_TX = b"\x81\x01"
+MSG_REJECT_TX_PREFIX = b"\x82\x02"
+MSG_DONE = b"\x81\x03"
+MSG_ACCEPT_VERSION_PREFIX = b"\x83\x01"
+
+# LocalChainSync messages
+MSG_REQUEST_NEXT = b"\x81\x00"
+MSG_CHAIN_SYNC_DONE = b"\x81\x07"
+CS_AWAIT_REPLY = 1
+CS_ROLL_FORWARD = 2
+CS_ROLL_BACKWARD = 3
+CS_INTERSECT_FOUND = 5
+CS_INTERSECT_NOT_FOUND = 6
+# CBOR tag of CBOR encoded data embedded in a byte string
+CBOR_IN_CBOR_TAG = 24
+
+
+class NodeClientError(Exception):
+    pass
+
+
+def _cbor_head(major: int, value: int) -> bytes:
+    if value < 24:  # noqa: PLR2004
+        return bytes([major << 5 | value])
+    for info, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+        if value < 1 << (8 * size):
+            return bytes([major << 5 | info]) + value.to_bytes(size, "big")
+    msg = f"Value {value} is too big for CBOR."
+    raise ValueError(msg)
+
+
+def _cbor_item_end(buf: bytes, pos: int) -> int:  # noqa: C901
+    """Return the position after the CBOR item that starts at `pos`.
+
+    Raises:
+        IndexError: The item is not complete in the buffer.
+        ValueError: The data is not valid CBOR.
+    """
+    initial = buf[pos]
+    major, info = initial >> 5, initial & 0x1F
+    pos += 1
+
+    if info == 31:  # noqa: PLR2004
+        if major not in (2, 3, 4, 5):
+            msg = f"Unexpected indefinite length CBOR item, major type {major}."
+            raise ValueError(msg)
+        while buf[pos] != 0xFF:  # noqa: PLR2004
+            pos = _cbor_item_end(buf, pos)
+            if major == 5:  # noqa: PLR2004
+                pos = _cbor_item_end(buf, pos)
+        return pos + 1
+
+    value = info
+    if 24 <= info <= 27:  # noqa: PLR2004
+        size = 1 << (info - 24)
+        if pos + size > len(buf):
+            raise IndexError(pos + size)
+        value = int.from_bytes(buf[pos : pos + size], "big")
+        pos += size
+    elif info > 27:  # noqa: PLR2004
+        msg = f"Invalid CBOR additional info {info}."
+        raise ValueError(msg)
+
+    if major in (2, 3):
+        if pos + value > len(buf):
+            raise IndexError(pos + value)
+        return pos + value
+    if major in (4, 5):
+        for __ in range(value * (major - 3)):
+            pos = _cbor_item_end(buf, pos)
+        return pos
+    if major == 6:  # noqa: PLR2004
+        return _cbor_item_end(buf, pos)
+    return pos
+
+
+def _cbor_head_decode(buf: bytes, pos: int) -> tuple[int, int, int]:
+    """Return the major type, the value and the position after the head of a CBOR item.
+
+    Raises:
+        IndexError: The head is not complete in the buffer.
+        ValueError: The head is not valid, or it starts an indefinite length item.
+    """
+    initial = buf[pos]
+    major, info = initial >> 5, initial & 0x1F
+    pos += 1
+    if info < 24:  # noqa: PLR2004
+        return major, info, pos
+    if info > 27:  # noqa: PLR2004
+        msg = f"Unsupported CBOR additional info {info}."
+        raise ValueError(msg)
+    size = 1 << (info - 24)
+    if pos + size > len(buf):
+        raise IndexError(pos + size)
+    return major, int.from_bytes(buf[pos : pos + size], "big"), pos + size
+
+
+def _cbor_decode(buf: bytes, pos: int) -> tuple[object, int]:
+    """Decode the definite length CBOR item that starts at `pos`, tags are dropped.
+
+    Return the decoded item and the position after it.
+    """
+    major, value, pos = _cbor_head_decode(buf, pos)
+    if major in (0, 1):
+        return (value if major == 0 else -1 - value), pos
+    if major in (2, 3):
+        data = buf[pos : pos + value]
+        return (data if major == 2 else data.decode("utf-8")), pos + value  # noqa: PLR2004
+    if major == 4:  # noqa: PLR2004
+        items = []
+        for __ in range(value):
+            item, pos = _cbor_decode(buf, pos)
+            items.append(item)
+        return items, pos
+    if major == 5:  # noqa: PLR2004
+        mapping = {}
+        for __ in range(value):
+            key, pos = _cbor_decode(buf, pos)
+            mapping[key], pos = _cbor_decode(buf, pos)
+        return mapping, pos
+    if major == 6:  # noqa: PLR2004
+        return _cbor_decode(buf, pos)
+    return {20: False, 21: True, 22: None}.get(value), pos
+
+
+class _NodeConnection:
+    """Connection to the node socket, opened by `connect` and kept open until closed."""
+
+    # Mini-protocol of the connection and its "done" message, sent when closing
+    PROTO = PROTO_TX_SUBMISSION
+    MSG_PROTO_DONE = MSG_DONE
+
+    def __init__(self, socket_path: pl.Path, network_magic: int) -> None:
+        self.socket_path = socket_path
+        self.network_magic = network_magic
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._buf = b""
+
+    async def _send(self, proto: int, payload: bytes) -> None:
+        assert self._writer is not None
+        for offset in range(0, len(payload), MAX_SDU):
+            chunk = payload[offset : offset + MAX_SDU]
+            timestamp = int(time.monotonic() * 1_000_000) & 0xFFFFFFFF
+            self._writer.write(MUX_HEADER.pack(timestamp, proto, len(chunk)) + chunk)
+        await self._writer.drain()
+
+    async def _recv(self, proto: int) -> bytes:
+        """Receive one complete message of the mini-protocol."""
+        assert self._reader is not None
+        while True:
+            with contextlib.suppress(IndexError):
+                end = _cbor_item_end(self._buf, 0)
+                reply, self._buf = self._buf[:end], self._buf[end:]
+                return reply
+            __, proto_id, length = MUX_HEADER.unpack(await self._reader.readexactly(8))
+            payload = await self._reader.readexactly(length)
+            if proto_id & ~RESPONDER_BIT != proto:
+                msg = f"Unexpected message of mini-protocol {proto_id & ~RESPONDER_BIT}."
+                raise NodeClientError(msg)
+            self._buf += payload
+
+    async def connect(self) -> None:
+        """Connect to the node socket and negotiate the protocol version.
+
+        Raises:
+            NodeClientError: The node refused all the proposed versions.
+        """
+        self._reader, self._writer = await asyncio.open_unix_connection(path=self.socket_path)
+        self._buf = b""
+        version_data = b"\x82" + _cbor_head(0, self.network_magic) + b"\xf4"
+        versions = b"".join(_cbor_head(0, v) + version_data for v in N2C_VERSIONS)
+        await self._send(
+            proto=PROTO_HANDSHAKE,
+            payload=b"\x82\x00" + _cbor_head(5, len(N2C_VERSIONS)) + versions,
+        )
+        reply = await self._recv(proto=PROTO_HANDSHAKE)
+        if not reply.startswith(MSG_ACCEPT_VERSION_PREFIX):
+            await self.close()
+            msg = f"Handshake with the node on '{self.socket_path}' failed: {reply.hex()}"
+            raise NodeClientError(msg)
+
+    async def close(self) -> None:
+        if self._writer is None:
+            return
+        with contextlib.suppress(OSError, AssertionError):
+            await self._send(proto=self.PROTO, payload=self.MSG_PROTO_DONE)
+        self._writer.close()
+        with contextlib.suppress(OSError):
+            await self._writer.wait_closed()
+        self._reader = self._writer = None
+
+
+class LocalTxSubmitter(_NodeConnection):
+    """Connection to the node socket that submits transactions one at a time.
+
+    The connection is opened on the first submission and kept open until closed.
+    """
+
+    def __init__(self, socket_path: pl.Path, network_magic: int, era: str) -> None:
+        if era not in ERA_INDICES:
+            msg = f"Unsupported era '{era}'."
+            raise NodeClientError(msg)
+        super().__init__(socket_path=socket_path, network_magic=network_magic)
+        self.era_index = ERA_INDICES[era]
+
+    async def submit(self, tx: bytes) -> str:
+        """Submit the transaction; return an empty string when accepted, error kind otherwise.
+
+        Raises:
+            NodeClientError: Unexpected reply of the node.
+        """
+        if self._writer is None:
+            await self.connect()
+
+        tx_arg = b"\x82" + _cbor_head(0, self.era_index) + b"\xd8\x18" + _cbor_head(2, len(tx))
+        await self._send(proto=PROTO_TX_SUBMISSION, payload=b"\x82\x00" + tx_arg + tx)
+        reply = await self._recv(proto=PROTO_TX_SUBMISSION)
+        if reply == MSG_ACCEPT_TX:
+            return ""
+        if reply.startswith(MSG_REJECT_TX_PREFIX):
+            return "MsgRejectTx"
+        msg = f"Unexpected reply of the node: {reply[:16].hex()}"
+        raise NodeClientError(msg)
+
+
+@dataclasses.dataclass(frozen=True)
+class ChainPoint:
+    slot: int
+    block_hash: str
+    # Block number, -1 when not known (rollback points)
+    block_no: int = -1
+
+
+@dataclasses.dataclass(frozen=True)
+class ChainEvent:
+    # True for a new block, False for a rollback to the point
+    forward: bool
+    point: ChainPoint
+    # Tip of the node at the time of the event
+    tip: ChainPoint
+
+
+def _decode_point(data: object) -> ChainPoint | None:
+    """Decode `[slot, hash]` point, None for the origin."""
+    if not (isinstance(data, list) and len(data) == 2):  # noqa: PLR2004
+        return None
+    slot, block_hash = data
+    if not (isinstance(slot, int) and isinstance(block_hash, bytes)):
+        msg = f"Invalid chain point {data!r}."
+        raise NodeClientError(msg)
+    return ChainPoint(slot=slot, block_hash=block_hash.hex())
+
+
+def _decode_tip(data: object) -> ChainPoint:
+    """Decode `[point, block_no]` tip."""
+    if not (isinstance(data, list) and len(data) == 2 and isinstance(data[1], int)):  # noqa: PLR2004
+        msg = f"Invalid chain tip {data!r}."
+        raise NodeClientError(msg)
+    point = _decode_point(data[0]) or ChainPoint(slot=0, block_hash="")
+    return ChainPoint(slot=point.slot, block_hash=point.block_hash, block_no=data[1])
+
+
+def _unwrap_cbor_in_cbor(buf: bytes, pos: int) -> tuple[bytes, int]:
+    """Return the CBOR data embedded at `pos` and its start, or the same buffer and `pos`."""
+    major, value, after = _cbor_head_decode(buf, pos)
+    if major != 6 or value != CBOR_IN_CBOR_TAG:  # noqa: PLR2004
+        return buf, pos
+    __, length, start = _cbor_head_decode(buf, after)
+    return buf[start : start + length], 0
+
+
+def decode_block_header(block: bytes) -> ChainPoint:
+    """Get slot, hash and number of the hard fork combinator block `[era, block]`.
+
+    The block hash is the Blake2b-256 hash of the block header.
+
+    Raises:
+        NodeClientError: The block is a Byron block, or the block is not valid.
+    """
+    try:
+        block, pos = _unwrap_cbor_in_cbor(block, 0)
+        __, __, pos = _cbor_head_decode(block, pos)
+        era, pos = _cbor_decode(block, pos)
+        if era == 0:
+            msg = "Following the chain in the Byron era is not supported."
+            raise NodeClientError(msg)
+        block, pos = _unwrap_cbor_in_cbor(block, pos)
+        # Block is `[header, ...]`, header is `[header_body, signature]`
+        __, __, header_start = _cbor_head_decode(block, pos)
+        header = block[header_start : _cbor_item_end(block, header_start)]
+        __, __, body_start = _cbor_head_decode(header, 0)
+        __, __, pos = _cbor_head_decode(header, body_start)
+        block_no, pos = _cbor_decode(header, pos)
+        slot, pos = _cbor_decode(header, pos)
+    except (IndexError, ValueError) as excp:
+        msg = f"Invalid block: {excp}"
+        raise NodeClientError(msg) from excp
+
+    if not (isinstance(block_no, int) and isinstance(slot, int)):
+        msg = "Invalid block header."
+        raise NodeClientError(msg)
+    return ChainPoint(
+        slot=slot, block_hash=hashlib.blake2b(header, digest_size=32).hexdigest(), block_no=block_no
+    )
+
+
+class LocalChainFollower(_NodeConnection):
+    """Connection to the node socket that follows the node chain from its current tip."""
+
+    PROTO = PROTO_CHAIN_SYNC
+    MSG_PROTO_DONE = MSG_CHAIN_SYNC_DONE
+
+    async def _find_intersect(self, points: list[ChainPoint]) -> tuple[bool, ChainPoint]:
+        payload = b"".join(
+            b"\x82" + _cbor_head(0, p.slot) + _cbor_head(2, 32) + bytes.fromhex(p.block_hash)
+            for p in points
+        )
+        await self._send(
+            proto=PROTO_CHAIN_SYNC,
+            payload=b"\x82\x04" + _cbor_head(4, len(points)) + payload,
+        )
+        reply, __ = _cbor_decode(await self._recv(proto=PROTO_CHAIN_SYNC), 0)
+        if not (isinstance(reply, list) and reply and reply[0] in (5, 6)):
+            msg = f"Unexpected reply to the intersection request: {reply!r}"
+            raise NodeClientError(msg)
+        return reply[0] == CS_INTERSECT_FOUND, _decode_tip(reply[-1])
+
+    async def follow_from_tip(self) -> ChainPoint:
+        """Connect and start following the chain from the current tip, return the tip.
+
+        Raises:
+            NodeClientError: Unexpected reply of the node.
+        """
+        await self.connect()
+        # Without points, the node replies with its tip, that is then used as the point
+        __, tip = await self._find_intersect(points=[])
+        while tip.block_hash:
+            found, new_tip = await self._find_intersect(points=[tip])
+            if found:
+                return tip
+            tip = new_tip
+        return tip
+
+    async def next_event(self) -> ChainEvent:
+        """Wait for the next block or rollback of the node chain.
+
+        Raises:
+            NodeClientError: Unexpected reply of the node.
+        """
+        await self._send(proto=PROTO_CHAIN_SYNC, payload=MSG_REQUEST_NEXT)
+        while True:
+            reply = await self._recv(proto=PROTO_CHAIN_SYNC)
+            try:
+                __, __, pos = _cbor_head_decode(reply, 0)
+                msg_id, pos = _cbor_decode(reply, pos)
+                # The reply to the request comes only when the node chain changes
+                if msg_id == CS_AWAIT_REPLY:
+                    continue
+                if msg_id == CS_ROLL_FORWARD:
+                    block_end = _cbor_item_end(reply, pos)
+                    point = decode_block_header(block=reply[pos:block_end])
+                    tip = _decode_tip(_cbor_decode(reply, block_end)[0])
+                    return ChainEvent(forward=True, point=point, tip=tip)
+                if msg_id == CS_ROLL_BACKWARD:
+                    point_data, pos = _cbor_decode(reply, pos)
+                    tip = _decode_tip(_cbor_decode(reply, pos)[0])
+                    point = _decode_point(point_data) or ChainPoint(slot=0, block_hash="")
+                    return ChainEvent(forward=False, point=point, tip=tip)
+            except (IndexError, ValueError) as excp:
+                msg = f"Invalid chain sync message: {excp}"
+                raise NodeClientError(msg) from excp
+            msg = f"Unexpected chain sync message: {reply[:16].hex()}"
+            raise NodeClientError(msg)
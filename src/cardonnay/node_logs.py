@@ -0,0 +1,311 @@
+"""Parsing of node and tx generator trace logs.
+
+Logs are rotated by supervisord to `<name>.stdout.1`, `<name>.stdout.2`, etc., and the
+rotated segments are then compressed by `run-log-compressor` to
+`<name>.stdout.<unix-ns>.gz`. The functions working with "log segments" read all of
+them in the order they were written, as if they were a single file.
+"""
+
+import collections
+import dataclasses
+import datetime as dt
+import functools
+import gzip
+import json
+import os
+import pathlib as pl
+import re
+import time
+import typing as tp
+
+NODE_NS_PREFIX = "cardano.node."
+
+# "[host:cardano.node.Forge.Loop:Info:37] [2025-01-01 10:00:00.12 UTC] ..."
+HUMAN_PREFIX_RE = re.compile(r"^\[([^:\]]*):([^:\]]+):([A-Za-z]+):\d+\]")
+TIMESTAMP_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?")
+TXID_RE = re.compile(r"\b[0-9a-f]{64}\b")
+# Rotation numbers assigned by supervisord are small, segments claimed by the log
+# compressor are suffixed with a nanosecond timestamp
+CLAIMED_STAMP_MIN_DIGITS = 19
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceLine:
+    timestamp: float | None
+    namespace: str
+    severity: str
+    text: str
+
+
+@functools.lru_cache(maxsize=1024)
+def _to_unix_time(
+    year: str, month: str, day: str, hour: str, minute: str, second: str
+) -> float | None:
+    # Consecutive log lines share the same second, so the conversion is cached
+    try:
+        return dt.datetime(
+            int(year),
+            int(month),
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            tzinfo=dt.timezone.utc,
+        ).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_timestamp(text: str) -> float | None:
+    """Return the first UTC timestamp found in the text as Unix time."""
+    ts_match = TIMESTAMP_RE.search(text)
+    if not ts_match:
+        return None
+
+    *date_time, fraction = ts_match.groups()
+    timestamp = _to_unix_time(*date_time)
+    if timestamp is None:
+        return None
+
+    if fraction:
+        timestamp += int(fraction) / 10 ** len(fraction)
+    return timestamp
+
+
+def _normalize_ns(namespace: str | list) -> str:
+    if isinstance(namespace, list):
+        namespace = ".".join(str(n) for n in namespace)
+    return namespace.removeprefix(NODE_NS_PREFIX)
+
+
+def parse_trace_line(line: str) -> TraceLine:
+    """Parse a trace line in node human format, machine (JSON) format or free text.
+
+    Fields that cannot be determined are returned empty (or `None` for the timestamp).
+    """
+    text = line.rstrip("\r\n")
+
+    if text.startswith("{"):
+        try:
+            record = json.loads(text)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            return TraceLine(
+                timestamp=parse_timestamp(str(record.get("at") or "")),
+                namespace=_normalize_ns(record.get("ns") or ""),
+                severity=str(record.get("sev") or ""),
+                text=text,
+            )
+
+    if prefix_match := HUMAN_PREFIX_RE.match(text):
+        return TraceLine(
+            timestamp=parse_timestamp(text[prefix_match.end() :]),
+            namespace=_normalize_ns(prefix_match.group(2)),
+            severity=prefix_match.group(3),
+            text=text,
+        )
+
+    return TraceLine(timestamp=parse_timestamp(text), namespace="", severity="", text=text)
+
+
+def find_txids(text: str) -> list[str]:
+    """Find all hex-encoded 32-byte hashes (tx IDs, block hashes) in the text."""
+    return TXID_RE.findall(text)
+
+
+def get_node_names(statedir: pl.Path) -> list[str]:
+    """Return names of the nodes that have a log file in the state dir."""
+    names = [
+        f.name.removesuffix(".stdout")
+        for pattern in ("bft*.stdout", "pool*.stdout")
+        for f in statedir.glob(pattern)
+    ]
+    return sorted(names, key=lambda n: (not n.startswith("bft"), len(n), n))
+
+
+def _open_segment(segment: pl.Path) -> tp.TextIO:
+    if segment.suffix == ".gz":
+        return gzip.open(segment, "rt", encoding="utf-8", errors="replace")
+    return open(segment, encoding="utf-8", errors="replace")
+
+
+def _iter_segment(segment: pl.Path) -> tp.Iterator[str]:
+    try:
+        with _open_segment(segment) as fp_in:
+            yield from fp_in
+    except FileNotFoundError:
+        return
+
+
+def get_log_segments(logfile: pl.Path) -> list[pl.Path]:
+    """Return all segments of a rotated log, from the oldest to the current log file.
+
+    The current log file is always the last item, even when it doesn't exist (yet).
+    """
+    archived: dict[int, pl.Path] = {}
+    rotated: list[tuple[int, pl.Path]] = []
+    for segment in logfile.parent.glob(f"{logfile.name}.*"):
+        suffix = segment.name[len(logfile.name) + 1 :].removesuffix(".gz")
+        if not suffix.isdigit():
+            continue
+        if len(suffix) >= CLAIMED_STAMP_MIN_DIGITS:
+            # While gzip is running, both the claimed segment and the incomplete archive
+            # exist; use the claimed segment
+            if segment.suffix != ".gz" or int(suffix) not in archived:
+                archived[int(suffix)] = segment
+        elif segment.suffix != ".gz":
+            rotated.append((int(suffix), segment))
+
+    # Archives are named by the time they were claimed, higher rotation number is older
+    rotated.sort(reverse=True)
+    return [archived[k] for k in sorted(archived)] + [s for __, s in rotated] + [logfile]
+
+
+def iter_log_lines(logfile: pl.Path, include_current: bool = True) -> tp.Iterator[str]:
+    """Iterate over lines of all segments of a rotated log, the oldest lines first.
+
+    A segment that is renamed by the log compressor before it is opened is skipped.
+    """
+    segments = get_log_segments(logfile=logfile)
+    if not include_current:
+        segments = segments[:-1]
+    for segment in segments:
+        yield from _iter_segment(segment)
+
+
+def tail_log_lines(logfile: pl.Path, num_lines: int, include_current: bool = True) -> list[str]:
+    """Return the last lines of a rotated log.
+
+    Segments are read from the newest, so old archives are decompressed only when needed.
+    """
+    lines: collections.deque[str] = collections.deque()
+    if num_lines <= 0:
+        return []
+
+    segments = get_log_segments(logfile=logfile)
+    if not include_current:
+        segments = [s for s in segments if s != logfile]
+    for segment in reversed(segments):
+        try:
+            with _open_segment(segment) as fp_in:
+                segment_tail = collections.deque(fp_in, maxlen=num_lines - len(lines))
+        except FileNotFoundError:
+            continue
+        lines.extendleft(reversed(segment_tail))
+        if len(lines) >= num_lines:
+            break
+
+    return list(lines)
+
+
+def _is_rotated(logfile: pl.Path, inode: int, pos: int) -> bool:
+    try:
+        stat = logfile.stat()
+    except FileNotFoundError:
+        return True
+    return stat.st_ino != inode or stat.st_size < pos
+
+
+def _open_log(logfile: pl.Path) -> tp.TextIO | None:
+    try:
+        return open(logfile, encoding="utf-8", errors="replace")
+    except FileNotFoundError:
+        return None
+
+
+def _open_followed(logfile: pl.Path, from_end: bool) -> tuple[tp.TextIO | None, int]:
+    fp_in = _open_log(logfile=logfile)
+    if fp_in is None:
+        return None, -1
+    if from_end:
+        fp_in.seek(0, os.SEEK_END)
+    return fp_in, os.fstat(fp_in.fileno()).st_ino
+
+
+def _read_tail(fp_in: tp.TextIO, num_lines: int) -> tuple[list[str], str]:
+    """Read the file to the end; return its last complete lines and the incomplete line."""
+    # One more line, the last one can be incomplete
+    lines = collections.deque(fp_in, maxlen=num_lines + 1)
+    if lines and not lines[-1].endswith("\n"):
+        return list(lines)[:-1], lines[-1]
+    return list(lines)[-num_lines:] if num_lines else [], ""
+
+
+def _tail_and_open(
+    logfile: pl.Path, num_lines: int
+) -> tp.Generator[str, None, tuple[tp.TextIO | None, int, str]]:
+    """Yield the last lines of the rotated log.
+
+    Returns:
+        The open current log file, read to the end, its inode and its incomplete last line.
+    """
+    fp_in = _open_log(logfile=logfile)
+    try:
+        current, pending = _read_tail(fp_in=fp_in, num_lines=num_lines) if fp_in else ([], "")
+        yield from tail_log_lines(
+            logfile=logfile, num_lines=num_lines - len(current), include_current=False
+        )
+        yield from current
+    except BaseException:
+        if fp_in is not None:
+            fp_in.close()
+        raise
+    inode = os.fstat(fp_in.fileno()).st_ino if fp_in else -1
+    return fp_in, inode, pending
+
+
+def follow_log_lines(
+    logfile: pl.Path,
+    from_end: bool = True,
+    poll_interval: float = 0.5,
+    tail: int | None = None,
+) -> tp.Iterator[str]:
+    """Follow the log file like `tail -F`, reopening it when it is rotated or truncated.
+
+    With `tail`, the last `tail` lines of the rotated log are yielded first. The lines of
+    the current log file are read from the same open file that is then followed, so no
+    line written in between is lost.
+
+    Only complete lines are yielded. The generator never ends on its own.
+    """
+    fp_in: tp.TextIO | None = None
+    inode = -1
+    pending = ""
+
+    try:
+        if tail is not None:
+            fp_in, inode, pending = yield from _tail_and_open(logfile=logfile, num_lines=tail)
+            # A file opened later is a new one, read from the beginning
+            from_end = False
+
+        while True:
+            if fp_in is None:
+                fp_in, inode = _open_followed(logfile=logfile, from_end=from_end)
+                if fp_in is None:
+                    time.sleep(poll_interval)
+                    continue
+                # Files opened after a rotation are always read from the beginning
+                from_end = False
+
+            chunk = fp_in.read()
+            if chunk:
+                pending += chunk
+                *lines, pending = pending.split("\n")
+                for line in lines:
+                    yield f"{line}\n"
+                continue
+
+            if _is_rotated(logfile=logfile, inode=inode, pos=fp_in.tell()):
+                # Flush whatever was written to the old file before the rotation
+                for line in (pending + fp_in.read()).splitlines():
+                    yield f"{line}\n"
+                pending = ""
+                fp_in.close()
+                fp_in = None
+                continue
+
+            time.sleep(poll_interval)
+    finally:
+        if fp_in is not None:
+            fp_in.close()
@@ -0,0 +1,326 @@
+"""Shared local Postgres server for the db-sync databases of all instances in a work dir.
+
+The server runs from the `postgres` dir of the work dir and listens only on a Unix socket
+in that dir. It holds throwaway test data, so it is tuned for speed instead of
+durability: no fsync, no synchronous commit, no full page writes and minimal WAL.
+
+For every db-sync schema, a template database with all the schema migrations applied is
+built once, named by the hash of the migration files. The database of an instance is
+then created by `postgres-setup.sh` with `CREATE DATABASE ... TEMPLATE`, and db-sync finds
+the schema already migrated on start.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib as pl
+import shlex
+import shutil
+import subprocess
+
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+PG_DIR = "postgres"
+DATA_DIR = "data"
+LOGFILE = "postgres.log"
+TEMPLATE_LOCK = "template.lock"
+PG_USER = "postgres"
+DEFAULT_PORT = 5432
+TEMPLATE_PREFIX = "dbsync_tmpl_"
+# Env var with the name of the template database, read by `postgres-setup.sh`
+TEMPLATE_ENV = "DBSYNC_PG_TEMPLATE"
+TEMPLATE_BUILD_TIMEOUT_SEC = 600
+PG_BINS = ("initdb", "pg_ctl", "psql", "createdb", "dropdb")
+
+# Durability is not needed for test data that is thrown away with the testnet
+SERVER_SETTINGS = {
+    "listen_addresses": "''",
+    "max_connections": "300",
+    "fsync": "off",
+    "synchronous_commit": "off",
+    "full_page_writes": "off",
+    "wal_level": "minimal",
+    "max_wal_senders": "0",
+    "max_wal_size": "'4GB'",
+    "checkpoint_timeout": "'30min'",
+}
+
+# Tables without data and foreign keys don't need WAL; tables with data (e.g.
+# `schema_version`) are kept logged, so their content is copied reliably with the template
+SET_UNLOGGED_SQL = """
+DO $$
+DECLARE
+  tbl regclass;
+  has_rows boolean;
+BEGIN
+  FOR tbl IN
+    SELECT c.oid::regclass FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind = 'r' AND c.relpersistence = 'p' AND n.nspname = 'public'
+      AND NOT EXISTS (
+        SELECT 1 FROM pg_constraint f
+        WHERE f.contype = 'f' AND (f.conrelid = c.oid OR f.confrelid = c.oid)
+      )
+  LOOP
+    EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s)', tbl) INTO has_rows;
+    IF NOT has_rows THEN
+      EXECUTE format('ALTER TABLE %s SET UNLOGGED', tbl);
+    END IF;
+  END LOOP;
+END $$;
+"""
+
+
+def get_pg_dir(workdir: pl.Path) -> pl.Path:
+    return workdir / PG_DIR
+
+
+def has_pg_bins() -> bool:
+    return all(shutil.which(b) for b in PG_BINS)
+
+
+def _run(cmd: list[str], env: dict[str, str] | None = None, timeout: float = 120) -> str:
+    """Run the Postgres command and return its output.
+
+    Raises:
+        RuntimeError: The command failed.
+    """
+    LOGGER.debug(f"Running `{shlex.join(cmd)}`")
+    try:
+        proc = subprocess.run(
+            cmd,
+            env={**os.environ, **(env or {})},
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=timeout,
+        )
+    except (OSError, subprocess.TimeoutExpired) as excp:
+        msg = f"Failed to run `{shlex.join(cmd)}`: {excp}"
+        raise RuntimeError(msg) from excp
+    if proc.returncode != 0:
+        msg = f"`{shlex.join(cmd)}` failed:\n{(proc.stderr or proc.stdout).strip()}"
+        raise RuntimeError(msg)
+    return proc.stdout
+
+
+def get_server_port(workdir: pl.Path) -> int | None:
+    """Get port of the running server, None when it is not running."""
+    pidfile = get_pg_dir(workdir=workdir) / DATA_DIR / "postmaster.pid"
+    try:
+        # PID is on the 1st line of the pid file, port on the 4th
+        lines = pidfile.read_text().splitlines()
+        pid, port = int(lines[0]), int(lines[3])
+        os.kill(pid, 0)
+    except (OSError, ValueError, IndexError):
+        return None
+    return port
+
+
+def get_server_env(workdir: pl.Path) -> dict[str, str]:
+    """Get libpq env vars for connecting to the running server.
+
+    Raises:
+        RuntimeError: The server is not running.
+    """
+    if (port := get_server_port(workdir=workdir)) is None:
+        msg = f"The shared Postgres server is not running in '{get_pg_dir(workdir=workdir)}'."
+        raise RuntimeError(msg)
+    return {
+        "PGHOST": str(get_pg_dir(workdir=workdir)),
+        "PGPORT": str(port),
+        "PGUSER": PG_USER,
+    }
+
+
+def init_server(workdir: pl.Path) -> None:
+    """Initialize the Postgres data dir and configure the server, if not done yet."""
+    pg_dir = get_pg_dir(workdir=workdir)
+    data_dir = pg_dir / DATA_DIR
+    if (data_dir / "PG_VERSION").exists():
+        return
+
+    pg_dir.mkdir(mode=0o700, exist_ok=True)
+    shutil.rmtree(data_dir, ignore_errors=True)
+    _run(
+        [
+            "initdb",
+            "-D",
+            str(data_dir),
+            "-U",
+            PG_USER,
+            "--auth=trust",
+            "--encoding=UTF8",
+            "--no-sync",
+        ]
+    )
+
+    settings = {**SERVER_SETTINGS, "unix_socket_directories": f"'{pg_dir}'"}
+    with open(data_dir / "postgresql.conf", "a", encoding="utf-8") as fp_out:
+        fp_out.write("\n# Settings for throwaway test data, added by cardonnay\n")
+        fp_out.writelines(f"{k} = {v}\n" for k, v in settings.items())
+
+
+def start_server(workdir: pl.Path, port: int = DEFAULT_PORT) -> None:
+    """Start the shared server, initializing it first when needed.
+
+    Raises:
+        RuntimeError: The server failed to start.
+    """
+    if get_server_port(workdir=workdir) is not None:
+        return
+
+    init_server(workdir=workdir)
+    pg_dir = get_pg_dir(workdir=workdir)
+    _run(
+        [
+            "pg_ctl",
+            "-D",
+            str(pg_dir / DATA_DIR),
+            "-l",
+            str(pg_dir / LOGFILE),
+            "-o",
+            f"-p {port}",
+            "-w",
+            "start",
+        ]
+    )
+
+
+def stop_server(workdir: pl.Path) -> None:
+    """Stop the shared server.
+
+    Raises:
+        RuntimeError: The server failed to stop.
+    """
+    if get_server_port(workdir=workdir) is None:
+        return
+    _run(["pg_ctl", "-D", str(get_pg_dir(workdir=workdir) / DATA_DIR), "-m", "fast", "-w", "stop"])
+
+
+def get_migration_files(schema_dir: pl.Path) -> list[pl.Path]:
+    """Get the db-sync migrations that are applied before db-sync starts syncing.
+
+    Stage 4 migrations (indexes) are applied by db-sync itself during the sync.
+    """
+    return sorted(f for stage in (1, 2, 3) for f in schema_dir.glob(f"migration-{stage}-*.sql"))
+
+
+def get_template_name(schema_dir: pl.Path) -> str:
+    """Get name of the template database for the db-sync schema."""
+    digest = hashlib.sha256()
+    for migration in get_migration_files(schema_dir=schema_dir):
+        digest.update(migration.name.encode())
+        digest.update(migration.read_bytes())
+    return f"{TEMPLATE_PREFIX}{digest.hexdigest()[:12]}"
+
+
+def list_databases(env: dict[str, str]) -> dict[str, bool]:
+    """Get names of the databases on the server, mapped to whether they are templates."""
+    output = _run(
+        [
+            "psql",
+            "-X",
+            "-A",
+            "-t",
+            "-d",
+            "postgres",
+            "-c",
+            "SELECT datname, datistemplate FROM pg_database",
+        ],
+        env=env,
+    )
+    databases = {}
+    for line in output.splitlines():
+        name, __, is_template = line.partition("|")
+        if name:
+            databases[name] = is_template == "t"
+    return databases
+
+
+def _build_template(env: dict[str, str], schema_dir: pl.Path, name: str) -> None:
+    # Build under a temporary name, so an interrupted build is never used as a template
+    build_name = f"{name}_build"
+    _run(["dropdb", "--if-exists", build_name], env=env)
+    _run(["createdb", "-T", "template0", "--encoding=UTF8", build_name], env=env)
+
+    migrations = get_migration_files(schema_dir=schema_dir)
+    LOGGER.info(f"Applying {len(migrations)} db-sync migrations to template '{name}'.")
+    psql_args = ["psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", "-d", build_name]
+    for migration in migrations:
+        _run([*psql_args, "-f", str(migration)], env=env, timeout=TEMPLATE_BUILD_TIMEOUT_SEC)
+    _run([*psql_args, "-c", SET_UNLOGGED_SQL], env=env)
+
+    admin_args = ["psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", "-d", "postgres"]
+    _run([*admin_args, "-c", f'ALTER DATABASE "{build_name}" RENAME TO "{name}"'], env=env)
+    # A template with open connections cannot be cloned, don't allow any
+    _run(
+        [
+            *admin_args,
+            "-c",
+            f'ALTER DATABASE "{name}" WITH IS_TEMPLATE true ALLOW_CONNECTIONS false',
+        ],
+        env=env,
+    )
+
+
+def ensure_template(workdir: pl.Path, schema_dir: pl.Path) -> str:
+    """Build the template database for the db-sync schema if it doesn't exist yet.
+
+    Returns name of the template database.
+
+    Raises:
+        RuntimeError: The server is not running or the template failed to build.
+    """
+    import filelock  # noqa: PLC0415
+
+    env = get_server_env(workdir=workdir)
+    if not get_migration_files(schema_dir=schema_dir):
+        msg = f"No db-sync migrations found in '{schema_dir}'."
+        raise RuntimeError(msg)
+    name = get_template_name(schema_dir=schema_dir)
+
+    lockfile = str(get_pg_dir(workdir=workdir) / TEMPLATE_LOCK)
+    try:
+        with filelock.FileLock(lock_file=lockfile, timeout=TEMPLATE_BUILD_TIMEOUT_SEC):
+            if name not in list_databases(env=env):
+                _build_template(env=env, schema_dir=schema_dir, name=name)
+    except filelock.Timeout as excp:
+        msg = f"Timed out waiting for the template database '{name}' to be built."
+        raise RuntimeError(msg) from excp
+
+    return name
+
+
+def get_instance_env(workdir: pl.Path, schema_dir: pl.Path) -> dict[str, str]:
+    """Get env vars for the start script to create the db-sync database from the template.
+
+    Raises:
+        RuntimeError: The server is not running or the template failed to build.
+    """
+    template = ensure_template(workdir=workdir, schema_dir=schema_dir)
+    return {**get_server_env(workdir=workdir), TEMPLATE_ENV: template}
+
+
+def get_status(workdir: pl.Path) -> structs.PostgresStatus:
+    pg_dir = get_pg_dir(workdir=workdir)
+    port = get_server_port(workdir=workdir)
+    databases: dict[str, bool] = {}
+    if port is not None:
+        with contextlib.suppress(RuntimeError):
+            databases = list_databases(env=get_server_env(workdir=workdir))
+
+    return structs.PostgresStatus(
+        running=port is not None,
+        socket_dir=pg_dir,
+        port=port,
+        templates=sorted(n for n in databases if n.startswith(TEMPLATE_PREFIX)),
+        databases=sorted(
+            n
+            for n, is_template in databases.items()
+            if not is_template and n != "postgres" and not n.startswith(TEMPLATE_PREFIX)
+        ),
+    )
@@ -0,0 +1,91 @@
+"""CPU and memory usage of the node processes, read from `/proc`."""
+
+import contextlib
+import itertools
+import logging
+import os
+import pathlib as pl
+import re
+
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+PROC_DIR = pl.Path("/proc")
+# Node name from the `--config ../config-<node>.json` argument of `cardano-node run`
+NODE_CONFIG_RE = re.compile(r"config-(\w+)\.json$")
+
+
+def _clock_ticks() -> int:
+    with contextlib.suppress(ValueError, OSError, AttributeError):
+        return os.sysconf("SC_CLK_TCK")
+    return 100
+
+
+def _read_stat_fields(pid: int) -> list[str]:
+    """Read fields of `/proc/<pid>/stat` that follow the process name."""
+    content = (PROC_DIR / str(pid) / "stat").read_text()
+    # The process name is in parentheses and can contain spaces and parentheses
+    return content[content.rindex(")") + 2 :].split()
+
+
+def get_child_pids(ppid: int) -> list[int]:
+    """Get PIDs of the direct children of the process."""
+    children = []
+    for proc in PROC_DIR.iterdir():
+        if not proc.name.isdigit():
+            continue
+        with contextlib.suppress(OSError, ValueError, IndexError):
+            # The parent PID is the 2nd field after the process name
+            if int(_read_stat_fields(int(proc.name))[1]) == ppid:
+                children.append(int(proc.name))
+    return sorted(children)
+
+
+def get_process_stats(pid: int) -> structs.ProcessStats | None:
+    """Get CPU and memory usage of the process, or None when it doesn't exist."""
+    clock_ticks = _clock_ticks()
+    try:
+        stat_fields = _read_stat_fields(pid)
+        status = (PROC_DIR / str(pid) / "status").read_text()
+        uptime_sec = float((PROC_DIR / "uptime").read_text().split()[0])
+
+        status_fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+        # `utime`, `stime` and `starttime` are fields 14, 15 and 22 of `/proc/<pid>/stat`
+        cpu_time_sec = (int(stat_fields[11]) + int(stat_fields[12])) / clock_ticks
+        running_sec = uptime_sec - int(stat_fields[19]) / clock_ticks
+        rss_kib = int(status_fields.get("VmRSS", "0 kB").split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return structs.ProcessStats(
+        pid=pid,
+        cpu_time_sec=round(cpu_time_sec, 2),
+        cpu_percent=round(100 * cpu_time_sec / running_sec, 1) if running_sec > 0 else 0.0,
+        rss_mib=round(rss_kib / 1024, 1),
+        cpus_allowed=status_fields.get("Cpus_allowed_list", "").strip(),
+    )
+
+
+def get_node_name(pid: int) -> str:
+    """Get the name of the node run by the process, or empty string if it is not a node."""
+    try:
+        args = (PROC_DIR / str(pid) / "cmdline").read_bytes().split(b"\0")
+    except OSError:
+        return ""
+
+    for arg, value in itertools.pairwise(args):
+        if arg == b"--config" and (match := NODE_CONFIG_RE.search(os.fsdecode(value))):
+            return match.group(1)
+    return ""
+
+
+def get_node_stats(supervisord_pid: int) -> dict[str, structs.ProcessStats]:
+    """Get CPU and memory usage of the nodes started by the supervisord."""
+    node_stats = {}
+    for pid in get_child_pids(ppid=supervisord_pid):
+        if not (node_name := get_node_name(pid=pid)):
+            continue
+        if stats := get_process_stats(pid=pid):
+            node_stats[node_name] = stats
+    return dict(sorted(node_stats.items()))
@@ -0,0 +1,97 @@
+"""Reading metrics of the nodes from their Prometheus endpoints."""
+
+import contextlib
+import json
+import logging
+import math
+import pathlib as pl
+import re
+import urllib.request
+
+LOGGER = logging.getLogger(__name__)
+
+PROMETHEUS_BACKEND_PREFIX = "PrometheusSimple"
+METRICS_PATH = "/metrics"
+# Suffixes of the names of the metrics with the block and slot number of the node tip
+BLOCK_NUM_METRIC = "blockNum_int"
+SLOT_NUM_METRIC = "slotNum_int"
+
+# `<name>{<labels>} <value> [<timestamp>]`
+_SAMPLE_RE = re.compile(r"^(?P<name>[^\s{]+(?:\{[^}]*\})?)\s+(?P<value>\S+)(?:\s+\S+)?$")
+
+
+def get_prometheus_address(statedir: pl.Path, node: str) -> tuple[str, int] | None:
+    """Get host and port of the Prometheus endpoint of the node, from the node config.
+
+    Returns None when the node doesn't expose Prometheus metrics.
+    """
+    try:
+        with open(statedir / f"config-{node}.json", encoding="utf-8") as fp_in:
+            config = json.load(fp_in) or {}
+    except (OSError, ValueError) as excp:
+        LOGGER.debug(f"Cannot read config of node '{node}': {excp}")
+        return None
+
+    trace_options = config.get("TraceOptions") or {}
+    backends = (trace_options.get("") or {}).get("backends") or []
+    for backend in backends:
+        parts = str(backend).split()
+        if parts and parts[0] == PROMETHEUS_BACKEND_PREFIX and len(parts) >= 2:  # noqa: PLR2004
+            # `PrometheusSimple [suffix] [host] <port>`, the port is always the last part
+            with contextlib.suppress(ValueError):
+                host = parts[-2] if len(parts) >= 3 else "127.0.0.1"  # noqa: PLR2004
+                return host, int(parts[-1])
+
+    return None
+
+
+def parse_metrics(text: str) -> dict[str, float]:
+    """Parse metrics in the Prometheus text exposition format.
+
+    Samples are keyed by the metric name including labels, e.g. `name{label="x"}`.
+    """
+    metrics: dict[str, float] = {}
+    for line in text.splitlines():
+        line_s = line.strip()
+        if not line_s or line_s.startswith("#"):
+            continue
+        if not (match := _SAMPLE_RE.match(line_s)):
+            continue
+        try:
+            value = float(match.group("value"))
+        except ValueError:
+            continue
+        if not math.isnan(value):
+            metrics[match.group("name")] = value
+    return metrics
+
+
+def fetch_metrics(host: str, port: int, timeout: float = 5.0) -> dict[str, float]:
+    """Read and parse metrics from the Prometheus endpoint.
+
+    Raises:
+        OSError: The endpoint is not reachable or returned an error.
+    """
+    url = f"http://{host}:{port}{METRICS_PATH}"
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return parse_metrics(response.read().decode("utf-8", errors="replace"))
+
+
+def find_metric(metrics: dict[str, float], suffix: str) -> float | None:
+    """Get value of the first metric whose name (without labels) ends with the suffix."""
+    for name, value in metrics.items():
+        if name.split("{", 1)[0].endswith(suffix):
+            return value
+    return None
+
+
+def get_block_num(metrics: dict[str, float]) -> int | None:
+    """Get block number of the node tip from the parsed metrics, None when not reported."""
+    value = find_metric(metrics=metrics, suffix=BLOCK_NUM_METRIC)
+    return None if value is None else int(value)
+
+
+def get_slot_num(metrics: dict[str, float]) -> int | None:
+    """Get slot number of the node tip from the parsed metrics, None when not reported."""
+    value = find_metric(metrics=metrics, suffix=SLOT_NUM_METRIC)
+    return None if value is None else int(value)
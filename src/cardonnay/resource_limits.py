@@ -0,0 +1,133 @@
+"""CPU affinity and memory limits for the node processes of a testnet instance.
+
+The limits are applied through a cgroup v2 created for the instance, when a delegated
+cgroup is named by the `CARDONNAY_CGROUP` env var. The cgroup must be writable by the
+user and must not contain any processes, so the `cpuset` and `memory` controllers can be
+enabled for its children (e.g. a cgroup of a systemd unit with `Delegate=yes`).
+
+Without a delegated cgroup, the start scripts fall back to `taskset` for the CPU affinity
+and `prlimit` for the memory limit. `prlimit` can limit only the address space of every
+node process, so the memory limit of the instance is split evenly between its nodes.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib as pl
+import typing as tp
+
+LOGGER = logging.getLogger(__name__)
+
+CGROUP_ENV = "CARDONNAY_CGROUP"
+CGROUP_ROOT = pl.Path("/sys/fs/cgroup")
+REQUIRED_CONTROLLERS = frozenset(("cpuset", "memory"))
+
+
+def format_cpu_list(cpus: tp.Iterable[int]) -> str:
+    """Format CPUs in the `taskset` / `cpuset.cpus` format, e.g. "0-3,8"."""
+    ranges: list[list[int]] = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(s) if s == e else f"{s}-{e}" for s, e in ranges)
+
+
+def parse_cpu_list(cpus: str) -> list[int]:
+    """Parse CPU list in the `taskset` / `cpuset.cpus` format, e.g. "0-3,8".
+
+    Raises:
+        ValueError: The CPU list is not valid or contains CPUs that are not available.
+    """
+    parsed: set[int] = set()
+    for item in cpus.split(","):
+        first, __, last = item.strip().partition("-")
+        try:
+            start = int(first)
+            end = int(last) if last else start
+        except ValueError:
+            start = end = -1
+        if start < 0 or end < start:
+            msg = f"Invalid CPU range '{item}'."
+            raise ValueError(msg)
+        parsed.update(range(start, end + 1))
+
+    if hasattr(os, "sched_getaffinity") and (parsed - (available := os.sched_getaffinity(0))):
+        msg = f"Some of the CPUs are not available, available CPUs: {format_cpu_list(available)}."
+        raise ValueError(msg)
+
+    return sorted(parsed)
+
+
+def get_delegated_cgroup() -> pl.Path | None:
+    """Get the delegated cgroup for instance cgroups, or None when not available."""
+    cgroup_env = os.environ.get(CGROUP_ENV)
+    if not cgroup_env:
+        return None
+
+    cgroup = pl.Path(cgroup_env)
+    if not cgroup.is_absolute():
+        cgroup = CGROUP_ROOT / cgroup
+    try:
+        controllers = set((cgroup / "cgroup.controllers").read_text().split())
+        enabled = set((cgroup / "cgroup.subtree_control").read_text().split())
+        missing = REQUIRED_CONTROLLERS - enabled
+        if missing - controllers:
+            LOGGER.warning(
+                f"Controllers {', '.join(sorted(missing - controllers))} are not delegated "
+                f"to cgroup '{cgroup}', falling back to `taskset` and `prlimit`."
+            )
+            return None
+        if missing:
+            (cgroup / "cgroup.subtree_control").write_text(
+                " ".join(f"+{c}" for c in sorted(missing))
+            )
+    except OSError as excp:
+        LOGGER.warning(
+            f"Cannot use cgroup '{cgroup}', falling back to `taskset` and `prlimit`: {excp}"
+        )
+        return None
+
+    return cgroup
+
+
+def get_instance_cgroup_name(workdir: pl.Path, instance_num: int) -> str:
+    # Instances with the same number can run in different workdirs
+    workdir_hash = hashlib.sha1(str(workdir).encode(), usedforsecurity=False).hexdigest()[:8]
+    return f"cardonnay-{workdir_hash}-cluster{instance_num}"
+
+
+def setup_instance_cgroup(
+    workdir: pl.Path, instance_num: int, cpus: str, mem_max_mib: int
+) -> pl.Path | None:
+    """Create cgroup for the node processes of the instance with the given limits.
+
+    Returns:
+        Path to the cgroup, or None when a delegated cgroup is not available.
+    """
+    parent = get_delegated_cgroup()
+    if parent is None:
+        return None
+
+    cgroup = parent / get_instance_cgroup_name(workdir=workdir, instance_num=instance_num)
+    try:
+        cgroup.mkdir(exist_ok=True)
+        # Empty `cpuset.cpus` means all the CPUs of the parent
+        (cgroup / "cpuset.cpus").write_text(cpus)
+        (cgroup / "memory.max").write_text(str(mem_max_mib * 1024 * 1024) if mem_max_mib else "max")
+    except OSError as excp:
+        LOGGER.warning(
+            f"Cannot set up cgroup '{cgroup}', falling back to `taskset` and `prlimit`: {excp}"
+        )
+        remove_instance_cgroup(cgroup=cgroup)
+        return None
+
+    return cgroup
+
+
+def remove_instance_cgroup(cgroup: pl.Path) -> None:
+    """Remove the cgroup of the instance, it can be removed only once it has no processes."""
+    with contextlib.suppress(OSError):
+        cgroup.rmdir()
@@ -0,0 +1,130 @@
+"""Summaries of the resource usage sampled by the `resource_sampler` supervisor program.
+
+The sampler appends one CSV row per supervisor program and sample to `resources.csv` in
+the state dir, see the `run-resource-sampler` script for the format.
+"""
+
+import csv
+import dataclasses
+import datetime as dt
+import logging
+import pathlib as pl
+import typing as tp
+
+from cardonnay import helpers
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+SAMPLES_FILE = "resources.csv"
+# Too short period for the RSS growth rate to be meaningful
+MIN_GROWTH_PERIOD_SEC = 60
+
+
+@dataclasses.dataclass(frozen=True)
+class Sample:
+    time: float
+    pids: int
+    cpu_percent: float
+    rss_kib: int
+    read_bps: float
+    write_bps: float
+    fds: int
+
+
+def load_samples(samples_file: pl.Path, since: float | None = None) -> dict[str, list[Sample]]:
+    """Load samples of every program, optionally only the samples taken at `since` or later."""
+    samples: dict[str, list[Sample]] = {}
+    with open(samples_file, encoding="utf-8", newline="") as fp_in:
+        for row in csv.DictReader(fp_in):
+            try:
+                sample = Sample(
+                    time=float(row["time"]),
+                    pids=int(row["pids"]),
+                    cpu_percent=float(row["cpu_percent"]),
+                    rss_kib=int(row["rss_kib"]),
+                    read_bps=float(row["read_bps"]),
+                    write_bps=float(row["write_bps"]),
+                    fds=int(row["fds"]),
+                )
+            except (KeyError, TypeError, ValueError):
+                # A partially written last line, or the header of an appended run
+                continue
+            if since is not None and sample.time < since:
+                continue
+            samples.setdefault(row["program"], []).append(sample)
+    return samples
+
+
+def _get_stats(values: list[float], ndigits: int = 1) -> structs.UsageStats:
+    values = sorted(values)
+    return structs.UsageStats(
+        mean=round(sum(values) / len(values), ndigits),
+        p50=round(helpers.percentile(values, 50), ndigits),
+        p95=round(helpers.percentile(values, 95), ndigits),
+        p99=round(helpers.percentile(values, 99), ndigits),
+        max=round(values[-1], ndigits),
+    )
+
+
+def get_growth_per_hour(times: list[float], values: list[float]) -> float | None:
+    """Get the least squares slope of the values per hour, None if the period is too short."""
+    if not times or times[-1] - times[0] < MIN_GROWTH_PERIOD_SEC:
+        return None
+
+    mean_t = sum(times) / len(times)
+    mean_v = sum(values) / len(values)
+    var_t = sum((t - mean_t) ** 2 for t in times)
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values, strict=True))
+    return cov / var_t * 3600 if var_t else None
+
+
+def _to_datetime(timestamp: float) -> dt.datetime:
+    return dt.datetime.fromtimestamp(timestamp, tz=dt.timezone.utc)
+
+
+def get_program_usage(program: str, samples: list[Sample]) -> structs.ProgramUsage:
+    rss_mib = [s.rss_kib / 1024 for s in samples]
+    growth = get_growth_per_hour(times=[s.time for s in samples], values=rss_mib)
+    return structs.ProgramUsage(
+        program=program,
+        samples=len(samples),
+        start=_to_datetime(samples[0].time),
+        end=_to_datetime(samples[-1].time),
+        cpu_percent=_get_stats([s.cpu_percent for s in samples]),
+        rss_mib=_get_stats(rss_mib),
+        rss_growth_mib_per_hour=round(growth, 2) if growth is not None else None,
+        read_kib_per_sec=_get_stats([s.read_bps / 1024 for s in samples]),
+        write_kib_per_sec=_get_stats([s.write_bps / 1024 for s in samples]),
+        fds=_get_stats([float(s.fds) for s in samples], ndigits=0),
+    )
+
+
+def get_resource_report(
+    statedir: pl.Path, last_sec: int | None = None, programs: tp.Iterable[str] = ()
+) -> structs.ResourceReport:
+    """Summarize the sampled resource usage of the supervisor programs.
+
+    Args:
+        statedir: State dir of the testnet instance.
+        last_sec: Summarize only the samples from the last given number of seconds.
+        programs: Names of the programs to summarize, all programs when empty.
+
+    Raises:
+        FileNotFoundError: No samples were recorded for the instance.
+    """
+    samples_file = statedir / SAMPLES_FILE
+    since = None
+    if last_sec:
+        since = dt.datetime.now(tz=dt.timezone.utc).timestamp() - last_sec
+    samples = load_samples(samples_file=samples_file, since=since)
+
+    selected = set(programs)
+    return structs.ResourceReport(
+        samples_file=samples_file,
+        programs=[
+            get_program_usage(program=p, samples=s)
+            for p, s in sorted(samples.items())
+            if not selected or p in selected
+        ],
+    )
@@ -1,4 +1,6 @@
+import datetime as dt
 import pathlib as pl
+import typing as tp
 
 import pydantic
 
@@ -41,6 +43,14 @@ class SupervisorData(pydantic.BaseModel):
     NUM_POOLS: int
 
 
+class ProcessStats(pydantic.BaseModel):
+    pid: int
+    cpu_time_sec: float
+    cpu_percent: float  # Average over the lifetime of the process
+    rss_mib: float
+    cpus_allowed: str
+
+
 class InstanceInfo(pydantic.BaseModel):
     instance: int
     type: str
@@ -53,6 +63,15 @@ class InstanceInfo(pydantic.BaseModel):
     start_logfile: pl.Path | None
     control_env: dict[str, str]
     supervisor_env: SupervisorData
+    node_processes: dict[str, ProcessStats]
+
+
+class VariantOverlay(pydantic.BaseModel):
+    # Variant the user variant is based on
+    extends: str = ""
+    description: str = ""
+    # JSON merge patches by file name
+    files: dict[str, dict] = {}
 
 
 class StartInfo(pydantic.BaseModel):
@@ -63,15 +82,9 @@ class StartInfo(pydantic.BaseModel):
     start_logfile: pl.Path | None
 
 
-class InstanceSummary(pydantic.BaseModel):
-    instance: int
-    type: str
-    state: str
-    comment: str | None = None
-
-
 class CombinedConfig(pydantic.BaseModel):
     # Shelley genesis.json
+    activeSlotsCoeff: float | None = None  # noqa: N815
     epochLength: int | None = None  # noqa: N815
     maxLovelaceSupply: int | None = None  # noqa: N815
     networkMagic: int | None = None  # noqa: N815
@@ -88,5 +101,326 @@ class CombinedConfig(pydantic.BaseModel):
     # Pool1 config-pool1.json
     ledgerdb_backend: str = "default"
 
+    # config-<node>.json of every node
+    ledgerdb_backends: dict[str, str] = {}
+
+    # testnet.json
+    trace_profile: str = "default"
+    topology_seed: int | None = None
+    # Genesis parameters overridden when the instance was created
+    genesis_params: dict[str, int | float] = {}
+
     # Derived
     epoch_len_sec: float = 0.0
+
+
+class LatencyStats(pydantic.BaseModel):
+    start: dt.datetime
+    end: dt.datetime
+    submitted: int
+    included: int
+    dropped: int
+    pending: int
+    drop_rate: float | None
+    p50_sec: float | None
+    p95_sec: float | None
+    p99_sec: float | None
+
+
+class LatencyReport(pydantic.BaseModel):
+    interval_sec: int
+    grace_sec: int
+    last_block_at: dt.datetime | None
+    total: LatencyStats | None
+    intervals: list[LatencyStats]
+
+
+class UsageStats(pydantic.BaseModel):
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+
+class ProgramUsage(pydantic.BaseModel):
+    program: str
+    samples: int
+    start: dt.datetime
+    end: dt.datetime
+    cpu_percent: UsageStats
+    rss_mib: UsageStats
+    rss_growth_mib_per_hour: float | None
+    read_kib_per_sec: UsageStats
+    write_kib_per_sec: UsageStats
+    fds: UsageStats
+
+
+class ResourceReport(pydantic.BaseModel):
+    samples_file: pl.Path
+    programs: list[ProgramUsage]
+
+
+class NodeBenchResult(pydantic.BaseModel):
+    ledgerdb_backend: str
+    rss_mib_p50: float | None
+    rss_mib_max: float | None
+    cpu_percent_p50: float | None
+    disk_mib: float
+    blocks_adopted: int
+    adoption_ms_p50: float | None
+    adoption_ms_p95: float | None
+    replay_sec: float | None
+
+
+class BackendBenchResult(pydantic.BaseModel):
+    backend: str
+    instance: int
+    nodes: dict[str, NodeBenchResult]
+    error: str | None
+
+
+class BackendsBenchReport(pydantic.BaseModel):
+    testnet_variant: str
+    stake_pools_num: int
+    duration_sec: int
+    load: str
+    tx_tps: int
+    topology_seed: int
+    results: list[BackendBenchResult]
+
+
+class NodeRestartResult(pydantic.BaseModel):
+    node: str
+    restarted_at: dt.datetime
+    chain_blocks: int | None
+    socket_up_sec: float | None
+    replay_sec: float | None
+    caught_up_sec: float | None
+    # Missing in the history recorded before it was measured
+    ready_sec: float | None = None
+
+
+class RestartBenchReport(pydantic.BaseModel):
+    instance: int
+    one_at_a_time: bool
+    results: list[NodeRestartResult]
+    history_file: pl.Path
+
+
+class DbSyncStatus(pydantic.BaseModel):
+    metrics_port: int
+    block: int
+    slot: int | None
+    tip_block: int
+    tip_slot: int | None
+    lag_blocks: int
+    lag_sec: float | None
+    queue_length: int | None
+    blocks_per_sec: float | None
+
+
+class PostgresStatus(pydantic.BaseModel):
+    running: bool
+    socket_dir: pl.Path
+    port: int | None
+    templates: list[str]
+    databases: list[str]
+
+
+class CorpusHeader(pydantic.BaseModel):
+    version: int
+    era: str
+    network_magic: int
+    address: str
+    inputs: int
+    outputs: int
+    metadata_bytes: int
+    plutus: bool
+    chains: int
+    fee: int
+    created: dt.datetime
+
+
+class CorpusSummary(pydantic.BaseModel):
+    file: pl.Path
+    header: CorpusHeader
+    txs: int
+    size_bytes: int
+    tx_size_bytes: UsageStats | None
+    build_sec: float | None
+
+
+class SubmitLoadReport(pydantic.BaseModel):
+    endpoint: str
+    corpus: pl.Path | None = None
+    txs: int
+    connections: int
+    target_tps: float | None
+    build_sec: float | None
+    duration_sec: float
+    accepted: int
+    rejected: int
+    accepted_tps: float
+    latency_ms: UsageStats | None
+    errors: dict[str, int]
+
+
+class GovActionReport(pydantic.BaseModel):
+    action_id: str
+    action_type: str
+    proposed_epoch: int | None = None
+    # Number of votes by the voter role ("cc", "spo", "drep")
+    votes: dict[str, int]
+    vote_txs: int
+    voted_epoch: int
+    ratified_epoch: int | None = None
+    enacted_epoch: int | None = None
+    duration_sec: float
+
+
+ChaosAction = tp.Literal["pause", "resume", "kill", "stop", "start", "restart"]
+
+
+class ChaosEvent(pydantic.BaseModel):
+    model_config = pydantic.ConfigDict(extra="forbid")
+
+    # Seconds from the start of the chaos run
+    at: float = pydantic.Field(ge=0)
+    action: ChaosAction
+    # Node names or group names
+    targets: list[str]
+    # Number of randomly picked targets, 0 = all targets
+    pick: int = pydantic.Field(default=0, ge=0)
+    # Seconds after which a pause, kill or stop is reverted, 0 = not reverted
+    duration: float = pydantic.Field(default=0, ge=0)
+
+
+class ChaosRandomEvents(pydantic.BaseModel):
+    model_config = pydantic.ConfigDict(extra="forbid")
+
+    count: int = pydantic.Field(ge=1)
+    start: float = pydantic.Field(default=0, ge=0)
+    end: float = pydantic.Field(gt=0)
+    actions: list[ChaosAction] = ["pause", "kill"]
+    targets: list[str] = ["pools"]
+    pick: int = pydantic.Field(default=1, ge=1)
+    min_duration: float = pydantic.Field(default=5, ge=0)
+    max_duration: float = pydantic.Field(default=30, ge=0)
+
+
+class ChaosSchedule(pydantic.BaseModel):
+    model_config = pydantic.ConfigDict(extra="forbid")
+
+    seed: int | None = None
+    # Seconds the run continues after the last event
+    settle_sec: float = pydantic.Field(default=60, ge=0)
+    sample_interval_sec: float = pydantic.Field(default=1, gt=0)
+    # Named groups of nodes, in addition to the built-in "nodes", "bfts" and "pools"
+    groups: dict[str, list[str]] = {}
+    events: list[ChaosEvent] = []
+    random: list[ChaosRandomEvents] = []
+
+
+class ChaosEventRecord(pydantic.BaseModel):
+    at: dt.datetime
+    offset_sec: float
+    action: ChaosAction
+    node: str
+    # The event reverts an earlier pause, kill or stop
+    revert: bool
+    error: str = ""
+
+
+class ChaosPhase(pydantic.BaseModel):
+    name: str
+    start: dt.datetime
+    end: dt.datetime
+    blocks: int | None
+    expected_blocks: float | None
+    blocks_per_min: float | None
+    # Difference of the block numbers of the highest and the lowest tip of the nodes
+    max_spread_blocks: int | None
+    divergent_sec: float
+    latency: LatencyStats | None
+
+
+class ChaosRecovery(pydantic.BaseModel):
+    node: str
+    action: ChaosAction
+    disrupted_at: dt.datetime
+    outage_sec: float
+    # Seconds from the end of the outage until the node tip caught up with the other nodes
+    caught_up_sec: float | None
+
+
+class ChaosReport(pydantic.BaseModel):
+    instance: int
+    schedule_file: pl.Path
+    seed: int
+    load: list[str]
+    events_file: pl.Path
+    events: list[ChaosEventRecord]
+    phases: list[ChaosPhase]
+    recoveries: list[ChaosRecovery]
+
+
+class ChainRollback(pydantic.BaseModel):
+    kind: tp.Literal["rollback"] = "rollback"
+    at: dt.datetime
+    node: str
+    # Number of blocks rolled back and the slot of the point the chain was rolled back to
+    depth: int
+    slot: int
+    rolled_back: list[str]
+
+
+class TipDivergence(pydantic.BaseModel):
+    kind: tp.Literal["divergence"] = "divergence"
+    start: dt.datetime
+    duration_sec: float
+    # Largest number of different node tips, and difference of their block numbers
+    max_tips: int
+    max_spread_blocks: int
+
+
+class ForkMonitorRun(pydantic.BaseModel):
+    kind: tp.Literal["run"] = "run"
+    start: dt.datetime
+    end: dt.datetime
+    nodes: list[str]
+    # Blocks added to the chains of the nodes, and blocks that none of them kept
+    blocks: int
+    orphaned_blocks: int
+
+
+ForkRecord = tp.Annotated[
+    ChainRollback | TipDivergence | ForkMonitorRun, pydantic.Field(discriminator="kind")
+]
+
+
+class ForksReport(pydantic.BaseModel):
+    records_file: pl.Path
+    since: dt.datetime | None
+    runs: int
+    monitored_sec: float
+    blocks: int
+    orphaned_blocks: int
+    orphan_rate: float | None
+    rollbacks: int
+    rollbacks_by_node: dict[str, int]
+    # Number of rollbacks by the number of rolled back blocks
+    fork_depths: dict[int, int]
+    max_fork_depth: int
+    divergences: int
+    divergence_sec: UsageStats | None
+    divergent_share: float | None
+    # Divergences longer than the threshold
+    prolonged_threshold_sec: float
+    prolonged_divergences: int
+
+
+class NodeMetrics(pydantic.BaseModel):
+    node: str
+    port: int
+    metrics: dict[str, float]
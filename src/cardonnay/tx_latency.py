@@ -0,0 +1,198 @@
+"""Submit-to-inclusion latency of transactions submitted by the tx load generators.
+
+Submitted tx IDs are taken from the traces of the tx load generators, included tx IDs
+from the `Forge.Loop.AdoptedBlock` traces of the block-producing nodes. Both sides are
+matched on the tx ID, so the measurement works with any load generator that traces
+the IDs of the transactions it submits.
+"""
+
+import dataclasses
+import datetime as dt
+import logging
+import pathlib as pl
+
+from cardonnay import consts
+from cardonnay import helpers
+from cardonnay import node_logs
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+# Log file glob and the marker of lines that carry IDs of submitted transactions
+SUBMIT_TRACES: tuple[tuple[str, str], ...] = (
+    ("tx-generator.stdout", "SubmissionClientReplyTxIds"),
+    ("tx-centrifuge.stdout", "NewTx"),
+    ("tx-firehose*.stderr", "TxFirehose.Submit.Success"),
+)
+# Machine format and namespace ("AdoptedBlock") and human format ("Adopted block") markers
+INCLUSION_MARKERS = ("AdoptedBlock", "Adopted block")
+
+DEFAULT_INTERVAL_SEC = consts.LATENCY_INTERVAL_SEC
+DEFAULT_GRACE_SEC = consts.LATENCY_GRACE_SEC
+
+
+@dataclasses.dataclass(frozen=True)
+class TxTimes:
+    submitted: dict[str, float]
+    included: dict[str, float]
+    last_block_at: float | None
+
+
+def _set_earliest(times: dict[str, float], txid: str, timestamp: float) -> None:
+    prev = times.get(txid)
+    if prev is None or timestamp < prev:
+        times[txid] = timestamp
+
+
+def collect_submitted(statedir: pl.Path) -> dict[str, float]:
+    """Return the time of the first submission of each tx ID seen in generator traces."""
+    submitted: dict[str, float] = {}
+    for pattern, marker in SUBMIT_TRACES:
+        for logfile in sorted(statedir.glob(pattern)):
+            for line in node_logs.iter_log_lines(logfile):
+                if marker not in line:
+                    continue
+                trace = node_logs.parse_trace_line(line)
+                if trace.timestamp is None:
+                    continue
+                for txid in node_logs.find_txids(line):
+                    _set_earliest(times=submitted, txid=txid, timestamp=trace.timestamp)
+    return submitted
+
+
+def collect_included(statedir: pl.Path) -> tuple[dict[str, float], float | None]:
+    """Return the time each tx ID was adopted in a forged block, and the last block time."""
+    included: dict[str, float] = {}
+    last_block_at: float | None = None
+    for node_name in node_logs.get_node_names(statedir=statedir):
+        for line in node_logs.iter_log_lines(statedir / f"{node_name}.stdout"):
+            if not any(m in line for m in INCLUSION_MARKERS):
+                continue
+            trace = node_logs.parse_trace_line(line)
+            if trace.timestamp is None:
+                continue
+            last_block_at = max(last_block_at or trace.timestamp, trace.timestamp)
+            for txid in node_logs.find_txids(line):
+                _set_earliest(times=included, txid=txid, timestamp=trace.timestamp)
+    return included, last_block_at
+
+
+def collect_tx_times(statedir: pl.Path) -> TxTimes:
+    """Collect submission and inclusion times from the instance logs."""
+    included, last_block_at = collect_included(statedir=statedir)
+    return TxTimes(
+        submitted=collect_submitted(statedir=statedir),
+        included=included,
+        last_block_at=last_block_at,
+    )
+
+
+def _to_datetime(timestamp: float) -> dt.datetime:
+    return dt.datetime.fromtimestamp(timestamp, tz=dt.timezone.utc)
+
+
+def _get_stats(
+    txids: list[str], tx_times: TxTimes, start: float, end: float, grace_sec: int
+) -> structs.LatencyStats:
+    latencies: list[float] = []
+    dropped = pending = 0
+    for txid in txids:
+        submitted_at = tx_times.submitted[txid]
+        included_at = tx_times.included.get(txid)
+        if included_at is not None:
+            # Clock granularity of the traces can make the difference slightly negative
+            latencies.append(max(included_at - submitted_at, 0.0))
+        elif (
+            tx_times.last_block_at is not None
+            and submitted_at + grace_sec <= tx_times.last_block_at
+        ):
+            dropped += 1
+        else:
+            pending += 1
+
+    latencies.sort()
+    decided = len(latencies) + dropped
+
+    def _pct(pct: float) -> float | None:
+        return round(helpers.percentile(latencies, pct), 3) if latencies else None
+
+    return structs.LatencyStats(
+        start=_to_datetime(start),
+        end=_to_datetime(end),
+        submitted=len(txids),
+        included=len(latencies),
+        dropped=dropped,
+        pending=pending,
+        drop_rate=round(dropped / decided, 4) if decided else None,
+        p50_sec=_pct(50),
+        p95_sec=_pct(95),
+        p99_sec=_pct(99),
+    )
+
+
+def get_latency_report(
+    tx_times: TxTimes,
+    interval_sec: int = DEFAULT_INTERVAL_SEC,
+    grace_sec: int = DEFAULT_GRACE_SEC,
+    since: float | None = None,
+    until: float | None = None,
+) -> structs.LatencyReport:
+    """Compute inclusion latency percentiles and drop rate per interval of submission time.
+
+    A submitted transaction that was not included is counted as dropped only when blocks
+    were adopted at least `grace_sec` seconds after its submission, otherwise it is
+    counted as pending. Drop rate is computed from included and dropped transactions.
+    """
+    if interval_sec <= 0:
+        msg = "Interval must be a positive number of seconds."
+        raise ValueError(msg)
+
+    submitted = {
+        txid: ts
+        for txid, ts in tx_times.submitted.items()
+        if (since is None or ts >= since) and (until is None or ts < until)
+    }
+    last_block_at = (
+        _to_datetime(tx_times.last_block_at) if tx_times.last_block_at is not None else None
+    )
+    if not submitted:
+        return structs.LatencyReport(
+            interval_sec=interval_sec,
+            grace_sec=grace_sec,
+            last_block_at=last_block_at,
+            total=None,
+            intervals=[],
+        )
+
+    first_ts = min(submitted.values())
+    last_ts = max(submitted.values())
+
+    buckets: dict[int, list[str]] = {}
+    for txid, ts in submitted.items():
+        buckets.setdefault(int((ts - first_ts) // interval_sec), []).append(txid)
+
+    intervals = [
+        _get_stats(
+            txids=buckets[b],
+            tx_times=tx_times,
+            start=first_ts + b * interval_sec,
+            end=first_ts + (b + 1) * interval_sec,
+            grace_sec=grace_sec,
+        )
+        for b in sorted(buckets)
+    ]
+    total = _get_stats(
+        txids=list(submitted),
+        tx_times=tx_times,
+        start=first_ts,
+        end=last_ts,
+        grace_sec=grace_sec,
+    )
+
+    return structs.LatencyReport(
+        interval_sec=interval_sec,
+        grace_sec=grace_sec,
+        last_block_at=last_block_at,
+        total=total,
+        intervals=intervals,
+    )
@@ -0,0 +1,381 @@
+"""Building, signing and submitting simple transactions with `cardano-cli`.
+
+Transactions are built with `transaction build-raw` and a fixed fee, the same way as in
+the testnet scripts, so no node query is needed per transaction.
+"""
+
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import os
+import pathlib as pl
+import re
+import shlex
+import subprocess
+import time
+import typing as tp
+
+from cardonnay import inspect_instance
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FEE = 200_000
+# Fee of a transaction that splits a UTxO into `MAX_SPLIT_OUTPUTS` outputs
+SPLIT_FEE = 1_000_000
+MAX_SPLIT_OUTPUTS = 120
+MIN_UTXO_VALUE = 1_000_000
+UTXO_WAIT_TIMEOUT_SEC = 120
+
+
+@dataclasses.dataclass(frozen=True)
+class TxIn:
+    txin: str
+    amount: int
+
+
+@dataclasses.dataclass(frozen=True)
+class TxContext:
+    network_magic: int
+    socket_path: pl.Path
+
+    @property
+    def magic_args(self) -> list[str]:
+        return ["--testnet-magic", str(self.network_magic)]
+
+
+def get_tx_context(statedir: pl.Path) -> TxContext:
+    """Get network magic and node socket of the testnet instance.
+
+    Raises:
+        RuntimeError: The network magic is not known.
+    """
+    network_magic = inspect_instance.get_config(statedir=statedir).networkMagic
+    if network_magic is None:
+        msg = f"Network magic not found in the Shelley genesis in '{statedir}'."
+        raise RuntimeError(msg)
+    return TxContext(network_magic=network_magic, socket_path=statedir / "bft1.socket")
+
+
+def run_cli(ctx: TxContext, args: list[str]) -> str:
+    """Run `cardano-cli` with the arguments and return its output.
+
+    Raises:
+        RuntimeError: The command failed.
+    """
+    cmd = ["cardano-cli", *args]
+    try:
+        proc = subprocess.run(
+            cmd,
+            env={**os.environ, "CARDANO_NODE_SOCKET_PATH": str(ctx.socket_path)},
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except OSError as excp:
+        msg = f"Failed to run `{shlex.join(cmd)}`: {excp}"
+        raise RuntimeError(msg) from excp
+    if proc.returncode != 0:
+        msg = f"`{shlex.join(cmd)}` failed:\n{(proc.stderr or proc.stdout).strip()}"
+        raise RuntimeError(msg)
+    return proc.stdout
+
+
+def query_utxos(ctx: TxContext, args: list[str]) -> list[TxIn]:
+    """Query UTxOs selected by the arguments (`--address` or `--tx-in`), ADA-only ones."""
+    output = run_cli(
+        ctx=ctx, args=["latest", "query", "utxo", *args, *ctx.magic_args, "--output-json"]
+    )
+    utxos = []
+    for txin, data in (json.loads(output) or {}).items():
+        value = data.get("value") or {}
+        if set(value) == {"lovelace"}:
+            utxos.append(TxIn(txin=txin, amount=int(value["lovelace"])))
+    return utxos
+
+
+def get_txid(ctx: TxContext, tx_file: pl.Path) -> str:
+    output = run_cli(ctx=ctx, args=["latest", "transaction", "txid", "--tx-file", str(tx_file)])
+    output = output.strip()
+    # Newer `cardano-cli` versions print JSON
+    if output.startswith("{"):
+        return str(json.loads(output)["txhash"])
+    return output
+
+
+def read_tx_cbor(tx_file: pl.Path) -> bytes:
+    """Read the CBOR of the signed transaction from the text envelope."""
+    with open(tx_file, encoding="utf-8") as fp_in:
+        return bytes.fromhex(json.load(fp_in)["cborHex"])
+
+
+def get_tx_era(tx_file: pl.Path) -> str:
+    """Get the era of the transaction from the type of its text envelope, e.g. "Conway"."""
+    with open(tx_file, encoding="utf-8") as fp_in:
+        tx_type = str(json.load(fp_in)["type"])
+    if not (era_match := re.search(r"(\w+)Era", tx_type)):
+        msg = f"Unknown type of the transaction in '{tx_file}': {tx_type}"
+        raise RuntimeError(msg)
+    return era_match.group(1)
+
+
+def build_and_sign(
+    ctx: TxContext,
+    txins: list[TxIn],
+    txouts: list[str],
+    fee: int,
+    skey_file: pl.Path,
+    out_base: pl.Path,
+    extra_args: tp.Sequence[str] = (),
+    extra_skey_files: tp.Sequence[pl.Path] = (),
+) -> pl.Path:
+    """Build the transaction with a fixed fee and sign it; return the signed tx file.
+
+    The `extra_args` are passed to `transaction build-raw` after the inputs and outputs.
+    The `extra_skey_files` sign the transaction together with the `skey_file`.
+    """
+    body_file = out_base.with_suffix(".txbody")
+    tx_file = out_base.with_suffix(".tx")
+    run_cli(
+        ctx=ctx,
+        args=[
+            "latest",
+            "transaction",
+            "build-raw",
+            "--fee",
+            str(fee),
+            *(a for t in txins for a in ("--tx-in", t.txin)),
+            *(a for o in txouts for a in ("--tx-out", o)),
+            *extra_args,
+            "--out-file",
+            str(body_file),
+        ],
+    )
+    run_cli(
+        ctx=ctx,
+        args=[
+            "latest",
+            "transaction",
+            "sign",
+            "--tx-body-file",
+            str(body_file),
+            *(a for f in (skey_file, *extra_skey_files) for a in ("--signing-key-file", str(f))),
+            *ctx.magic_args,
+            "--out-file",
+            str(tx_file),
+        ],
+    )
+    return tx_file
+
+
+def submit_tx(ctx: TxContext, tx_file: pl.Path) -> None:
+    run_cli(
+        ctx=ctx,
+        args=["latest", "transaction", "submit", "--tx-file", str(tx_file), *ctx.magic_args],
+    )
+
+
+def wait_for_utxo(ctx: TxContext, txin: str, timeout: float = UTXO_WAIT_TIMEOUT_SEC) -> None:
+    """Wait until the UTxO is on chain.
+
+    Raises:
+        TimeoutError: The UTxO didn't appear within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while not query_utxos(ctx=ctx, args=["--tx-in", txin]):
+        if time.monotonic() >= deadline:
+            msg = f"UTxO '{txin}' didn't appear on chain within {timeout} sec."
+            raise TimeoutError(msg)
+        time.sleep(1)
+
+
+def query_tip(ctx: TxContext) -> dict:
+    return dict(json.loads(run_cli(ctx=ctx, args=["latest", "query", "tip", *ctx.magic_args])))
+
+
+def query_protocol_params(ctx: TxContext, out_file: pl.Path) -> dict:
+    """Save the current protocol parameters to the file and return them."""
+    run_cli(
+        ctx=ctx,
+        args=[
+            "latest",
+            "query",
+            "protocol-parameters",
+            *ctx.magic_args,
+            "--out-file",
+            str(out_file),
+        ],
+    )
+    with open(out_file, encoding="utf-8") as fp_in:
+        return dict(json.load(fp_in))
+
+
+def gen_payment_address(ctx: TxContext, out_base: pl.Path) -> structs.AddressData:
+    """Generate a new payment key pair and its address."""
+    vkey_file = out_base.with_suffix(".vkey")
+    skey_file = out_base.with_suffix(".skey")
+    run_cli(
+        ctx=ctx,
+        args=[
+            "latest",
+            "address",
+            "key-gen",
+            "--verification-key-file",
+            str(vkey_file),
+            "--signing-key-file",
+            str(skey_file),
+        ],
+    )
+    address = run_cli(
+        ctx=ctx,
+        args=[
+            "latest",
+            "address",
+            "build",
+            "--payment-verification-key-file",
+            str(vkey_file),
+            *ctx.magic_args,
+        ],
+    ).strip()
+    return structs.AddressData(address=address, vkey_file=vkey_file, skey_file=skey_file)
+
+
+def get_script_address(ctx: TxContext, script_file: pl.Path) -> str:
+    return run_cli(
+        ctx=ctx,
+        args=[
+            "latest",
+            "address",
+            "build",
+            "--payment-script-file",
+            str(script_file),
+            *ctx.magic_args,
+        ],
+    ).strip()
+
+
+def transfer(
+    ctx: TxContext, payer: structs.AddressData, address: str, amount: int, workdir: pl.Path
+) -> TxIn:
+    """Send `amount` lovelace from the payer to the address and wait for the UTxO.
+
+    Raises:
+        RuntimeError: The payer doesn't have enough funds, or the transaction failed.
+        TimeoutError: The UTxO didn't appear on chain in time.
+    """
+    available = sorted(
+        query_utxos(ctx=ctx, args=["--address", payer.address]), key=lambda u: -u.amount
+    )
+    if not available or available[0].amount < amount + DEFAULT_FEE + MIN_UTXO_VALUE:
+        msg = f"Address '{payer.address}' has no UTxO with {amount} lovelace and the fee."
+        raise RuntimeError(msg)
+    txin = available[0]
+    tx_file = build_and_sign(
+        ctx=ctx,
+        txins=[txin],
+        txouts=[f"{address}+{amount}", f"{payer.address}+{txin.amount - amount - DEFAULT_FEE}"],
+        fee=DEFAULT_FEE,
+        skey_file=payer.skey_file,
+        out_base=workdir / "transfer",
+    )
+    submit_tx(ctx=ctx, tx_file=tx_file)
+    txid = get_txid(ctx=ctx, tx_file=tx_file)
+    # Wait for the change, so the payer UTxOs can be queried again right away
+    wait_for_utxo(ctx=ctx, txin=f"{txid}#1")
+    return TxIn(txin=f"{txid}#0", amount=amount)
+
+
+def select_txins(ctx: TxContext, address: str, needed: int) -> list[TxIn]:
+    """Select the biggest UTxOs of the address until they have the needed amount.
+
+    Raises:
+        RuntimeError: The address doesn't have enough funds.
+    """
+    available = sorted(query_utxos(ctx=ctx, args=["--address", address]), key=lambda u: -u.amount)
+    txins: list[TxIn] = []
+    for utxo in available:
+        if sum(t.amount for t in txins) >= needed:
+            break
+        txins.append(utxo)
+    if (total := sum(t.amount for t in txins)) < needed:
+        msg = f"Address '{address}' has {total} lovelace, {needed} lovelace is needed."
+        raise RuntimeError(msg)
+    return txins
+
+
+def split_utxos(
+    ctx: TxContext,
+    payer: structs.AddressData,
+    count: int,
+    amount: int,
+    workdir: pl.Path,
+    address: str = "",
+    txout_args: tp.Sequence[str] = (),
+) -> list[TxIn]:
+    """Split funds of the payer address into `count` UTxOs of `amount` lovelace.
+
+    The UTxOs are created on `address`, the payer address by default. The `txout_args`
+    (e.g. a datum) are added to every split output.
+
+    The split transactions are chained through their change outputs and submitted one
+    after another, without waiting for each of them to be included.
+
+    Raises:
+        RuntimeError: The payer doesn't have enough funds, or a transaction failed.
+        TimeoutError: The split UTxOs didn't appear on chain in time.
+    """
+    num_split_txs = -(-count // MAX_SPLIT_OUTPUTS)
+    needed = count * amount + num_split_txs * SPLIT_FEE + MIN_UTXO_VALUE
+
+    txins = select_txins(ctx=ctx, address=payer.address, needed=needed)
+    total = sum(t.amount for t in txins)
+
+    dst_address = address or payer.address
+    split: list[TxIn] = []
+    for tx_num in range(num_split_txs):
+        num_outputs = min(count - len(split), MAX_SPLIT_OUTPUTS)
+        change = total - num_outputs * amount - SPLIT_FEE
+        split_args = [f"--tx-out={dst_address}+{amount}", *txout_args] * num_outputs
+        tx_file = build_and_sign(
+            ctx=ctx,
+            txins=txins,
+            txouts=[],
+            fee=SPLIT_FEE,
+            skey_file=payer.skey_file,
+            out_base=workdir / f"split{tx_num}",
+            extra_args=[*split_args, f"--tx-out={payer.address}+{change}"],
+        )
+        submit_tx(ctx=ctx, tx_file=tx_file)
+        txid = get_txid(ctx=ctx, tx_file=tx_file)
+        split.extend(TxIn(txin=f"{txid}#{i}", amount=amount) for i in range(num_outputs))
+        txins = [TxIn(txin=f"{txid}#{num_outputs}", amount=change)]
+        total = change
+
+    # The split transactions are chained, the last change output is on chain the last
+    wait_for_utxo(ctx=ctx, txin=txins[0].txin)
+    return split
+
+
+def build_payment_txs(
+    ctx: TxContext,
+    txins: list[TxIn],
+    payer: structs.AddressData,
+    fee: int,
+    workdir: pl.Path,
+    workers: int = 8,
+) -> list[pl.Path]:
+    """Build and sign one transaction per UTxO, paying its funds back to the payer."""
+
+    def _build(num: int, txin: TxIn) -> pl.Path:
+        return build_and_sign(
+            ctx=ctx,
+            txins=[txin],
+            txouts=[f"{payer.address}+{txin.amount - fee}"],
+            fee=fee,
+            skey_file=payer.skey_file,
+            out_base=workdir / f"tx{num}",
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_build, range(len(txins)), txins))
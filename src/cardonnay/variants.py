@@ -0,0 +1,255 @@
+"""Testnet variants resolved from the shared base files and JSON merge patch overlays.
+
+The scripts of every variant are the files of the `common` dir, the data files of the
+`base` dir (genesis specs, node config template, ...) and the files of the variant dir,
+where a file of a later dir replaces the file of the same name. The variant dir has its
+own start scripts and `testnet.json`, and an `overlay.json` with JSON merge patches
+(RFC 7396) of the base JSON files, e.g.:
+
+    {"files": {"genesis.spec.json": {"epochLength": 800, "securityParam": 4}}}
+
+Users can define their own variants in the `variants` dir of the workdir, as a single
+`<name>.json` overlay that `extends` an existing variant.
+
+A resolved variant is cached in the workdir, in a dir named by the hash of all the input
+files, so the merge patches are applied only once for the same inputs. Cached dirs of older
+inputs are removed once they were not used for a while.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pathlib as pl
+import shutil
+import time
+
+import pydantic
+
+import cardonnay_scripts
+from cardonnay import ca_utils
+from cardonnay import structs
+
+LOGGER = logging.getLogger(__name__)
+
+COMMON_DIR = "common"
+BASE_DIR = "base"
+OVERLAY_FILE = "overlay.json"
+USER_VARIANTS_DIR = "variants"
+CACHE_DIR = "variants_cache"
+# Maximal depth of user variants extending each other
+MAX_EXTENDS_DEPTH = 10
+# Cached dirs of older inputs can still be copied by a concurrent `create`
+STALE_CACHE_GRACE_SEC = 3600
+
+
+def get_scripts_base() -> pl.Path:
+    return pl.Path(str(cardonnay_scripts.SCRIPTS_ROOT))
+
+
+def merge_patch(target: object, patch: object) -> object:
+    """Apply the JSON merge patch to the target document (RFC 7396)."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(target=result.get(key), patch=value)
+    return result
+
+
+def make_merge_patch(source: object, target: object) -> object:
+    """Create the JSON merge patch that turns the source document into the target one."""
+    if not (isinstance(source, dict) and isinstance(target, dict)):
+        return target
+    patch: dict[str, object] = {k: None for k in source if k not in target}
+    for key, value in target.items():
+        if key not in source:
+            patch[key] = value
+        elif source[key] != value:
+            patch[key] = make_merge_patch(source=source[key], target=value)
+    return patch
+
+
+def get_builtin_variants(scripts_base: pl.Path) -> list[str]:
+    return sorted(
+        d.name
+        for d in scripts_base.iterdir()
+        if d.is_dir()
+        if not ("egg-info" in d.name or d.name in (COMMON_DIR, BASE_DIR))
+    )
+
+
+def get_user_variants(workdir: pl.Path) -> list[str]:
+    return sorted(f.stem for f in (workdir / USER_VARIANTS_DIR).glob("*.json"))
+
+
+def variant_exists(name: str, workdir: pl.Path, scripts_base: pl.Path | None = None) -> bool:
+    scripts_base = scripts_base or get_scripts_base()
+    return bool(name) and (
+        (scripts_base / name / ca_utils.TESTNET_JSON).exists()
+        or (workdir / USER_VARIANTS_DIR / f"{name}.json").exists()
+    )
+
+
+def _load_overlay(overlay_file: pl.Path) -> structs.VariantOverlay:
+    if not overlay_file.exists():
+        return structs.VariantOverlay()
+    try:
+        with open(overlay_file, encoding="utf-8") as fp_in:
+            return structs.VariantOverlay.model_validate(json.load(fp_in))
+    except (ValueError, pydantic.ValidationError) as excp:
+        msg = f"Invalid overlay '{overlay_file}': {excp}"
+        raise RuntimeError(msg) from excp
+
+
+def _get_layers(
+    name: str, workdir: pl.Path, scripts_base: pl.Path
+) -> tuple[list[pl.Path], list[tuple[str, pl.Path]]]:
+    """Get dirs with the variant files and the overlays applied on top of them, in order.
+
+    Raises:
+        RuntimeError: The variant doesn't exist, or the user variants extend each other
+            in a loop.
+    """
+    overlays: list[tuple[str, pl.Path]] = []
+    while (user_overlay := workdir / USER_VARIANTS_DIR / f"{name}.json").exists():
+        if len(overlays) >= MAX_EXTENDS_DEPTH:
+            msg = f"User variants extend each other too deep: {[o[0] for o in overlays]}"
+            raise RuntimeError(msg)
+        overlays.insert(0, (name, user_overlay))
+        name = _load_overlay(overlay_file=user_overlay).extends
+        if not name:
+            msg = f"User variant overlay '{user_overlay}' doesn't set the `extends` variant."
+            raise RuntimeError(msg)
+
+    variant_dir = scripts_base / name
+    if name in (COMMON_DIR, BASE_DIR) or not (variant_dir / ca_utils.TESTNET_JSON).exists():
+        msg = f"Testnet variant '{name}' does not exist in '{scripts_base}'."
+        raise RuntimeError(msg)
+
+    overlays.insert(0, (name, variant_dir / OVERLAY_FILE))
+    dirs = [scripts_base / COMMON_DIR, scripts_base / BASE_DIR, variant_dir]
+    return dirs, overlays
+
+
+def _get_inputs_hash(dirs: list[pl.Path], overlays: list[tuple[str, pl.Path]]) -> str:
+    digest = hashlib.sha256()
+    for fpath in [*(f for d in dirs for f in sorted(d.iterdir())), *(o[1] for o in overlays)]:
+        if not fpath.is_file():
+            continue
+        digest.update(f"{fpath.parent.name}/{fpath.name}\0".encode())
+        digest.update(fpath.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def resolve_files(
+    name: str, workdir: pl.Path, scripts_base: pl.Path | None = None
+) -> dict[str, bytes]:
+    """Get names and contents of the files of the resolved variant.
+
+    Raises:
+        RuntimeError: The variant doesn't exist or its overlay is not valid.
+    """
+    scripts_base = scripts_base or get_scripts_base()
+    dirs, overlays = _get_layers(name=name, workdir=workdir, scripts_base=scripts_base)
+
+    files: dict[str, bytes] = {}
+    for d in dirs:
+        for fpath in sorted(d.iterdir()):
+            if fpath.is_file() and fpath.name != OVERLAY_FILE:
+                files[fpath.name] = fpath.read_bytes()
+
+    for overlay_name, overlay_file in overlays:
+        overlay = _load_overlay(overlay_file=overlay_file)
+        patches: dict[str, object] = dict(overlay.files)
+        if overlay_file.parent.name == USER_VARIANTS_DIR:
+            # The name of the user variant is the name of its overlay
+            testnet_patch: dict[str, object] = {"name": overlay_name}
+            if overlay.description:
+                testnet_patch["description"] = overlay.description
+            patches[ca_utils.TESTNET_JSON] = merge_patch(
+                target=patches.get(ca_utils.TESTNET_JSON), patch=testnet_patch
+            )
+        for fname, patch in patches.items():
+            try:
+                data = json.loads(files[fname]) if fname in files else {}
+            except ValueError as excp:
+                msg = f"Overlay '{overlay_file}' patches '{fname}', which is not a JSON file."
+                raise RuntimeError(msg) from excp
+            merged = merge_patch(target=data, patch=patch)
+            files[fname] = json.dumps(merged, indent=4).encode()
+
+    return files
+
+
+def _remove_stale_dirs(name: str, cache_base: pl.Path, keep_dir: pl.Path) -> None:
+    """Remove the cached dirs of the variant that were not used within the grace period."""
+    threshold = time.time() - STALE_CACHE_GRACE_SEC
+    for stale_dir in cache_base.glob(f"{name}-*"):
+        if stale_dir == keep_dir or not stale_dir.name.removeprefix(f"{name}-").isalnum():
+            continue
+        try:
+            if stale_dir.stat().st_mtime >= threshold:
+                continue
+        except OSError:
+            # Removed concurrently
+            continue
+        shutil.rmtree(stale_dir, ignore_errors=True)
+
+
+def resolve_variant(name: str, workdir: pl.Path, scripts_base: pl.Path | None = None) -> pl.Path:
+    """Resolve the variant to a dir with all its files, cached in the workdir.
+
+    Raises:
+        RuntimeError: The variant doesn't exist or its overlay is not valid.
+    """
+    scripts_base = scripts_base or get_scripts_base()
+    dirs, overlays = _get_layers(name=name, workdir=workdir, scripts_base=scripts_base)
+    cache_base = workdir / CACHE_DIR
+    resolved_dir = cache_base / f"{name}-{_get_inputs_hash(dirs=dirs, overlays=overlays)}"
+    if resolved_dir.is_dir():
+        # The modification time is the time of the last use
+        with contextlib.suppress(OSError):
+            os.utime(resolved_dir)
+        return resolved_dir
+
+    ca_utils.create_workdir(workdir=workdir)
+    cache_base.mkdir(exist_ok=True)
+    tmp_dir = cache_base / f".{resolved_dir.name}.{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+    for fname, content in resolve_files(
+        name=name, workdir=workdir, scripts_base=scripts_base
+    ).items():
+        (tmp_dir / fname).write_bytes(content)
+
+    try:
+        tmp_dir.rename(resolved_dir)
+    except OSError:
+        # Resolved concurrently by another process
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not resolved_dir.is_dir():
+            raise
+    else:
+        LOGGER.debug(f"Resolved testnet variant '{name}' to '{resolved_dir}'.")
+        _remove_stale_dirs(name=name, cache_base=cache_base, keep_dir=resolved_dir)
+
+    return resolved_dir
+
+
+def get_variant_diff(
+    name: str, workdir: pl.Path, scripts_base: pl.Path | None = None
+) -> dict[str, object]:
+    """Get the effective JSON merge patch of every base file that the variant changes."""
+    scripts_base = scripts_base or get_scripts_base()
+    files = resolve_files(name=name, workdir=workdir, scripts_base=scripts_base)
+    diff: dict[str, object] = {}
+    for fpath in sorted((scripts_base / BASE_DIR).glob("*.json")):
+        base_data = json.loads(fpath.read_bytes())
+        if patch := make_merge_patch(source=base_data, target=json.loads(files[fpath.name])):
+            diff[fpath.name] = patch
+    return diff
@@ -582,6 +582,13 @@ configure_supervisor() {
     autorestart_nodes="false"
   fi
 
+  # Logs are rotated by size, the rotated segments are compressed by `run-log-compressor`
+  local log_rotation
+  log_rotation="stdout_logfile_maxbytes=${LOG_MAX_BYTES:-100MB}
+stdout_logfile_backups=${LOG_BACKUPS:-5}
+stderr_logfile_maxbytes=${LOG_MAX_BYTES:-100MB}
+stderr_logfile_backups=${LOG_BACKUPS:-5}"
+
   local -a node_names=()
   local i
   for ((i=1; i<="${NUM_BFT_NODES}"; i++)); do
@@ -591,6 +598,35 @@ configure_supervisor() {
     node_names+=("pool${i}")
   done
 
+  # CPU affinity and memory limit of the nodes, applied through the instance cgroup when
+  # available, otherwise through `taskset` and `prlimit`
+  local limits_prefix=""
+  if [ -n "${NODE_CGROUP:-}" ]; then
+    cp "${SCRIPT_DIR}/run-in-cgroup" "${STATE_CLUSTER}"
+    limits_prefix="./${STATE_CLUSTER_NAME}/run-in-cgroup ${NODE_CGROUP} "
+  else
+    if [ -n "${NODE_CPUS:-}" ]; then
+      command -v taskset > /dev/null 2>&1 || \
+        { echo "The \`taskset\` binary not found, line $LINENO in ${BASH_SOURCE[0]}" >&2; exit 1; }
+      limits_prefix="taskset -c ${NODE_CPUS} "
+    fi
+    # The disk backends memory-map their tables, far beyond any address space limit
+    local disk_backend=""
+    case " ${UTXO_BACKEND:-} ${UTXO_BACKENDS[*]:-} " in
+      *" disk "*|*" disklmdb "*) disk_backend=1 ;;
+    esac
+    if [ "${NODE_MEM_MAX_MIB:-0}" -gt 0 ] && [ -n "$disk_backend" ]; then
+      echo "Warning: the memory limit is not applied without a cgroup when a disk UTxO backend is used" >&2
+    elif [ "${NODE_MEM_MAX_MIB:-0}" -gt 0 ]; then
+      command -v prlimit > /dev/null 2>&1 || \
+        { echo "The \`prlimit\` binary not found, line $LINENO in ${BASH_SOURCE[0]}" >&2; exit 1; }
+      # Only the virtual address space of a single process can be limited, not its RSS,
+      # split the limit
+      local node_mem_bytes="$((NODE_MEM_MAX_MIB * 1024 * 1024 / ${#node_names[@]}))"
+      limits_prefix+="prlimit --as=${node_mem_bytes} -- "
+    fi
+  fi
+
   cat > "${STATE_CLUSTER}/supervisor.conf" <<EoF
 [unix_http_server]
 file = ${SUPERVISORD_SOCKET_PATH}
@@ -603,9 +639,10 @@ EoF
     cat >> "${STATE_CLUSTER}/supervisor.conf" <<EoF
 
 [program:${node_name}]
-command=./${STATE_CLUSTER_NAME}/cardano-node-${node_name}
+command=${limits_prefix}./${STATE_CLUSTER_NAME}/cardano-node-${node_name}
 stderr_logfile=./${STATE_CLUSTER_NAME}/${node_name}.stderr
 stdout_logfile=./${STATE_CLUSTER_NAME}/${node_name}.stdout
+${log_rotation}
 autorestart=${autorestart_nodes}
 startsecs=5
 EoF
@@ -627,6 +664,7 @@ EoF
 command=./${STATE_CLUSTER_NAME}/run-cardano-dbsync
 stderr_logfile=./${STATE_CLUSTER_NAME}/dbsync.stderr
 stdout_logfile=./${STATE_CLUSTER_NAME}/dbsync.stdout
+${log_rotation}
 autostart=false
 autorestart=false
 startsecs=5
@@ -645,6 +683,7 @@ EoF
 command=./${STATE_CLUSTER_NAME}/run-cardano-smash
 stderr_logfile=./${STATE_CLUSTER_NAME}/smash.stderr
 stdout_logfile=./${STATE_CLUSTER_NAME}/smash.stdout
+${log_rotation}
 autostart=false
 autorestart=false
 startsecs=5
@@ -658,6 +697,7 @@ EoF
 command=./${STATE_CLUSTER_NAME}/run-cardano-submit-api
 stderr_logfile=./${STATE_CLUSTER_NAME}/submit_api.stderr
 stdout_logfile=./${STATE_CLUSTER_NAME}/submit_api.stdout
+${log_rotation}
 autostart=false
 autorestart=false
 startsecs=5
@@ -673,6 +713,7 @@ EoF
 command=./${STATE_CLUSTER_NAME}/run-tx-generator
 stderr_logfile=./${STATE_CLUSTER_NAME}/tx-generator.stderr
 stdout_logfile=./${STATE_CLUSTER_NAME}/tx-generator.stdout
+${log_rotation}
 autostart=false
 autorestart=false
 startsecs=5
@@ -688,13 +729,39 @@ EoF
 command=./${STATE_CLUSTER_NAME}/run-tx-centrifuge
 stderr_logfile=./${STATE_CLUSTER_NAME}/tx-centrifuge.stderr
 stdout_logfile=./${STATE_CLUSTER_NAME}/tx-centrifuge.stdout
+${log_rotation}
 autostart=false
 autorestart=false
 startsecs=5
 EoF
   fi
 
-  if is_truthy "${ENABLE_TX_FIREHOSE:-}"; then
+  if is_truthy "${ENABLE_TX_FIREHOSE:-}" && is_truthy "${TX_FIREHOSE_MULTI_NODE:-}"; then
+    cp "${SCRIPT_DIR}/run-tx-firehose" "${STATE_CLUSTER}"
+
+    # One tx-firehose instance per pool, each submitting to its own pool socket
+    local -a firehose_names=()
+    for ((i=1; i<="${NUM_POOLS}"; i++)); do
+      firehose_names+=("tx_firehose_pool${i}")
+      cat >> "${STATE_CLUSTER}/supervisor.conf" <<EoF
+
+[program:tx_firehose_pool${i}]
+command=./${STATE_CLUSTER_NAME}/run-tx-firehose pool${i}
+stderr_logfile=./${STATE_CLUSTER_NAME}/tx-firehose-pool${i}.stderr
+stdout_logfile=./${STATE_CLUSTER_NAME}/tx-firehose-pool${i}.stdout
+${log_rotation}
+autostart=false
+autorestart=false
+startsecs=5
+EoF
+    done
+
+    cat >> "${STATE_CLUSTER}/supervisor.conf" <<EoF
+
+[group:tx_firehose]
+programs=$(IFS=,; echo "${firehose_names[*]}")
+EoF
+  elif is_truthy "${ENABLE_TX_FIREHOSE:-}"; then
     cp "${SCRIPT_DIR}/run-tx-firehose" "${STATE_CLUSTER}"
 
     cat >> "${STATE_CLUSTER}/supervisor.conf" <<EoF
@@ -703,14 +770,34 @@ EoF
 command=./${STATE_CLUSTER_NAME}/run-tx-firehose
 stderr_logfile=./${STATE_CLUSTER_NAME}/tx-firehose.stderr
 stdout_logfile=./${STATE_CLUSTER_NAME}/tx-firehose.stdout
+${log_rotation}
 autostart=false
 autorestart=false
 startsecs=5
 EoF
   fi
 
+  cp "${SCRIPT_DIR}/run-log-compressor" "${STATE_CLUSTER}"
+  cp "${SCRIPT_DIR}/run-resource-sampler" "${STATE_CLUSTER}"
+
   cat >> "${STATE_CLUSTER}/supervisor.conf" <<EoF
 
+[program:log_compressor]
+command=./${STATE_CLUSTER_NAME}/run-log-compressor
+stderr_logfile=./${STATE_CLUSTER_NAME}/log-compressor.stderr
+stdout_logfile=./${STATE_CLUSTER_NAME}/log-compressor.stdout
+autostart=true
+autorestart=true
+startsecs=0
+
+[program:resource_sampler]
+command=./${STATE_CLUSTER_NAME}/run-resource-sampler
+stderr_logfile=./${STATE_CLUSTER_NAME}/resource-sampler.stderr
+stdout_logfile=./${STATE_CLUSTER_NAME}/resource-sampler.stdout
+autostart=true
+autorestart=unexpected
+startsecs=0
+
 [group:nodes]
 programs=$(IFS=,; echo "${node_names[*]}")
 
@@ -1029,6 +1116,38 @@ edit_genesis_conf() {
   mv -f "${conf}.tmp.json" "$conf"
 }
 
+edit_trace_conf() {
+  : "${SCRIPT_DIR:?SCRIPT_DIR is required}"
+
+  local conf="${1:?"Missing node config file"}"
+  local profile="${TRACE_PROFILE:-default}"
+  local profile_file="${SCRIPT_DIR}/trace-profile-${profile}.json"
+
+  if [ ! -e "$profile_file" ]; then
+    echo "Trace profile '${profile}' not found, line $LINENO in ${BASH_SOURCE[0]}" >&2
+    exit 1
+  fi
+
+  # Optionally drop the per-namespace options, keeping the root options with backends,
+  # then deep merge the profile trace options.
+  jq \
+    --slurpfile profile "$profile_file" '
+    $profile[0] as $p
+    | if ($p.reset_namespaces // false) then
+        .TraceOptions |= {"": .[""]}
+      else
+        .
+      end
+    | .TraceOptions *= ($p.TraceOptions // {})
+    | if ($p | has("TraceOptionResourceFrequency")) then
+        .TraceOptionResourceFrequency = $p.TraceOptionResourceFrequency
+      else
+        .
+      end
+    ' "$conf" > "${conf}.tmp.json"
+  mv -f "${conf}.tmp.json" "$conf"
+}
+
 edit_utxo_backend_conf() {
   : "${STATE_CLUSTER_NAME:?STATE_CLUSTER_NAME is required}"
 
@@ -1106,28 +1225,30 @@ use_genesis_mode() {
   supervisorctl -s unix:///"${SUPERVISORD_SOCKET_PATH}" restart nodes:
 }
 
-_fund_address() {
+_fund_addresses() {
   : "${STATE_CLUSTER:?STATE_CLUSTER is required}"
   : "${FAUCET_ADDR:?FAUCET_ADDR is required}"
   : "${FAUCET_SKEY:?FAUCET_SKEY is required}"
   : "${NETWORK_MAGIC:?NETWORK_MAGIC is required}"
   : "${SUBMIT_DELAY:?SUBMIT_DELAY is required}"
 
-  local addr="${1:?}"
-  local fund_amount="${2:?}"
-  local label="${3:-fund-address}"
+  local fund_amount="${1:?}"
+  local label="${2:?}"
+  shift 2
+  [ "$#" -gt 0 ] || { echo "No addresses to fund, line $LINENO in ${BASH_SOURCE[0]}" >&2; exit 1; }
+
   local fee=500000
-  local stop_txin_amount="$((fund_amount + fee))"
+  local stop_txin_amount="$((fund_amount * $# + fee))"
   local tx_base="${STATE_CLUSTER}/shelley/${label}"
-  local addr_balance
+  local addr
+  local -a txouts=()
   local -a txins=()
   local txin_amount=0
 
-  addr_balance="$(get_address_balance --address "$addr")"
-  if [ "$addr_balance" -ge "$fund_amount" ]; then
-    echo "Address '$addr' already has enough funds: $addr_balance lovelace"
-    return
-  fi
+  # Fund all the addresses in a single transaction, one output per address
+  for addr in "$@"; do
+    txouts+=( "--tx-out" "${addr}+${fund_amount}" )
+  done
 
   get_txins "${FAUCET_ADDR}" "$stop_txin_amount" txins txin_amount
 
@@ -1136,7 +1257,7 @@ _fund_address() {
   cardano_cli_log latest transaction build-raw \
     --fee    "$fee" \
     "${txins[@]}" \
-    --tx-out "${addr}+${fund_amount}" \
+    "${txouts[@]}" \
     --tx-out "${FAUCET_ADDR}+${txout_amount}" \
     --out-file "${tx_base}-tx.txbody"
 
@@ -1157,6 +1278,21 @@ _fund_address() {
   fi
 }
 
+_fund_address() {
+  local addr="${1:?}"
+  local fund_amount="${2:?}"
+  local label="${3:-fund-address}"
+  local addr_balance
+
+  addr_balance="$(get_address_balance --address "$addr")"
+  if [ "$addr_balance" -ge "$fund_amount" ]; then
+    echo "Address '$addr' already has enough funds: $addr_balance lovelace"
+    return
+  fi
+
+  _fund_addresses "$fund_amount" "$label" "$addr"
+}
+
 _create_tx_gen_config() {
   if [ $# -lt 5 ]; then
     echo "Usage: _create_tx_gen_config <topology> <node.socket> <config.json> <genesis.skey> <tps>" >&2
@@ -1497,7 +1633,7 @@ _wait_for_tx_firehose_log() {
   : "${STATE_CLUSTER:?STATE_CLUSTER is required}"
 
   # tx-firehose writes its trace lines to stderr, unlike tx-generator / tx-centrifuge.
-  local logfile="${STATE_CLUSTER}/tx-firehose.stderr"
+  local logfile="${1:-${STATE_CLUSTER}/tx-firehose.stderr}"
   local _
 
   for _ in {1..10}; do
@@ -1506,14 +1642,14 @@ _wait_for_tx_firehose_log() {
     fi
     sleep 3
   done
-  echo "Tx firehose log file was not created, line $LINENO in ${BASH_SOURCE[0]}" >&2
+  echo "Tx firehose log file '$logfile' was not created, line $LINENO in ${BASH_SOURCE[0]}" >&2
   exit 1
 }
 
 _wait_for_tx_firehose_tx() {
   : "${STATE_CLUSTER:?STATE_CLUSTER is required}"
 
-  local logfile="${STATE_CLUSTER}/tx-firehose.stderr"
+  local logfile="${1:-${STATE_CLUSTER}/tx-firehose.stderr}"
   local attempts=360
   local start_time elapsed_time
   local success=0
@@ -1530,12 +1666,79 @@ _wait_for_tx_firehose_tx() {
 
   elapsed_time="$((EPOCHSECONDS - start_time))"
   if [ "$success" -eq 0 ]; then
-    echo "Tx firehose did not start submitting transactions after $elapsed_time seconds, line $LINENO in ${BASH_SOURCE[0]}" >&2
+    echo "Tx firehose did not start submitting transactions to '$logfile' after $elapsed_time seconds, line $LINENO in ${BASH_SOURCE[0]}" >&2
     exit 1
   fi
   echo "Tx firehose started submitting transactions after $elapsed_time seconds"
 }
 
+_create_tx_firehose_key() {
+  : "${STATE_CLUSTER:?STATE_CLUSTER is required}"
+  : "${NETWORK_MAGIC:?NETWORK_MAGIC is required}"
+
+  local key_base="${1:?}"
+
+  cardano_cli_log conway address key-gen \
+    --signing-key-file "${STATE_CLUSTER}/shelley/${key_base}.skey" \
+    --verification-key-file "${STATE_CLUSTER}/shelley/${key_base}.vkey"
+  cardano_cli_log conway address build \
+    --payment-verification-key-file "${STATE_CLUSTER}/shelley/${key_base}.vkey" \
+    --out-file "${STATE_CLUSTER}/shelley/${key_base}.addr" \
+    --testnet-magic "$NETWORK_MAGIC"
+}
+
+_setup_tx_firehose_multi() {
+  : "${STATE_CLUSTER:?STATE_CLUSTER is required}"
+  : "${SUPERVISORD_SOCKET_PATH:?SUPERVISORD_SOCKET_PATH is required}"
+  : "${NETWORK_MAGIC:?NETWORK_MAGIC is required}"
+  : "${NUM_POOLS:?NUM_POOLS is required}"
+
+  local fund_amount="${1:?}"
+  local tps="${2:?}"
+  local i
+  local -a addrs=()
+
+  if [ "$tps" -lt "$NUM_POOLS" ]; then
+    echo "TX_TPS ($tps) must be at least the number of pools ($NUM_POOLS) with TX_FIREHOSE_MULTI_NODE" >&2
+    exit 1
+  fi
+
+  # Split the total rate and funds between the instances. Every instance has its own key,
+  # so it discovers only the UTxOs of its own partition and the instances never compete
+  # for the same inputs. The first `tps % NUM_POOLS` instances submit one more
+  # transaction per second, so the rates sum to exactly `tps`.
+  local base_tps="$((tps / NUM_POOLS))"
+  local extra_tps="$((tps % NUM_POOLS))"
+  local instance_tps
+  local instance_funds="$((fund_amount / NUM_POOLS))"
+
+  for ((i=1; i<="${NUM_POOLS}"; i++)); do
+    instance_tps="$base_tps"
+    [ "$i" -le "$extra_tps" ] && instance_tps="$((base_tps + 1))"
+
+    _create_tx_firehose_key "tx-firehose-pool${i}"
+    addrs+=("$(<"${STATE_CLUSTER}/shelley/tx-firehose-pool${i}.addr")")
+
+    _create_tx_firehose_config \
+      "./pool${i}.socket" \
+      "./shelley/tx-firehose-pool${i}.skey" \
+      "$NETWORK_MAGIC" \
+      "$instance_tps" > "${STATE_CLUSTER}/tx-firehose-pool${i}-config.json"
+  done
+
+  _fund_addresses "$instance_funds" "fund-tx-firehose" "${addrs[@]}"
+
+  echo "Starting ${NUM_POOLS} tx-firehose instances, one per pool"
+  supervisorctl -s "unix:///${SUPERVISORD_SOCKET_PATH}" start "tx_firehose:*" || \
+    { echo "Failed to start tx firehose, line $LINENO in ${BASH_SOURCE[0]}" >&2; exit 1; }
+
+  echo "Waiting for tx firehose instances to start submitting transactions"
+  for ((i=1; i<="${NUM_POOLS}"; i++)); do
+    _wait_for_tx_firehose_log "${STATE_CLUSTER}/tx-firehose-pool${i}.stderr"
+    _wait_for_tx_firehose_tx "${STATE_CLUSTER}/tx-firehose-pool${i}.stderr"
+  done
+}
+
 setup_tx_firehose() {
   if ! is_truthy "${ENABLE_TX_FIREHOSE:-}"; then
     return 0
@@ -1548,15 +1751,14 @@ setup_tx_firehose() {
   local fund_amount="${1:?}"
   local tps="${TX_TPS:-100}"
 
+  if is_truthy "${TX_FIREHOSE_MULTI_NODE:-}"; then
+    _setup_tx_firehose_multi "$fund_amount" "$tps"
+    return
+  fi
+
   # Unlike tx-generator / tx-centrifuge, tx-firehose does not need a genesis UTxO
   # key -- it discovers its own funds by address query, so any funded key will do.
-  cardano_cli_log conway address key-gen \
-    --signing-key-file "${STATE_CLUSTER}/shelley/tx-firehose.skey" \
-    --verification-key-file "${STATE_CLUSTER}/shelley/tx-firehose.vkey"
-  cardano_cli_log conway address build \
-    --payment-verification-key-file "${STATE_CLUSTER}/shelley/tx-firehose.vkey" \
-    --out-file "${STATE_CLUSTER}/shelley/tx-firehose.addr" \
-    --testnet-magic "$NETWORK_MAGIC"
+  _create_tx_firehose_key "tx-firehose"
 
   _fund_address \
     "$(<"${STATE_CLUSTER}/shelley/tx-firehose.addr")" "$fund_amount" "fund-tx-firehose"
@@ -1,5 +1,10 @@
 #! /usr/bin/env bash
 
+# Optional env vars:
+#   DBSYNC_PG_TEMPLATE - name of a template database with the db-sync schema already
+#     migrated (set by cardonnay when the shared Postgres server of the work dir is
+#     running); the instance database is cloned from it instead of `template0`
+
 set -euo pipefail
 
 if [ -z "${CARDANO_NODE_SOCKET_PATH:-}" ]; then
@@ -21,7 +26,7 @@ echo "Deleting db $DATABASE_NAME"
 psql -d "$DATABASE_NAME" -c "SELECT pg_terminate_backend(pg_stat_activity.pid) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid();" > /dev/null 2>&1 || :
 dropdb --if-exists "$DATABASE_NAME" > /dev/null
 echo "Setting up db $DATABASE_NAME"
-createdb -T template0 --owner="$PGUSER" --encoding=UTF8 "$DATABASE_NAME"
+createdb -T "${DBSYNC_PG_TEMPLATE:-template0}" --owner="$PGUSER" --encoding=UTF8 "$DATABASE_NAME"
 
 echo "${PGHOST}:${PGPORT}:${DATABASE_NAME}:${PGUSER}:secret" > "$PGPASSFILE"
 chmod 600 "$PGPASSFILE"
@@ -0,0 +1,47 @@
+"""Importing the CLI must not load the heavy dependencies, they are loaded by the commands."""
+
+import json
+import pathlib as pl
+import subprocess
+import sys
+
+import pytest
+
+SRC_DIR = pl.Path(__file__).parent.parent / "src"
+HEAVY_MODULES = (
+    "pydantic",
+    "pygments",
+    "filelock",
+    "cardonnay.structs",
+    "cardonnay.api",
+    "cardonnay.postgres",
+    "cardonnay.cli_postgres",
+    "cardonnay.dbsync",
+)
+
+
+def _get_loaded_modules(code: str) -> set[str]:
+    """Run the code in a new interpreter and return the modules it loaded."""
+    output = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport json, sys; print(json.dumps(list(sys.modules)))"],
+        # The sources are importable from the cwd even when the package is not installed
+        cwd=SRC_DIR,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return set(json.loads(output.splitlines()[-1]))
+
+
+@pytest.mark.parametrize(
+    "code",
+    (
+        "import cardonnay.main",
+        # The help of a group is printed without loading any command handler
+        "from cardonnay import main; main.main(['control', '--help'], standalone_mode=False)",
+    ),
+    ids=("import", "help"),
+)
+def test_no_heavy_imports(code: str) -> None:
+    loaded = _get_loaded_modules(code=code)
+    assert not loaded.intersection(HEAVY_MODULES)